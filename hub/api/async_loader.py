@@ -0,0 +1,110 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import weakref
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from hub import defaults
+from hub.store.io_executor import get_executor
+from hub.store.lru_cache import LRUCache
+
+
+class _Batch:
+    def __init__(self, future):
+        self.future = future
+        # tensor key -> indexes of the samples
+        self.indexes = defaultdict(set)
+
+
+class AsyncChunkLoader:
+    """Fetches the chunks of the async reads of a dataset into its cache
+    Reads awaited on the same event loop before the fetch starts share one batched
+    load per tensor, run by the I/O executor, so outstanding reads take no threads
+    besides the ones of the executor
+    """
+
+    def __init__(self, dataset):
+        self._dataset = dataset
+        # event loop -> batch being collected
+        self._batches = weakref.WeakKeyDictionary()
+
+    def __getstate__(self):
+        return {"_dataset": self._dataset}
+
+    def __setstate__(self, state):
+        self.__init__(state["_dataset"])
+
+    async def load(self, keys: Iterable[str], indexes: Iterable[int]):
+        """Waits until the chunks of the samples of the tensors are in the cache"""
+        # Without cache fetched chunks would be dropped, they are read when decoded
+        if not isinstance(self._dataset._chunk_map, LRUCache):
+            return
+        # get_running_loop() is Python 3.7+, in a coroutine both return the running loop
+        loop = asyncio.get_event_loop()
+        batch = self._batches.get(loop)
+        if batch is None:
+            batch = self._batches[loop] = _Batch(loop.create_future())
+            loop.call_soon(self._start, loop, batch)
+        indexes = list(indexes)
+        for key in keys:
+            batch.indexes[key].update(indexes)
+        # Cancelling one read does not cancel the fetch of the others
+        await asyncio.shield(batch.future)
+
+    def _start(self, loop, batch):
+        self._batches.pop(loop, None)
+        future = asyncio.wrap_future(
+            get_executor().submit(self._load, dict(batch.indexes)), loop=loop
+        )
+        future.add_done_callback(lambda done: _copy_result(done, batch.future))
+
+    def _load(self, indexes: dict) -> int:
+        tensors = self._dataset._tensors
+        batch_size = defaults.DEFAULT_PREFETCH_BATCH_CHUNKS
+        # Chunks beyond the cache would evict each other before being read,
+        # they are fetched by the read itself instead
+        budget = self._dataset._chunk_map._max_size
+        batches, size = [], 0
+        for key, samples in indexes.items():
+            chunks = []
+            for chunk in tensors[key].chunk_keys(sorted(samples)):
+                size += tensors[key].chunk_nbytes(chunk)
+                if size > budget:
+                    break
+                chunks.append(chunk)
+            for i in range(0, len(chunks), batch_size):
+                batches.append((key, chunks[i : i + batch_size]))
+            if size > budget:
+                break
+        loaded = get_executor().map(
+            lambda batch: tensors[batch[0]].fs_map.load(batch[1]), batches
+        )
+        return sum(loaded)
+
+
+def _copy_result(source: asyncio.Future, target: asyncio.Future):
+    if target.done():
+        return
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def sample_indexes(indexes, length: int) -> list:
+    """Indexes of the samples of a view, given as int, slice or list"""
+    if isinstance(indexes, int):
+        return [indexes]
+    if isinstance(indexes, slice):
+        return list(range(*indexes.indices(length)))
+    return list(indexes)
+
+
+async def run_async(fn: Callable, *args):
+    """Awaits fn(*args) run by the I/O executor, off the event loop"""
+    return await asyncio.wrap_future(get_executor().submit(fn, *args))
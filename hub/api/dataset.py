@@ -12,9 +12,11 @@ import json
 import sys
 from typing import Iterable
 import traceback
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import Future
 import numpy as np
 from PIL import Image as im, ImageChops
+from tqdm import tqdm
 
 import fsspec
 from fsspec.spec import AbstractFileSystem
@@ -54,7 +56,19 @@ from hub.schema.features import flatten
 from hub import auto
 
 from hub.store.dynamic_tensor import DynamicTensor
-from hub.store.store import get_fs_and_path, get_storage_map
+from hub.store.decoded_cache import DecodedChunkCache
+from hub.store.shared_cache import SharedMemoryCache
+from hub.store.disk_cache import DiskCache
+from hub.store.lru_cache import STATS_EVENTS, LRUCache
+from hub.api.async_loader import AsyncChunkLoader, run_async
+from hub.store.packed_store import PackedStore
+from hub.store.superchunk_store import SuperchunkStore
+from hub.store.store import (
+    _is_local_fs,
+    get_fs_and_path,
+    get_storage_map,
+    remove_cache,
+)
 from hub.exceptions import (
     AddressNotFound,
     HubDatasetNotFoundException,
@@ -72,10 +86,11 @@ from hub.exceptions import (
     SchemaMismatchException,
 )
 from hub.store.metastore import MetaStorage
+from hub.store.nested_store import NestedStore
 from hub.client.hub_control import HubControlClient
 from hub.schema import Audio, BBox, ClassLabel, Image, Sequence, Text, Video
 from hub.utils import norm_cache, norm_shape, _tuple_product
-from hub import defaults
+from hub import config, defaults
 import pickle
 
 
@@ -101,6 +116,14 @@ class Dataset:
         lazy: bool = True,
         public: bool = True,
         name: str = None,
+        read_ahead: int = defaults.DEFAULT_READ_AHEAD_CHUNKS,
+        cache_policy: str = defaults.DEFAULT_CACHE_POLICY,
+        decoded_cache: int = defaults.DEFAULT_DECODED_CACHE_SIZE,
+        shared_cache: int = 0,
+        cache_coherence: float = None,
+        zero_copy: bool = False,
+        packed: bool = False,
+        superchunks: bool = False,
     ):
         """| Open a new or existing dataset for read/write
 
@@ -122,10 +145,12 @@ class Dataset:
         fs_map: optional
         meta_information: optional ,give information about dataset in a dictionary.
         cache: int, optional
-            Size of the memory cache. Default is 64MB (2**26)
+            Size of the memory cache shared by all the tensors of the dataset. Default is 64MB (2**26)
+            meta.json and version.pkl are cached apart, in at most defaults.DEFAULT_META_CACHE_SIZE
             if 0, False or None, then cache is not used
         storage_cache: int, optional
             Size of the storage cache. Default is 256MB (2**28)
+            Chunks of remote datasets are cached on local disk (~/.activeloop/cache) and reused across runs
             if 0, False or None, then storage cache is not used
         lock_cache: bool, optional
             Lock the cache for avoiding multiprocessing errors
@@ -137,6 +162,43 @@ class Dataset:
             the dataset won't be visible in the visualizer to the public
         name: str, optional
             only applicable when using hub storage, this is the name that shows up on the visualizer
+        read_ahead: int, optional
+            Number of chunks fetched in background ahead of a tensor read in order. Default is 4
+            Requires cache and lock_cache, if 0 then chunks are fetched only when read
+        cache_policy: str, optional
+            Eviction policy of the memory cache, "lru" (default), "2q", "lfu" or "belady"
+            "2q" and "lfu" keep small chunks read over and over (labels, shapes) cached
+            while passing over tensors larger than the cache
+            "belady" evicts the chunk read again the latest in the order given by schedule()
+        decoded_cache: int, optional
+            Size of the decompressed chunks cache shared by all the tensors. Default is 128MB (2**27)
+            Samples read one by one from the same chunk decompress it only once
+            if 0, False or None, then every read decompresses the chunks it touches
+        shared_cache: int, optional
+            Size of the memory cache shared by all the processes opening the dataset, e.g. DataLoader workers
+            Only for remote datasets, it is kept in /dev/shm and replaces the per process memory cache
+            Each chunk is then downloaded and held in memory once. Default is 0, not used
+        cache_coherence: float, optional
+            Seconds a cached chunk is trusted before its version (ETag, generation or mtime) is checked
+            against the storage, so changes made by other processes show up while caching stays on
+            if 0, cached chunks are checked on every read. Default is None, never checked
+        zero_copy: bool, optional
+            Samples read from a single chunk of a tensor stored without compressor, or of a chunk held by
+            decoded_cache, are returned as read-only views of the chunk instead of copies
+            Chunks of local datasets are memory mapped, so these views are backed by the page cache
+            Each view of a memory mapped chunk keeps a file descriptor open while it is held,
+            chunks smaller than config.MMAP_MIN_SIZE are read into memory instead
+            Default is False
+        packed: bool, optional
+            Only for new local datasets, stores all the chunks in one append-only file with an index
+            instead of a file per chunk, see hub.store.packed_store.PackedStore
+            Datasets created packed are always opened packed. Default is False
+        superchunks: bool, optional
+            Only for new datasets, stores the chunks of the tensors with samples of at most
+            config.SUPERCHUNK_MAX_SAMPLE_BYTES (labels, boxes, scalars) and the shapes of the dynamic
+            tensors of config.SUPERCHUNK_SAMPLES samples in one object, so reading a sample fetches
+            one object for all of them, see hub.store.superchunk_store.SuperchunkStore
+            Datasets created with superchunks are always opened with them. Default is False
         """
 
         shape = norm_shape(shape)
@@ -159,16 +221,55 @@ class Dataset:
         )
         self._cache = cache
         self._storage_cache = storage_cache
+        self._shared_cache = norm_cache(shared_cache) if cache else 0
         self.lock_cache = lock_cache
+        self._read_ahead = read_ahead if cache else 0
+        self._decoded_cache = (
+            DecodedChunkCache(decoded_cache, max_age=cache_coherence)
+            if decoded_cache
+            else None
+        )
+        self._zero_copy = zero_copy
         self.verison = "1.x"
         mode = self._get_mode(mode, self._fs)
         self._mode = mode
+        # Checked before the dataset folder is cleared in "w" mode
+        if packed and not _is_local_fs(self._fs):
+            raise ValueError("Only local datasets can be packed")
         needcreate = self._check_and_prepare_dir()
+        self._packed = (
+            packed
+            if needcreate
+            else _is_local_fs(self._fs) and PackedStore.exists(self._path)
+        )
+        # meta.json and version.pkl change in place, so they are never kept in the storage cache
+        # They get a small cache of their own, cache is left to the chunks
         fs_map = fs_map or get_storage_map(
-            self._fs, self._path, cache, lock=lock_cache, storage_cache=storage_cache
+            self._fs,
+            self._path,
+            cache and defaults.DEFAULT_META_CACHE_SIZE,
+            lock=lock_cache,
+            storage_cache=0,
+            coherence=cache_coherence,
         )
         self._fs_map = fs_map
+        # Single cache shared by all the tensors, so memory use follows cache and not the schema width
+        self._chunk_map = get_storage_map(
+            self._fs,
+            self._path,
+            cache,
+            lock=lock_cache,
+            storage_cache=storage_cache,
+            prefetch=defaults.DEFAULT_PREFETCH_WORKERS if self._read_ahead else 0,
+            cache_policy=cache_policy,
+            shared_cache=self._shared_cache,
+            coherence=cache_coherence,
+            memory_map=True,
+            packed=self._packed,
+        )
         self._meta_information = meta_information
+        self._async_loader = AsyncChunkLoader(self)
+        self._superchunk_map = None
         self.username = None
         self.dataset_name = None
         if not needcreate:
@@ -177,6 +278,7 @@ class Dataset:
             self._shape = tuple(self.meta["shape"])
             self._schema = hub.schema.deserialize.deserialize(self.meta["schema"])
             self._meta_information = self.meta.get("meta_info") or dict()
+            self._superchunks = self.meta.get("superchunks")
             self._flat_tensors = tuple(flatten(self._schema))
             try:
                 version_info = pickle.loads(fs_map[defaults.VERSION_INFO])
@@ -228,6 +330,9 @@ class Dataset:
                     raise SchemaArgumentNotFoundException()
                 self._schema = schema
                 self._shape = tuple(shape)
+                self._superchunks = (
+                    self._superchunk_layout(schema) if superchunks else None
+                )
                 self.meta = self._store_meta()
                 self._meta_information = meta_information
                 self._flat_tensors = tuple(flatten(self.schema))
@@ -294,6 +399,10 @@ class Dataset:
     def storage_cache(self):
         return self._storage_cache
 
+    @property
+    def shared_cache(self):
+        return self._shared_cache
+
     @property
     def schema(self):
         return self._schema
@@ -310,6 +419,8 @@ class Dataset:
             "meta_info": self._meta_information or dict(),
             "name": self._name,
         }
+        if self._superchunks:
+            meta["superchunks"] = self._superchunks
 
         self._fs_map[defaults.META_FILE] = bytes(json.dumps(meta), "utf-8")
         return meta
@@ -371,6 +482,8 @@ class Dataset:
         if self._commit_id is None:
             raise VersioningNotSupportedException("checkout")
         self.flush()
+        if self._decoded_cache is not None:
+            self._decoded_cache.clear()
         if address in self._branch_node_map.keys():
             self._branch = address
             self._version_node = self._branch_node_map[address]
@@ -447,16 +560,14 @@ class Dataset:
                 except BaseException:
                     raise WrongUsernameException(stored_username)
         meta_path = posixpath.join(path, defaults.META_FILE)
-        try:
-            # Update boto3 cache
-            fs.ls(path, detail=False, refresh=True)
-        except Exception:
-            pass
+        # Listings cached by the filesystem may be stale, dropping them needs no request
+        fs.invalidate_cache(path)
         exist_meta = fs.exists(meta_path)
         if exist_meta:
             if "w" in mode:
                 fs.rm(path, recursive=True)
                 fs.makedirs(path)
+                remove_cache(path)
                 return True
             return False
         else:
@@ -472,21 +583,56 @@ class Dataset:
                     raise NotHubDatasetToAppendException()
             return True
 
+    @staticmethod
+    def _superchunk_layout(schema) -> dict:
+        """Samples per superchunk and paths of the tensors with small samples"""
+        tensors = []
+        for t_dtype, t_path in flatten(schema):
+            dtype = np.dtype(_get_dynamic_tensor_dtype(t_dtype))
+            size = dtype.itemsize * _tuple_product(t_dtype.max_shape)
+            if dtype != "object" and size <= config.SUPERCHUNK_MAX_SAMPLE_BYTES:
+                tensors.append(t_path)
+        return {"samples": config.SUPERCHUNK_SAMPLES, "tensors": tensors}
+
+    def _tensor_chunk_map(self):
+        """Chunk map of the tensors, with superchunks if the dataset has them"""
+        if not self._superchunks:
+            return self._chunk_map
+        self._superchunk_map = SuperchunkStore(
+            self._chunk_map, self._superchunks["samples"]
+        )
+        return self._superchunk_map
+
+    def _register_superchunks(self, t_path, tensor):
+        """Puts the chunks of the tensor in superchunks if it has small samples,
+        and its dynamic shapes in any case
+        """
+        if self._superchunk_map is None:
+            return
+        if t_path in self._superchunks["tensors"]:
+            self._superchunk_map.register(t_path[1:], tensor.chunks[0])
+        if tensor._dynamic_tensor is not None:
+            self._superchunk_map.register(
+                posixpath.join(t_path[1:], "--dynamic--"),
+                tensor._dynamic_tensor.chunks[0],
+            )
+
     def _generate_storage_tensors(self):
+        chunk_map = self._tensor_chunk_map()
+        samples = self._superchunks and self._superchunks["samples"]
         for t in self._flat_tensors:
             t_dtype, t_path = t
             path = posixpath.join(self._path, t_path[1:])
-            self._fs.makedirs(posixpath.join(path, "--dynamic--"))
-            yield t_path, DynamicTensor(
+            if not self._packed and not self._superchunks:
+                self._fs.makedirs(posixpath.join(path, "--dynamic--"))
+            chunks = t_dtype.chunks
+            # Chunks of small tensors hold the samples of one superchunk
+            if samples and chunks is None and t_path in self._superchunks["tensors"]:
+                chunks = samples
+            tensor = DynamicTensor(
                 fs_map=MetaStorage(
                     t_path,
-                    get_storage_map(
-                        self._fs,
-                        path,
-                        self._cache,
-                        self.lock_cache,
-                        storage_cache=self._storage_cache,
-                    ),
+                    NestedStore(chunk_map, t_path[1:]),
                     self._fs_map,
                     self,
                 ),
@@ -494,31 +640,34 @@ class Dataset:
                 shape=self._shape + t_dtype.shape,
                 max_shape=self._shape + t_dtype.max_shape,
                 dtype=_get_dynamic_tensor_dtype(t_dtype),
-                chunks=t_dtype.chunks,
+                chunks=chunks,
                 compressor=_get_compressor(t_dtype.compressor),
+                chunk_cache=self._decoded_cache,
+                zero_copy=self._zero_copy,
+                shape_chunks=samples,
             )
+            self._register_superchunks(t_path, tensor)
+            yield t_path, tensor
 
     def _open_storage_tensors(self):
+        chunk_map = self._tensor_chunk_map()
         for t in self._flat_tensors:
             t_dtype, t_path = t
-            path = posixpath.join(self._path, t_path[1:])
-            yield t_path, DynamicTensor(
+            tensor = DynamicTensor(
                 fs_map=MetaStorage(
                     t_path,
-                    get_storage_map(
-                        self._fs,
-                        path,
-                        self._cache,
-                        self.lock_cache,
-                        storage_cache=self._storage_cache,
-                    ),
+                    NestedStore(chunk_map, t_path[1:]),
                     self._fs_map,
                     self,
                 ),
                 mode=self._mode,
                 # FIXME We don't need argument below here
                 shape=self._shape + t_dtype.shape,
+                chunk_cache=self._decoded_cache,
+                zero_copy=self._zero_copy,
             )
+            self._register_superchunks(t_path, tensor)
+            yield t_path, tensor
 
     def __getitem__(self, slice_):
         """| Gets a slice or slices from dataset
@@ -697,6 +846,9 @@ class Dataset:
             only applicable if using hub storage, ignored otherwise
             setting this to False allows only the user who created it to access the new copied dataset and
             the dataset won't be visible in the visualizer to the public
+
+        Files are copied in parallel, by the storage itself if both datasets are on it.
+        An interrupted copy is resumed by calling copy again with the same dst_url.
         """
         self.flush()
         destination = dst_url
@@ -751,6 +903,7 @@ class Dataset:
         exist_meta = fs.exists(posixpath.join(path, defaults.META_FILE))
         if exist_meta:
             fs.rm(path, recursive=True)
+            remove_cache(path)
             if self.username:
                 HubControlClient().delete_dataset_entry(
                     self.username, self.dataset_name
@@ -765,6 +918,7 @@ class Dataset:
         output_type=dict,
         indexes=None,
         key_list=None,
+        schedule=False,
     ):
         """| Converts the dataset into a pytorch compatible format.
         ** Pytorch does not support uint16, uint32, uint64 dtypes. These are implicitly type casted to int32, int64 and int64 respectively.
@@ -784,10 +938,16 @@ class Dataset:
         key_list: list, optional
             The list of keys that are needed in Pytorch format. For nested schemas such as {"a":{"b":{"c": Tensor()}}}
             use ["a/b/c"] as key_list
+        schedule: bool, optional
+            Read the samples in the order of indexes, e.g. a shuffled permutation, and let the cache
+            prefetch their chunks and evict the chunk needed again the latest. Default is False
+            Use with the sequential sampler of the DataLoader
         """
         from .integrations import _to_pytorch
 
-        ds = _to_pytorch(self, transform, inplace, output_type, indexes, key_list)
+        ds = _to_pytorch(
+            self, transform, inplace, output_type, indexes, key_list, schedule
+        )
         return ds
 
     def to_tensorflow(self, indexes=None, include_shapes=False, key_list=None):
@@ -863,6 +1023,171 @@ class Dataset:
         self._fs_map.flush()
         self._update_dataset_state()
 
+    def flush_async(self):
+        """| Starts saving changes from cache to dataset final storage in background, so that
+        the computation can go on while the chunks are uploaded. Doesn't create a new commit.
+
+        Returns a concurrent.futures.Future which is done when all the changes are saved.
+        Calling flush() afterwards waits until then.
+        The meta is saved after the chunks, so it never describes missing chunks.
+        """
+        future = Future()
+        if "r" in self._mode or not hasattr(self._chunk_map, "flush_async"):
+            self.flush()
+            future.set_result(None)
+            return future
+        if self._superchunk_map is not None:
+            self._superchunk_map.flush_pending()
+
+        def save_meta(chunks):
+            try:
+                chunks.result()
+                self._store_version_info()
+                self._save_meta()
+                self._fs_map.flush()
+                self._update_dataset_state()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+        self._chunk_map.flush_async().add_done_callback(save_meta)
+        return future
+
+    def _cache_tiers(self):
+        """Yields name and cache of each cache tier of the chunks"""
+        store = self._chunk_map
+        while isinstance(store, LRUCache):
+            if isinstance(store, SharedMemoryCache):
+                yield "shared", store
+            elif isinstance(store, DiskCache):
+                yield "storage", store
+            else:
+                yield "memory", store
+            store = store.actual_storage
+
+    def cache_stats(self) -> dict:
+        """| Returns counters of the "memory" (or "shared") and, for remote datasets, "storage" cache.
+        Counts chunk hits, misses, writes, evictions and write backs,
+        with their sizes in the *_bytes counters.
+        Counters are kept per tensor under "tensors" and summed up under "total".
+        """
+        fields = [f for event in STATS_EVENTS for f in (event, f"{event}_bytes")]
+        stats = {}
+        for tier, cache in self._cache_tiers():
+            tensors = defaultdict(Counter)
+            for group, counters in cache.stats().items():
+                # Shapes of dynamic tensors are counted along with the tensor
+                if posixpath.basename(group) == "--dynamic--":
+                    group = posixpath.dirname(group)
+                tensors["/" + group].update(counters)
+            total = sum(tensors.values(), Counter())
+            stats[tier] = {
+                "total": {field: total[field] for field in fields},
+                "tensors": {
+                    key: {field: counters[field] for field in fields}
+                    for key, counters in tensors.items()
+                },
+            }
+        return stats
+
+    def prefetch(self, keys=None, indexes=None, progress: bool = True) -> int:
+        """| Fetches chunks of the samples into the cache tiers ahead of reading them,
+        concurrently and in batches of DEFAULT_PREFETCH_BATCH_CHUNKS chunks.
+        Chunks of remote datasets land in the storage cache, so it should be
+        large enough to hold them.
+
+        Parameters
+        ----------
+        keys: str or list, optional
+            Tensors to prefetch, all the tensors if None
+        indexes: int, slice or list, optional
+            Samples to prefetch, all the samples if None
+        progress: bool, optional
+            Show progress bar of the fetched chunks
+
+        Returns the number of chunks fetched, chunks never written are skipped
+        """
+        keys = [keys] if isinstance(keys, str) else keys or list(self._tensors)
+        keys = [key if key.startswith("/") else "/" + key for key in keys]
+        for key in keys:
+            if key not in self._tensors:
+                raise KeyError(key)
+        if indexes is None:
+            indexes = range(self._shape[0])
+        elif isinstance(indexes, int):
+            indexes = [indexes]
+        elif isinstance(indexes, slice):
+            indexes = range(*indexes.indices(self._shape[0]))
+        else:
+            indexes = list(indexes)
+        batch_size = defaults.DEFAULT_PREFETCH_BATCH_CHUNKS
+        batches = []
+        for key in keys:
+            chunks = self._tensors[key].chunk_keys(indexes)
+            for i in range(0, len(chunks), batch_size):
+                batches.append((key, chunks[i : i + batch_size]))
+        fetched = 0
+        with tqdm(
+            total=sum(len(chunks) for _, chunks in batches),
+            unit=" chunks",
+            desc=f"Prefetching {self._url}",
+            disable=not progress,
+        ) as pbar:
+            for key, chunks in batches:
+                fetched += self._tensors[key].fs_map.load(chunks)
+                pbar.update(len(chunks))
+        return fetched
+
+    def schedule(
+        self,
+        indexes,
+        keys=None,
+        lookahead: int = defaults.DEFAULT_SCHEDULE_LOOKAHEAD,
+    ):
+        """| Tells the cache the order the samples are going to be read in,
+        e.g. the permutation of a shuffled epoch.
+        Requires cache_policy="belady", which then evicts the chunk needed again the latest.
+        Position of the sample being read should be passed to advance().
+
+        Parameters
+        ----------
+        indexes: list
+            Samples in the order they are read
+        keys: str or list, optional
+            Tensors read, all the tensors if None
+        lookahead: int, optional
+            Number of samples ahead of the current one whose chunks are prefetched
+            Requires read_ahead, if 0 chunks are fetched only when read
+        """
+        if not isinstance(self._chunk_map, LRUCache):
+            raise ValueError("Schedule requires the cache")
+        keys = [keys] if isinstance(keys, str) else keys or list(self._tensors)
+        keys = [key if key.startswith("/") else "/" + key for key in keys]
+        tensors = [self._tensors[key] for key in keys]
+        steps = [
+            [
+                key
+                for tensor in tensors
+                for key in tensor.fs_map.storage_keys(tensor.chunk_keys([index]))
+            ]
+            for index in indexes
+        ]
+        self._chunk_map.schedule(steps, lookahead)
+
+    def advance(self, step: int) -> Future:
+        """| Tells the cache the position in schedule() of the sample being read
+        Returns Future of prefetching the next samples, None if nothing is fetched
+        """
+        if isinstance(self._chunk_map, LRUCache):
+            return self._chunk_map.advance(step)
+        return None
+
+    def reset_cache_stats(self):
+        """| Resets the cache counters, e.g. between epochs"""
+        for _, cache in self._cache_tiers():
+            cache.reset_stats()
+
     def save(self):
         """Save changes from cache to dataset final storage. Doesn't create a new commit.
         Does not invalidate this object.
@@ -912,6 +1237,23 @@ class Dataset:
         """
         return self.numpy(label_name=label_name)
 
+    async def numpy_async(self, label_name=False):
+        """Awaitable numpy(), the event loop runs other tasks while the chunks are
+        fetched and decoded. Concurrent reads fetch their chunks together
+
+        Parameters
+        ----------
+        label_name: bool, optional
+            If the TensorView object is of the ClassLabel type, setting this to True would retrieve the label names
+            instead of the label encoded integers, otherwise this parameter is ignored.
+        """
+        await self._async_loader.load(self._tensors, range(self._shape[0]))
+        return await run_async(self.numpy, label_name)
+
+    async def compute_async(self, label_name=False):
+        """Awaitable compute(), see numpy_async()"""
+        return await self.numpy_async(label_name=label_name)
+
     def __str__(self):
         return (
             "Dataset(schema="
@@ -961,7 +1303,7 @@ class Dataset:
         else:
             try:
                 meta_path = posixpath.join(self._path, defaults.META_FILE)
-                if not fs.exists(self._path) or not fs.exists(meta_path):
+                if not fs.exists(meta_path):
                     return "a"
                 bytes_ = bytes("Hello", "utf-8")
                 path = posixpath.join(self._path, "mode_test")
@@ -4,10 +4,14 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import os
+import posixpath
 import time
+import uuid
 from typing import Union, Iterable
-from hub.store.store import get_fs_and_path
+from fsspec import AbstractFileSystem
+from hub import defaults
+from hub.store.io_executor import WRITE, get_executor
+from hub.store.store import _is_local_fs, get_fs_and_path
 import numpy as np
 import sys
 from hub.exceptions import (
@@ -21,7 +25,7 @@ import numcodecs
 import numcodecs.lz4
 import numcodecs.zstd
 from hub.schema.features import Primitive, SchemaDict
-from hub.numcodecs import PngCodec
+from hub.numcodecs import PngCodec, ShardCodec
 from hub.schema import ClassLabel
 
 
@@ -202,34 +206,81 @@ def generate_hash():
 def _copy_helper(
     dst_url: str, token=None, fs=None, public=True, src_url=None, src_fs=None
 ):
-    """Helper function for Dataset.copy"""
+    """Helper function for Dataset.copy
+    Files are copied concurrently by the I/O executor, by the storage itself if both
+    datasets are on the same file system. Keys of the copied files are saved in
+    batches in COPY_CHECKPOINT of the destination, so a copy interrupted is resumed
+    by calling it again. meta.json is copied last, the dataset can't be opened before.
+    """
     src_url = src_fs.expand_path(src_url)[0]
     dst_url = dst_url[:-1] if dst_url.endswith("/") else dst_url
     dst_fs, dst_url = (
         (fs, dst_url) if fs else get_fs_and_path(dst_url, token=token, public=public)
     )
-    if dst_fs.exists(dst_url) and dst_fs.ls(dst_url):
-        raise DirectoryNotEmptyException(dst_url)
-    for path in src_fs.ls(src_url, refresh=True):
-        dst_full_path = dst_url + path[len(src_url) :]
-        dst_folder_path, dst_file = os.path.split(dst_full_path)
-        if src_fs.isfile(path):
-            if not dst_fs.exists(dst_folder_path):
-                dst_fs.mkdir(dst_folder_path)
-            content = src_fs.cat_file(path)
-            dst_fs.pipe_file(dst_full_path, content)
-        else:
-            _copy_helper(
-                dst_full_path,
-                token=token,
-                fs=dst_fs,
-                public=public,
-                src_url=path,
-                src_fs=src_fs,
-            )
+    checkpoint = posixpath.join(dst_url, defaults.COPY_CHECKPOINT)
+    copied = _read_copy_checkpoint(dst_fs, checkpoint, src_url)
+    if copied is None:
+        if dst_fs.exists(dst_url) and dst_fs.ls(dst_url):
+            raise DirectoryNotEmptyException(dst_url)
+        copied = set()
+        _write_checkpoint_file(dst_fs, posixpath.join(checkpoint, "source"), src_url)
+    keys = [path[len(src_url) :].lstrip("/") for path in src_fs.find(src_url)]
+    keys = [key for key in keys if not key.startswith(defaults.COPY_CHECKPOINT)]
+    keys = sorted(key for key in keys if key not in copied)
+    if _is_local_fs(dst_fs):
+        for folder in {posixpath.dirname(key) for key in keys}:
+            dst_fs.makedirs(posixpath.join(dst_url, folder), exist_ok=True)
+    copy_file = _server_side_copy(src_fs) if src_fs is dst_fs else None
+    if copy_file is None:
+
+        def copy_file(src, dst):
+            dst_fs.pipe_file(dst, src_fs.cat_file(src))
+
+    def copy(key):
+        copy_file(posixpath.join(src_url, key), posixpath.join(dst_url, key))
+
+    # Without meta.json the copy is not a dataset yet
+    batches = [key for key in keys if key != defaults.META_FILE]
+    batch_size = defaults.DEFAULT_COPY_BATCH_FILES
+    batches = [batches[i : i + batch_size] for i in range(0, len(batches), batch_size)]
+    for batch in batches + [[defaults.META_FILE]] * (defaults.META_FILE in keys):
+        get_executor().map(copy, batch, priority=WRITE)
+        path = posixpath.join(checkpoint, uuid.uuid4().hex)
+        _write_checkpoint_file(dst_fs, path, "\n".join(batch))
+    dst_fs.rm(checkpoint, recursive=True)
     return dst_url
 
 
+def _server_side_copy(fs):
+    """Function copying files of fs without reading them, None if fs has none"""
+    if type(fs).cp_file is not AbstractFileSystem.cp_file:
+        return fs.cp_file
+    if type(fs).copy is not AbstractFileSystem.copy:
+        return fs.copy
+    return None
+
+
+def _write_checkpoint_file(fs, path, text):
+    if _is_local_fs(fs):
+        fs.makedirs(posixpath.dirname(path), exist_ok=True)
+    fs.pipe_file(path, text.encode("utf-8"))
+
+
+def _read_copy_checkpoint(fs, checkpoint, src_url):
+    """Keys copied by an interrupted copy of src_url, None if there is none"""
+    try:
+        source = fs.cat_file(posixpath.join(checkpoint, "source")).decode("utf-8")
+    except (FileNotFoundError, KeyError):
+        return None
+    if source != src_url:
+        return None
+    copied = set()
+    for path in fs.find(checkpoint):
+        if posixpath.basename(path) != "source":
+            copied.update(fs.cat_file(path).decode("utf-8").split("\n"))
+    return copied
+
+
 def _store_helper(
     ds,
     url: str,
@@ -269,9 +320,14 @@ def _get_compressor(compressor: str):
         return "default"
     elif compressor.lower() == "png":
         return PngCodec(solo_channel=True)
+    elif compressor.lower().startswith("sharded_"):
+        # Samples are compressed one by one, so they can be read without the chunk
+        inner = _get_compressor(compressor[len("sharded_") :])
+        return ShardCodec(numcodecs.Blosc() if inner == "default" else inner)
     else:
         raise ValueError(
-            f"Wrong compressor: {compressor}, only LZ4, PNG and ZSTD are supported"
+            f"Wrong compressor: {compressor}, only LZ4, PNG and ZSTD are supported,"
+            " sharded_ prefix (e.g. sharded_lz4) stores samples separately"
         )
 
 
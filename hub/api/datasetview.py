@@ -5,6 +5,7 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 """
 from typing import Iterable
 from hub.api.tensorview import TensorView
+from hub.api.async_loader import run_async, sample_indexes
 import collections.abc as abc
 from hub.api.dataset_utils import (
     create_numpy_dict,
@@ -322,7 +323,14 @@ class DatasetView:
             indexes=self.indexes, include_shapes=include_shapes, key_list=key_list
         )
 
-    def to_pytorch(self, transform=None, inplace=True, output_type=dict, key_list=None):
+    def to_pytorch(
+        self,
+        transform=None,
+        inplace=True,
+        output_type=dict,
+        key_list=None,
+        schedule=False,
+    ):
         """| Converts the dataset into a pytorch compatible format.
         ** Pytorch does not support uint16, uint32, uint64 dtypes. These are implicitly type casted to int32, int64 and int64 respectively.
         Avoid having schema with these dtypes if you want to avoid this implicit conversion.
@@ -336,6 +344,8 @@ class DatasetView:
             type you need for Transforms). Default is True.
         output_type: one of list, tuple, dict, optional
             Defines the output type. Default is dict - same as in original Hub Dataset.
+        schedule: bool, optional
+            Lets the cache prefetch and evict chunks knowing the order of the samples
         """
         return self.dataset.to_pytorch(
             transform=transform,
@@ -343,6 +353,7 @@ class DatasetView:
             inplace=inplace,
             output_type=output_type,
             key_list=key_list,
+            schedule=schedule,
         )
 
     def resize_shape(self, size: int) -> None:
@@ -396,3 +407,21 @@ class DatasetView:
             instead of the label encoded integers, otherwise this parameter is ignored.
         """
         return self.numpy(label_name=label_name)
+
+    async def numpy_async(self, label_name=False):
+        """Awaitable numpy(), the event loop runs other tasks while the chunks are
+        fetched and decoded. Concurrent reads fetch their chunks together
+
+        Parameters
+        ----------
+        label_name: bool, optional
+            If the TensorView object is of the ClassLabel type, setting this to True would retrieve the label names
+            instead of the label encoded integers, otherwise this parameter is ignored.
+        """
+        indexes = sample_indexes(self.indexes, self.dataset.shape[0])
+        await self.dataset._async_loader.load(self.dataset._tensors, indexes)
+        return await run_async(self.numpy, label_name)
+
+    async def compute_async(self, label_name=False):
+        """Awaitable compute(), see numpy_async()"""
+        return await self.numpy_async(label_name=label_name)
@@ -6,6 +6,7 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 
 import sys
 from collections import defaultdict
+from hub import defaults
 from hub.exceptions import ModuleNotInstalledException, OutOfBoundsError
 from hub.schema.features import Primitive, Tensor, SchemaDict
 from hub.schema import Audio, BBox, ClassLabel, Image, Sequence, Text, Video
@@ -16,7 +17,13 @@ import hub.schema.deserialize
 
 
 def _to_pytorch(
-    dataset, transform=None, inplace=True, output_type=dict, indexes=None, key_list=None
+    dataset,
+    transform=None,
+    inplace=True,
+    output_type=dict,
+    indexes=None,
+    key_list=None,
+    schedule=False,
 ):
     """| Converts the dataset into a pytorch compatible format.
 
@@ -33,6 +40,8 @@ def _to_pytorch(
     key_list: list, optional
         The list of keys that are needed in Pytorch format. For nested schemas such as {"a":{"b":{"c": Tensor()}}}
         use ["a/b/c"] as key_list
+    schedule: bool, optional
+        Lets the cache prefetch and evict chunks knowing the order of the samples in indexes
     """
     try:
         import torch
@@ -51,6 +60,7 @@ def _to_pytorch(
         output_type=output_type,
         indexes=indexes,
         key_list=key_list,
+        schedule=schedule,
     )
 
 
@@ -171,26 +181,6 @@ def _to_tensorflow(dataset, indexes=None, include_shapes=False, key_list=None):
             raise KeyError(key)
     indexes = indexes or dataset.indexes
     indexes = [indexes] if isinstance(indexes, int) else indexes
-    _samples_in_chunks = {
-        key: value.chunks[0] for key, value in dataset._tensors.items()
-    }
-    _active_chunks = {}
-    _active_chunks_range = {}
-
-    def _get_active_item(key, index):
-        active_range = _active_chunks_range.get(key)
-        samples_per_chunk = _samples_in_chunks[key]
-        if active_range is None or index not in active_range:
-            active_range_start = index - index % samples_per_chunk
-            active_range = range(
-                active_range_start,
-                min(active_range_start + samples_per_chunk, indexes[-1] + 1),
-            )
-            _active_chunks_range[key] = active_range
-            _active_chunks[key] = dataset._tensors[key][
-                active_range.start : active_range.stop
-            ]
-        return _active_chunks[key][index % samples_per_chunk]
 
     def tf_gen():
         key_dtype_map = {key: dataset[key, indexes[0]].dtype for key in dataset.keys}
@@ -206,7 +196,7 @@ def _to_tensorflow(dataset, indexes=None, include_shapes=False, key_list=None):
                     else:
                         cur[split_key[i]] = {}
                         cur = cur[split_key[i]]
-                cur[split_key[-1]] = _get_active_item(key, index)
+                cur[split_key[-1]] = dataset._tensors[key][index]
                 if isinstance(key_dtype_map[key], Text):
                     value = cur[split_key[-1]]
                     cur[split_key[-1]] = (
@@ -567,15 +557,17 @@ class TorchDataset:
         output_type=dict,
         indexes=None,
         key_list=None,
+        schedule=False,
     ):
         self._ds = None
         self._url = ds.url
         self._token = ds.token
+        self._shared_cache = ds.shared_cache
+        self._schedule = schedule and isinstance(indexes, list)
         self._transform = transform
         self.inplace = inplace
         self.output_type = output_type
         self.indexes = indexes
-        self._inited = False
         self.key_list = key_list
         self.key_list = self.key_list or list(ds.keys)
         self.key_list = [
@@ -593,35 +585,21 @@ class TorchDataset:
         For each process, dataset should be independently loaded
         """
         if self._ds is None:
-            self._ds = Dataset(self._url, token=self._token, lock_cache=False)
-        if not self._inited:
-            self._inited = True
-            self._samples_in_chunks = {
-                key: (None in value.shape) and 1 or value.chunks[0]
-                for key, value in self._ds._tensors.items()
-            }
-            self._active_chunks = {}
-            self._active_chunks_range = {}
+            # Workers opening the dataset share the chunks cached by each other
+            policy = "belady" if self._schedule else defaults.DEFAULT_CACHE_POLICY
+            self._ds = Dataset(
+                self._url,
+                token=self._token,
+                shared_cache=self._shared_cache,
+                cache_policy=policy,
+            )
+            if self._schedule:
+                self._ds.schedule(self.indexes, self.key_list)
 
     def __len__(self):
         self._init_ds()
         return len(self.indexes) if isinstance(self.indexes, list) else 1
 
-    def _get_active_item(self, key, index):
-        active_range = self._active_chunks_range.get(key)
-        samples_per_chunk = self._samples_in_chunks[key]
-        if active_range is None or index not in active_range:
-            active_range_start = index - index % samples_per_chunk
-            active_range = range(
-                active_range_start,
-                min(active_range_start + samples_per_chunk, self.indexes[-1] + 1),
-            )
-            self._active_chunks_range[key] = active_range
-            self._active_chunks[key] = self._ds._tensors[key][
-                active_range.start : active_range.stop
-            ]
-        return self._active_chunks[key][index % samples_per_chunk]
-
     def __getitem__(self, ind):
         if isinstance(self.indexes, int):
             if ind != 0:
@@ -630,6 +608,8 @@ class TorchDataset:
         else:
             index = self.indexes[ind]
         self._init_ds()
+        if self._schedule:
+            self._ds.advance(ind)
         d = {}
         for key in self._ds._tensors.keys():
             if key not in self.key_list:
@@ -641,7 +621,8 @@ class TorchDataset:
                     cur[split_key[i]] = {}
                 cur = cur[split_key[i]]
 
-            item = self._get_active_item(key, index)
+            # Chunks are decoded once by the dataset's decoded chunk cache
+            item = self._ds._tensors[key][index]
             if not isinstance(item, bytes) and not isinstance(item, str):
                 t = item
                 if self.inplace:
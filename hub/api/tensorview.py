@@ -11,6 +11,7 @@ from hub.api.dataset_utils import get_value, slice_split, str_to_int, check_clas
 from hub.exceptions import NoneValueException
 from hub.schema import ClassLabel, Text, SchemaDict
 import hub.api.objectview as objv
+from hub.api.async_loader import run_async, sample_indexes
 
 
 class TensorView:
@@ -132,6 +133,24 @@ class TensorView:
         """
         return self.numpy(label_name=label_name)
 
+    async def numpy_async(self, label_name=False):
+        """Awaitable numpy(), the event loop runs other tasks while the chunks are
+        fetched and decoded. Concurrent reads fetch their chunks together
+
+        Parameters
+        ----------
+        label_name: bool, optional
+            If the TensorView object is of the ClassLabel type, setting this to True would retrieve the label names
+            instead of the label encoded integers, otherwise this parameter is ignored.
+        """
+        indexes = sample_indexes(self.indexes, self.dataset.shape[0])
+        await self.dataset._async_loader.load([self.subpath], indexes)
+        return await run_async(self.numpy, label_name)
+
+    async def compute_async(self, label_name=False):
+        """Awaitable compute(), see numpy_async()"""
+        return await self.numpy_async(label_name=label_name)
+
     def __getitem__(self, slice_):
         """| Gets a slice or slices from tensorview
         | Usage:
@@ -187,6 +187,21 @@ def test_to_pytorch_key_list():
         tds = dsv.to_pytorch(key_list=["xyz"])
 
 
+@pytest.mark.skipif(not pytorch_loaded(), reason="requires pytorch to be loaded")
+def test_to_pytorch_schedule():
+    schema = {"image": Tensor((10, 10, 3)), "label": "int32"}
+    ds = hub.Dataset("./data/test_to_pt_schedule", shape=(10,), schema=schema, mode="w")
+    for i in range(10):
+        ds["image", i] = i * np.ones((10, 10, 3))
+        ds["label", i] = i
+    ds.flush()
+    indexes = [3, 9, 0, 5, 1, 8, 2, 7, 4, 6]
+    tds = ds.to_pytorch(indexes=indexes, schedule=True)
+    for index, item in zip(indexes, tds):
+        assert item["label"].numpy() == index
+        assert (item["image"].numpy() == index * np.ones((10, 10, 3))).all()
+
+
 @pytest.mark.skipif(not pytorch_loaded(), reason="requires pytorch to be loaded")
 def test_to_pytorch_dtype_coversion():
     schema = {
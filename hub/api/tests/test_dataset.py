@@ -3,16 +3,24 @@ License:
 This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
+import asyncio
+import json
+import mmap
 import os
 import pickle
+import posixpath
 import shutil
+import threading
+from concurrent.futures import wait
 
+import fsspec
 import hub.api.dataset as dataset
+import hub.api.dataset_utils as dataset_utils
 from hub.cli.auth import login_fn
 from hub.exceptions import DirectoryNotEmptyException, ClassLabelValueError
 import numpy as np
 import pytest
-from hub import load, transform
+from hub import config, defaults, load, transform
 from hub.api.dataset_utils import slice_extract_info, slice_split, check_class_label
 from hub.cli.auth import login_fn
 from hub.exceptions import (
@@ -21,6 +29,8 @@ from hub.exceptions import (
     ReadModeException,
 )
 from hub.schema import BBox, ClassLabel, Image, SchemaDict, Sequence, Tensor, Text
+from hub.store.cache_policy import TwoQPolicy
+from hub.store.store import remove_cache
 from hub.utils import (
     azure_creds_exist,
     gcp_creds_exist,
@@ -843,6 +853,52 @@ def test_dataset_assign_value():
 simple_schema = {"num": "uint8"}
 
 
+def test_dataset_copy_resume(monkeypatch):
+    ds = Dataset(
+        "./data/test/cp_resume_original", shape=(100,), schema=simple_schema, mode="w"
+    )
+    ds["num", :] = np.arange(100, dtype="uint8")
+    ds.flush()
+    dst = "./data/test/cp_resume_copy"
+    shutil.rmtree(dst, ignore_errors=True)
+    copied = []
+    limit = [1]
+
+    def interrupted(fs):
+        def copy(src, dst):
+            if len(copied) == limit[0]:
+                raise ConnectionError("interrupted")
+            copied.append(src)
+            fs.cp_file(src, dst)
+
+        return copy
+
+    monkeypatch.setattr(defaults, "DEFAULT_COPY_BATCH_FILES", 1)
+    monkeypatch.setattr(dataset_utils, "_server_side_copy", interrupted)
+    with pytest.raises(ConnectionError):
+        ds.copy(dst)
+    assert not os.path.exists(os.path.join(dst, "meta.json"))
+    # Files already copied are skipped
+    files = len(fsspec.filesystem("file").find(ds._path))
+    copied.clear()
+    limit[0] = None
+    ds2 = ds.copy(dst)
+    assert len(copied) == files - 1
+    assert not os.path.exists(os.path.join(dst, defaults.COPY_CHECKPOINT))
+    assert (ds2["num"].compute() == np.arange(100)).all()
+    with pytest.raises(DirectoryNotEmptyException):
+        ds.copy(dst)
+
+
+def test_dataset_copy_memory():
+    fs = fsspec.filesystem("memory")
+    ds = Dataset("cp_memory_original", shape=(10,), schema=simple_schema, fs=fs)
+    ds["num", :] = np.arange(10, dtype="uint8")
+    ds2 = ds.copy("cp_memory_copy", fs=fs)
+    assert (ds2["num"].compute() == np.arange(10)).all()
+    assert not fs.exists("cp_memory_copy/" + defaults.COPY_CHECKPOINT)
+
+
 @pytest.mark.skipif(not s3_creds_exist(), reason="requires s3 credentials")
 def test_dataset_copy_s3_local():
     ds = Dataset(
@@ -1295,6 +1351,384 @@ def test_dataset_store():
         assert ds3["abc", i].compute() == 5 * i
 
 
+def test_dataset_shared_cache():
+    schema = {
+        "first": Tensor((100,), "int32", chunks=(1, 100)),
+        "second": Tensor((100,), "int32", chunks=(1, 100)),
+        "third": {"fourth": Tensor((100,), "int32", chunks=(1, 100))},
+    }
+    ds = Dataset(
+        "./data/test/test_dataset_shared_cache",
+        shape=(20,),
+        schema=schema,
+        mode="w",
+        cache=2000,
+    )
+    for key in ds.keys:
+        assert ds._tensors[key].fs_map._fs_map._storage is ds._chunk_map
+    for i in range(20):
+        ds["first", i] = np.full((100,), i)
+        ds["second", i] = np.full((100,), i)
+        ds["third/fourth", i] = np.full((100,), i)
+    assert ds._chunk_map._total_cached <= 2000
+    ds.flush()
+    for i in range(20):
+        assert (ds["third/fourth", i].compute() == i).all()
+    assert ds._chunk_map._total_cached <= 2000
+
+
+def test_dataset_cache_policy():
+    schema = {"first": Tensor((100,), "int32", chunks=(1, 100))}
+    url = "./data/test/test_dataset_cache_policy"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w", cache_policy="2q")
+    assert isinstance(ds._chunk_map._cached_items, TwoQPolicy)
+    for i in range(20):
+        ds["first", i] = np.full((100,), i)
+    for i in range(20):
+        assert (ds["first", i].compute() == i).all()
+    with pytest.raises(ValueError):
+        Dataset(url, cache_policy="fifo")
+
+
+def test_dataset_cache_stats():
+    schema = {
+        "first": Tensor((100,), "int32", chunks=(1, 100)),
+        "second": Tensor((100,), "int32", chunks=(1, 100)),
+    }
+    url = "./data/test/test_dataset_cache_stats"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w")
+    for i in range(10):
+        ds["first", i] = np.full((100,), i)
+        ds["second", i] = np.full((100,), i)
+    stats = ds.cache_stats()["memory"]
+    assert stats["tensors"]["/first"]["write"] == 10
+    assert stats["total"]["write"] == 20
+    ds.flush()
+
+    ds = Dataset(url, read_ahead=0, decoded_cache=0)
+    for _ in range(2):
+        for i in range(10):
+            assert (ds["first", i].compute() == i).all()
+    stats = ds.cache_stats()["memory"]
+    assert list(stats["tensors"]) == ["/first"]
+    assert stats["total"]["miss"] == 10 and stats["total"]["hit"] == 10
+    assert stats["total"]["hit_bytes"] == stats["total"]["miss_bytes"] > 0
+    ds.reset_cache_stats()
+    assert ds.cache_stats()["memory"]["total"]["hit"] == 0
+
+
+def test_dataset_read_ahead():
+    schema = {"first": Tensor((100,), "int32", chunks=(1, 100))}
+    url = "./data/test/test_dataset_read_ahead"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w")
+    for i in range(20):
+        ds["first", i] = np.full((100,), i)
+    ds.flush()
+    ds = Dataset(url, read_ahead=3)
+    for i in range(2):
+        assert (ds["first", i].compute() == i).all()
+    wait(list(ds._chunk_map._prefetches))
+    prefetched = sorted(key.split(":")[0] for key in ds._chunk_map._prefetched)
+    assert prefetched == ["first/2.0", "first/3.0", "first/4.0"]
+
+
+def test_dataset_cache_coherence():
+    fs = fsspec.filesystem("memory")
+    schema = {"first": Tensor((10,), "int32", chunks=(1, 10))}
+    url = "test/dataset_cache_coherence"
+    remove_cache(url)
+    writer = Dataset(url, shape=(4,), schema=schema, mode="w", fs=fs)
+    for i in range(4):
+        writer["first", i] = np.full((10,), i)
+    writer.flush()
+    reader = Dataset(url, mode="r", fs=fs, cache_coherence=0)
+    assert (reader["first", 1].compute() == 1).all()
+    writer["first", 1] = np.full((10,), 7)
+    writer.flush()
+    assert (reader["first", 1].compute() == 7).all()
+    assert reader.cache_stats()["memory"]["total"]["invalidation"] == 1
+
+
+def test_dataset_prefetch():
+    fs = fsspec.filesystem("memory")
+    schema = {
+        "first": Tensor((10,), "int32", chunks=2),
+        "second": Tensor((None,), "int32", max_shape=(10,), chunks=2),
+    }
+    url = "test/dataset_prefetch"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w", fs=fs)
+    for i in range(10):
+        ds["first", i] = np.full((10,), i)
+        ds["second", i] = np.full((i,), i)
+    ds.flush()
+    remove_cache(url)
+    ds = Dataset(url, mode="r", fs=fs, read_ahead=0)
+    assert ds._tensors["/second"].chunk_keys(range(3, 6)) == [
+        "1.0",
+        "2.0",
+        "--dynamic--/0.0",
+    ]
+    assert ds.prefetch(indexes=slice(2, 6), progress=False) == 5
+    assert ds.cache_stats()["storage"]["total"]["miss"] == 5
+    for i in range(2, 6):
+        assert (ds["first", i].compute() == i).all()
+        assert (ds["second", i].compute() == i).all()
+    assert ds.cache_stats()["storage"]["total"]["miss"] == 5
+    assert ds.prefetch("first", [9], progress=False) == 1
+    with pytest.raises(KeyError):
+        ds.prefetch("third")
+
+
+def test_dataset_sharded():
+    fs = fsspec.filesystem("memory")
+    schema = {
+        "image": Tensor((None, 8), "uint8", max_shape=(8, 8), compressor="sharded_lz4"),
+        "label": Tensor((), "int32", chunks=4, compressor="sharded_zstd"),
+    }
+    url = "test/dataset_sharded"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w", fs=fs)
+    for i in range(10):
+        ds["image", i] = np.full((i % 8 + 1, 8), i)
+        ds["label", i] = i
+    ds.flush()
+    remove_cache(url)
+    ds = Dataset(url, mode="r", fs=fs)
+    for i in [7, 2, 9]:
+        assert (ds["image", i].compute() == np.full((i % 8 + 1, 8), i)).all()
+        assert ds["label", i].compute() == i
+    # Samples are read by range, only the chunk of dynamic shapes is fetched whole
+    assert ds.cache_stats()["storage"]["total"]["miss"] == 1
+    assert ds["label", 2:6].compute().tolist() == [2, 3, 4, 5]
+
+
+def test_dataset_manifest():
+    fs = fsspec.filesystem("memory")
+    schema = {
+        "first": Tensor((10,), "int32", chunks=2),
+        "second": Tensor((None,), "int32", max_shape=(10,), chunks=2),
+    }
+    url = "test/dataset_manifest"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w", fs=fs)
+    for i in range(5):
+        ds["first", i] = np.full((10,), i)
+        ds["second", i] = np.full((i,), i)
+    ds.flush()
+    listings = []
+    ls, find = fs.ls, fs.find
+    fs.ls = lambda *args, **kwargs: listings.append(args) or ls(*args, **kwargs)
+    fs.find = lambda *args, **kwargs: listings.append(args) or find(*args, **kwargs)
+    try:
+        ds = Dataset(url, mode="r", fs=fs)
+        first = ds._tensors["/first"]
+        assert sorted(first.fs_map) == [".zarray", "0.0", "1.0", "2.0"]
+        assert len(first.fs_map) == 4
+        assert first._storage_tensor.nchunks_initialized == 3
+        second = ds._tensors["/second"]
+        assert "--dynamic--/0.0" in list(second.fs_map)
+        assert ds["second", 4].compute().tolist() == [4] * 4
+        assert listings == []
+    finally:
+        fs.ls, fs.find = ls, find
+
+
+def test_dataset_zero_copy():
+    schema = {
+        "first": Tensor((10000,), "int32", chunks=4, compressor=None),
+        "second": Tensor((None,), "int32", max_shape=(5,), compressor=None),
+    }
+    url = "./data/test/test_dataset_zero_copy"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w")
+    for i in range(10):
+        ds["first", i] = np.full((10000,), i)
+        ds["second", i] = np.full((i % 5,), i)
+    ds.flush()
+    ds = Dataset(url, zero_copy=True)
+    view = ds["first", 5].compute()
+    assert view.tolist() == [5] * 10000
+    assert not view.flags.writeable
+    # The sample is a view of the memory mapped chunk file, above MMAP_MIN_SIZE
+    assert isinstance(view.base.base.obj, mmap.mmap)
+    assert ds["first", 4:8].compute()[:, 0].tolist() == [4, 5, 6, 7]
+    assert ds["first", 2:6].compute()[:, 0].tolist() == [2, 3, 4, 5]
+    assert ds["second", 3].compute().tolist() == [3] * 3
+    assert ds["second", 7].compute().tolist() == [7] * 2
+
+
+def test_dataset_packed():
+    schema = {
+        "first": Tensor((10,), "int32", chunks=2),
+        "second": Tensor((None,), "int32", max_shape=(5,)),
+    }
+    url = "./data/test/test_dataset_packed"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w", packed=True)
+    for i in range(20):
+        ds["first", i] = np.full((10,), i)
+        ds["second", i] = np.full((i % 5,), i)
+    ds.flush()
+    assert sorted(os.listdir(url)) == [
+        "chunks.index",
+        "chunks.pack",
+        "meta.json",
+        "version.pkl",
+    ]
+    ds = Dataset(url)
+    assert ds["first", 3:9].compute()[:, 0].tolist() == [3, 4, 5, 6, 7, 8]
+    assert ds["second", 8].compute().tolist() == [8] * 3
+    ds["first", 7] = np.full((10,), 70)
+    ds.flush()
+    ds = Dataset(url, mode="r", cache=False)
+    assert ds["first", 7].compute().tolist() == [70] * 10
+    fs = fsspec.filesystem("memory")
+    Dataset("test/dataset_packed", shape=(2,), schema=schema, fs=fs)
+    with pytest.raises(ValueError):
+        Dataset(
+            "test/dataset_packed",
+            shape=(2,),
+            schema=schema,
+            fs=fs,
+            mode="w",
+            packed=True,
+        )
+    # The existing dataset is left as it was
+    assert fs.exists("test/dataset_packed/meta.json")
+
+
+def test_dataset_superchunks(monkeypatch):
+    monkeypatch.setattr(config, "SUPERCHUNK_SAMPLES", 8)
+    schema = {
+        "label": ClassLabel(num_classes=5),
+        "box": BBox(),
+        "image": Tensor((None, 100), "int32", max_shape=(10, 100)),
+    }
+    url = "./data/test/test_dataset_superchunks"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w", superchunks=True)
+    for i in range(20):
+        ds["label", i] = i % 5
+        ds["box", i] = np.full((4,), i)
+        ds["image", i] = np.full((i % 10, 100), i)
+    ds.flush()
+    assert sorted(os.listdir(posixpath.join(url, defaults.SUPERCHUNK_DIR))) == [
+        "0",
+        "1",
+        "2",
+    ]
+    assert not os.path.exists(posixpath.join(url, "label"))
+    ds = Dataset(url, cache=False)
+    assert ds["label", 9].compute() == 4
+    assert ds["box", 17].compute().tolist() == [17] * 4
+    assert ds["image", 13].compute().shape == (3, 100)
+    # Labels, boxes and image shapes of a sample are in one object
+    keys = set()
+    for key in ("label", "box"):
+        tensor = ds._tensors[f"/{key}"]
+        keys.update(tensor.fs_map.storage_keys(tensor.chunk_keys([12])))
+    tensor = ds._tensors["/image"]
+    storage_keys = tensor.fs_map.storage_keys(tensor.chunk_keys([12]))
+    assert keys == {posixpath.join(defaults.SUPERCHUNK_DIR, "1")}
+    assert keys < set(storage_keys)
+    ds["label", 9] = 1
+    ds.flush()
+    ds = Dataset(url, mode="r")
+    assert ds["label", 8:11].compute().tolist() == [3, 1, 0]
+
+
+def test_dataset_async():
+    schema = {
+        "first": Tensor((10,), "int32", chunks=5),
+        "second": Tensor((None,), "int32", max_shape=(5,)),
+    }
+    url = "./data/test/test_dataset_async"
+    ds = Dataset(url, shape=(50,), schema=schema, mode="w")
+    for i in range(50):
+        ds["first", i] = np.full((10,), i)
+        ds["second", i] = np.full((i % 5,), i)
+    ds.flush()
+
+    async def read(ds):
+        values = await asyncio.gather(
+            *[ds["first", i].numpy_async() for i in range(50)]
+        )
+        assert [value[0] for value in values] == list(range(50))
+        assert (await ds[3:6].numpy_async())[1]["second"].tolist() == [4] * 4
+        assert (await ds["second", 7].compute_async()).tolist() == [7] * 2
+        assert len(await ds.compute_async()) == 50
+
+    ds = Dataset(url)
+    loads = []
+    load = ds._async_loader._load
+    ds._async_loader._load = lambda indexes: loads.append(indexes) or load(indexes)
+    asyncio.run(read(ds))
+    # Reads awaited together fetch their chunks in one batch
+    assert len(loads[0]["/first"]) == 50
+    asyncio.run(read(Dataset(url, cache=False)))
+    # Only the chunks the cache holds are fetched ahead, 5 of 200 bytes
+    ds = Dataset(url, cache=1000)
+    assert ds._async_loader._load({"/first": set(range(50))}) == 5
+    asyncio.run(read(ds))
+
+
+def test_dataset_schedule():
+    schema = {"first": Tensor((100,), "int32", chunks=(1, 100))}
+    url = "./data/test/test_dataset_schedule"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w")
+    for i in range(20):
+        ds["first", i] = np.full((100,), i)
+    ds.flush()
+    with pytest.raises(ValueError):
+        Dataset(url).schedule([0, 1])
+    ds = Dataset(url, cache_policy="belady")
+    order = [7, 3, 12, 0]
+    ds.schedule(order, lookahead=2)
+    ds.advance(0).result()
+    prefetched = sorted(key.split(":")[0] for key in ds._chunk_map._prefetched)
+    assert prefetched == ["first/3.0", "first/7.0"]
+    for step, index in enumerate(order):
+        ds.advance(step)
+        assert (ds["first", index].compute() == index).all()
+
+
+def test_dataset_flush_async():
+    schema = {"first": Tensor((100,), "int32", chunks=(1, 100))}
+    url = "./data/test/test_dataset_flush_async"
+    ds = Dataset(url, shape=(20,), schema=schema, mode="w")
+    for i in range(20):
+        ds["first", i] = np.full((100,), i)
+    ds.flush_async().result()
+    ds = Dataset(url, mode="r")
+    for i in range(20):
+        assert (ds["first", i].compute() == i).all()
+    assert ds.flush_async().result() is None
+
+
+def test_dataset_flush_async_meta_last():
+    fs = fsspec.filesystem("memory")
+    schema = {"first": Tensor((10,), "int32", chunks=2)}
+    url = "test/dataset_flush_async_meta_last"
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w", fs=fs)
+    ds.flush()
+    meta = fs.cat(f"{url}/meta.json")
+    ds["first", 3] = np.full((10,), 3)
+    ds.meta_information["description"] = "changed"
+    # Chunks are uploaded slowly, the meta waits for them
+    uploaded = threading.Event()
+    flush_chunks = ds._chunk_map.flush
+
+    def slow_flush():
+        uploaded.wait(10)
+        flush_chunks()
+
+    ds._chunk_map.flush = slow_flush
+    future = ds.flush_async()
+    assert fs.cat(f"{url}/meta.json") == meta
+    assert not future.done()
+    uploaded.set()
+    future.result()
+    meta = json.loads(fs.cat(f"{url}/meta.json"))
+    assert meta["meta_info"]["description"] == "changed"
+    ds = Dataset(url, mode="r", fs=fs)
+    assert (ds["first", 3].compute() == 3).all()
+
+
 def test_dataset_google():
     ds = Dataset("google/bike")
     assert ds["image_channels", 0].compute() == 3
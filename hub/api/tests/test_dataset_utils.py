@@ -3,7 +3,7 @@ from hub.api.dataset_utils import _get_compressor
 import numcodecs
 import numcodecs.lz4
 import numcodecs.zstd
-from hub.numcodecs import PngCodec
+from hub.numcodecs import PngCodec, ShardCodec
 
 
 def test_get_compression():
@@ -12,5 +12,9 @@ def test_get_compression():
     assert _get_compressor("default") == "default"
     assert _get_compressor("zstd") == numcodecs.Zstd(numcodecs.zstd.DEFAULT_CLEVEL)
     assert _get_compressor("png") == PngCodec(solo_channel=True)
+    assert _get_compressor("sharded_lz4") == ShardCodec(
+        numcodecs.LZ4(numcodecs.lz4.DEFAULT_ACCELERATION)
+    )
+    assert _get_compressor("sharded_default") == ShardCodec(numcodecs.Blosc())
     with pytest.raises(ValueError):
         _get_compressor("abcd")
@@ -0,0 +1,43 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import click
+
+from hub import defaults
+from hub.api.dataset import Dataset
+from hub.log import logger
+
+
+@click.group()
+def cache():
+    """Manage the local cache of datasets"""
+    pass
+
+
+@cache.command()
+@click.argument("url")
+@click.option(
+    "--tensor",
+    "-t",
+    "tensors",
+    multiple=True,
+    help="Tensor to warm, can be repeated. All the tensors by default",
+)
+@click.option("--start", default=None, type=int, help="First sample to warm")
+@click.option("--stop", default=None, type=int, help="Sample to stop warming at")
+@click.option(
+    "--storage-cache",
+    default=defaults.DEFAULT_STORAGE_CACHE_SIZE,
+    type=int,
+    help="Size of the local storage cache in bytes",
+)
+@click.option("--token", default=None, help="Path to the credentials of the storage")
+def warm(url, tensors, start, stop, storage_cache, token):
+    """Download chunks of a dataset into the local cache before a job starts"""
+    ds = Dataset(url, mode="r", token=token, storage_cache=storage_cache)
+    fetched = ds.prefetch(list(tensors) or None, slice(start, stop))
+    ds.close()
+    logger.info(f"Fetched {fetched} chunks of {url} into the local cache")
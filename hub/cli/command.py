@@ -8,6 +8,7 @@ import click
 from hub import config
 from hub.log import configure_logger
 from hub.cli.auth import login, logout, register, reporting
+from hub.cli.cache import cache
 from hub.version import __version__
 
 
@@ -36,6 +37,7 @@ def add_commands(cli):
     cli.add_command(logout)
     cli.add_command(cli)
     cli.add_command(reporting)
+    cli.add_command(cache)
 
 
 add_commands(cli)
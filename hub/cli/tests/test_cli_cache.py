@@ -0,0 +1,45 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+
+import numpy as np
+from click.testing import CliRunner
+
+from hub import Dataset
+from hub.cli.cache import cache
+from hub.schema import Tensor
+from hub.store import store
+from hub.store.store import get_cache_path, remove_cache
+
+
+def cached_chunks(url):
+    """Chunks in the disk cache of the dataset, without their commit id"""
+    folder = get_cache_path(url)
+    return sorted(
+        os.path.relpath(os.path.join(root, name), folder).split(":")[0]
+        for root, _, names in os.walk(folder)
+        for name in names
+        if ":" in name and not name.endswith(".version")
+    )
+
+
+def test_cache_warm(monkeypatch):
+    # Local datasets skip the disk cache, so it is used as if the folder was remote
+    monkeypatch.setattr(store, "_is_local_fs", lambda fs: False)
+    url = "./data/test/test_cli_cache_warm"
+    schema = {"first": Tensor((10,), "int32", chunks=2)}
+    ds = Dataset(url, shape=(10,), schema=schema, mode="w")
+    for i in range(10):
+        ds["first", i] = np.full((10,), i)
+    ds.close()
+    remove_cache(url)
+    result = CliRunner().invoke(
+        cache, ["warm", url, "--tensor", "first", "--start", "2", "--stop", "6"]
+    )
+    assert result.exit_code == 0, result.output
+    assert cached_chunks(url) == ["first/1.0", "first/2.0"]
+    remove_cache(url)
@@ -19,6 +19,43 @@ HUB_LOCAL_REST_ENDPOINT = "http://localhost:5000"
 
 DEFAULT_TIMEOUT = 170
 
+# Storage requests of the process run in one pool, see hub.store.io_executor
+IO_WORKERS = 32
+# Bytes of writes in flight, above which more writes wait in the queue
+IO_MAX_IN_FLIGHT_BYTES = 2 ** 30
+# Requests in flight to each backend start at IO_INITIAL_CONCURRENCY and are tuned
+# up to IO_WORKERS, see hub.store.concurrency.AIMDLimiter
+IO_INITIAL_CONCURRENCY = 8
+# Reads taking longer than HEDGE_QUANTILE of the recent ones are sent once more
+HEDGE_REQUESTS = False
+HEDGE_QUANTILE = 0.95
+# Throttled or failed S3 requests are retried with jittered exponential backoff
+S3_MAX_RETRIES = 8
+S3_RETRY_BASE_DELAY = 0.1
+S3_RETRY_MAX_DELAY = 10
+# Objects above S3_MULTIPART_THRESHOLD bytes are sent and read in parts
+S3_MULTIPART_THRESHOLD = 64 * 2 ** 20
+S3_PART_SIZE = 16 * 2 ** 20
+# Azure blobs above AZURE_SINGLE_PUT_SIZE bytes are sent in blocks and read in ranges
+# of AZURE_BLOCK_SIZE, up to AZURE_MAX_CONCURRENCY at once
+AZURE_SINGLE_PUT_SIZE = 64 * 2 ** 20
+AZURE_BLOCK_SIZE = 16 * 2 ** 20
+AZURE_MAX_CONCURRENCY = 8
+# Failed and throttled reads of HTTP datasets are retried with exponential backoff
+HTTP_MAX_RETRIES = 8
+HTTP_RETRY_BASE_DELAY = 0.1
+# Memory mapped local datasets read smaller chunks into bytes, each map held keeps
+# a file descriptor open
+MMAP_MIN_SIZE = 2 ** 16
+# Packed stores are compacted once overwritten and deleted values take this part of them
+PACKED_COMPACT_RATIO = 0.5
+# Datasets with superchunks put the chunks of SUPERCHUNK_SAMPLES samples of the tensors
+# with samples of at most SUPERCHUNK_MAX_SAMPLE_BYTES, and of the dynamic shapes, in one
+# object. Up to SUPERCHUNK_MAX_PENDING changed ones are kept until flush
+SUPERCHUNK_SAMPLES = 4096
+SUPERCHUNK_MAX_SAMPLE_BYTES = 1024
+SUPERCHUNK_MAX_PENDING = 64
+
 GET_TOKEN_REST_SUFFIX = "/api/user/token"
 GET_CREDENTIALS_SUFFIX = "/api/credentials"
 GET_REGISTER_SUFFIX = "/api/user/register"
@@ -3,7 +3,21 @@ OBJECT_CHUNK = 128
 DEFAULT_COMPRESSOR = "default"
 DEFAULT_MEMORY_CACHE_SIZE = 2 ** 26
 DEFAULT_STORAGE_CACHE_SIZE = 2 ** 28
+DEFAULT_META_CACHE_SIZE = 2 ** 22
+DEFAULT_WRITE_BEHIND_WORKERS = 16
+DEFAULT_BATCH_WORKERS = 16
+DEFAULT_READ_AHEAD_CHUNKS = 4
+DEFAULT_PREFETCH_WORKERS = 4
+DEFAULT_PREFETCH_BATCH_CHUNKS = 64
+DEFAULT_SCHEDULE_LOOKAHEAD = 8
+DEFAULT_COPY_BATCH_FILES = 256
+DEFAULT_CACHE_POLICY = "lru"
+DEFAULT_DECODED_CACHE_SIZE = 2 ** 27
 AZURE_HOST_SUFFIX = "blob.core.windows.net"
 META_FILE = "meta.json"
 VERSION_INFO = "version.pkl"
+PACK_FILE = "chunks.pack"
+PACK_INDEX_FILE = "chunks.index"
+COPY_CHECKPOINT = ".copy_checkpoint"
+SUPERCHUNK_DIR = "--superchunks--"
 CRED_EXPIRATION = 36000  # in seconds
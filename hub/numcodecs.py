@@ -5,10 +5,12 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 """
 
 from io import BytesIO
+import math
 
 import zarr
 import numcodecs
 from numcodecs.abc import Codec
+from numcodecs.compat import ensure_bytes, ensure_contiguous_ndarray, ndarray_copy
 import numpy as np
 from PIL import Image
 
@@ -90,3 +92,101 @@ class PngCodec(Codec):
 
 
 numcodecs.register_codec(PngCodec, "png")
+
+
+SHARD_MAGIC = b"HSH1"
+# Chunk size before compression (uint64), block count (uint32) and SHARD_MAGIC
+SHARD_TRAILER_SIZE = 16
+
+
+class ShardCodec(Codec):
+    """Splits chunks into blocks of block_rows rows along the first dim,
+    compressed one by one by the inner compressor and indexed in a footer,
+    so a single sample can be read and decoded without the rest of the chunk.
+
+    Layout: compressed blocks, offsets of the blocks and of their end (uint64),
+    then the trailer of SHARD_TRAILER_SIZE bytes.
+    """
+
+    codec_id = "shard"
+
+    def __init__(self, compressor: Codec = None, block_rows: int = 1):
+        self.compressor = compressor
+        self.block_rows = block_rows
+
+    def block_count(self, rows: int) -> int:
+        """Number of blocks of a chunk with rows rows"""
+        return math.ceil(rows / self.block_rows)
+
+    def footer_size(self, rows: int) -> int:
+        """Size of the footer of a chunk with rows rows"""
+        return 8 * (self.block_count(rows) + 1) + SHARD_TRAILER_SIZE
+
+    def block_offsets(self, footer) -> np.ndarray:
+        """Offsets of the blocks and of their end, read from the end of the shard
+        Raises ValueError if footer is not the end of a shard
+        """
+        footer = ensure_bytes(footer)
+        if len(footer) < SHARD_TRAILER_SIZE or footer[-4:] != SHARD_MAGIC:
+            raise ValueError("Not a shard")
+        count = int(np.frombuffer(footer[-8:-4], dtype="<u4")[0])
+        size = 8 * (count + 1)
+        if len(footer) < size + SHARD_TRAILER_SIZE:
+            raise ValueError(f"Shard footer should be {size} bytes, not {len(footer)}")
+        index = footer[-size - SHARD_TRAILER_SIZE : -SHARD_TRAILER_SIZE]
+        return np.frombuffer(index, dtype="<u8")
+
+    def decode_block(self, buf) -> bytes:
+        """Decompresses one block read with the offsets of block_offsets()"""
+        if self.compressor is None:
+            return ensure_bytes(buf)
+        block = self.compressor.decode(ensure_bytes(buf))
+        return ensure_contiguous_ndarray(block).view("u1").tobytes()
+
+    def encode(self, buf):
+        if isinstance(buf, np.ndarray) and buf.ndim > 0 and len(buf) > 0:
+            blocks = [
+                np.ascontiguousarray(buf[i : i + self.block_rows])
+                for i in range(0, len(buf), self.block_rows)
+            ]
+        else:
+            # Filters (e.g. pickled objects) give bytes which can't be split in rows
+            blocks = [ensure_contiguous_ndarray(buf)]
+        if self.compressor is not None:
+            blocks = [ensure_bytes(self.compressor.encode(block)) for block in blocks]
+        else:
+            blocks = [ensure_bytes(block) for block in blocks]
+        offsets = np.cumsum([0] + [len(block) for block in blocks], dtype="<u8")
+        trailer = (
+            np.array([ensure_contiguous_ndarray(buf).nbytes], dtype="<u8").tobytes()
+            + np.array([len(blocks)], dtype="<u4").tobytes()
+            + SHARD_MAGIC
+        )
+        return b"".join(blocks) + offsets.tobytes() + trailer
+
+    def decode(self, buf, out=None):
+        buf = ensure_bytes(buf)
+        offsets = self.block_offsets(buf)
+        result = b"".join(
+            self.decode_block(buf[start:stop])
+            for start, stop in zip(offsets[:-1], offsets[1:])
+        )
+        return ndarray_copy(result, out)
+
+    def get_config(self):
+        return {
+            "id": self.codec_id,
+            "compressor": self.compressor and self.compressor.get_config(),
+            "block_rows": self.block_rows,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        compressor = config.get("compressor")
+        return ShardCodec(
+            compressor and numcodecs.get_codec(compressor),
+            config.get("block_rows", 1),
+        )
+
+
+numcodecs.register_codec(ShardCodec, "shard")
@@ -7,8 +7,16 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 from fsspec import AbstractFileSystem
 import array
 from collections.abc import MutableMapping
+from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient
 
+from hub import config, defaults
+from hub.store.batched import check_missing, concurrent_getitems, concurrent_setitems
+from hub.store.concurrency import pooled_session
+
+# Most blobs a batch request of Azure can delete
+DELETE_BATCH_SIZE = 256
+
 
 class AzureBlobFileSystem(AbstractFileSystem):
     def __init__(
@@ -71,26 +79,42 @@ class AzureBlobFileSystem(AbstractFileSystem):
         ------
         ValueError if none of the connection details are available
         """
+        # Blobs above the single put size are sent in blocks, and read in ranges
+        # of the block size, up to config.AZURE_MAX_CONCURRENCY at once
+        options = dict(
+            session=pooled_session(self.request_session),
+            session_owner=False,
+            max_single_put_size=config.AZURE_SINGLE_PUT_SIZE,
+            max_block_size=config.AZURE_BLOCK_SIZE,
+            max_single_get_size=config.AZURE_SINGLE_PUT_SIZE,
+            max_chunk_get_size=config.AZURE_BLOCK_SIZE,
+        )
+        if self.socket_timeout is not None:
+            options["read_timeout"] = self.socket_timeout
         try:
             self.account_url: str = f"https://{self.account_name}.blob.core.windows.net"
             if self.credential is not None:
                 self.service_client = BlobServiceClient(
-                    account_url=self.account_url, credential=self.credential
+                    account_url=self.account_url, credential=self.credential, **options
                 )
             elif self.connection_string is not None:
                 self.service_client = BlobServiceClient.from_connection_string(
-                    conn_str=self.connection_string
+                    conn_str=self.connection_string, **options
                 )
             elif self.account_key is not None:
                 self.service_client = BlobServiceClient(
-                    account_url=self.account_url, credential=self.account_key
+                    account_url=self.account_url, credential=self.account_key, **options
                 )
             elif self.sas_token is not None:
                 self.service_client = BlobServiceClient(
-                    account_url=self.account_url + self.sas_token, credential=None
+                    account_url=self.account_url + self.sas_token,
+                    credential=None,
+                    **options,
                 )
             else:
-                self.service_client = BlobServiceClient(account_url=self.account_url)
+                self.service_client = BlobServiceClient(
+                    account_url=self.account_url, **options
+                )
 
         except Exception as e:
             raise ValueError(f"unable to connect to account for {e}")
@@ -107,8 +131,9 @@ class AzureBlobFileSystem(AbstractFileSystem):
         container_name = split_path[0]
         sub_path = "/".join(split_path[1:])
         container = self.service_client.get_container_client(container_name)
-        it = container.list_blobs(name_starts_with=sub_path)
-        return len(list(it)) > 0
+        # Only the first blob is listed
+        it = container.list_blobs(name_starts_with=sub_path, results_per_page=1)
+        return next(iter(it), None) is not None
 
     def ls(self, path, refresh=True):
         """
@@ -141,14 +166,22 @@ class AzureBlobFileSystem(AbstractFileSystem):
         return [f"{container_name}/{item['name']}" for item in it]
 
     def rm(self, path, recursive=False, maxdepth=None):
-        """Removes all the files in the given path"""
+        """Removes all the files in the given path, DELETE_BATCH_SIZE per request"""
         split_path = path.split("/")
         container_name = split_path[0]
         sub_path = "/".join(split_path[1:])
         container = self.service_client.get_container_client(container_name)
-        it = container.list_blobs(name_starts_with=sub_path)
-        for item in it:
-            container.delete_blob(item)
+        blobs = container.list_blobs(name_starts_with=sub_path)
+        names = [item["name"] for item in blobs]
+        self.delete_blobs(container_name, names)
+
+    def delete_blobs(self, container_name, names):
+        """Deletes the blobs of the container in batches, missing ones are ignored"""
+        container = self.service_client.get_container_client(container_name)
+        for i in range(0, len(names), DELETE_BATCH_SIZE):
+            container.delete_blobs(
+                *names[i : i + DELETE_BATCH_SIZE], raise_on_any_failure=False
+            )
 
     def makedirs(self, path, exist_ok=False):
         """Recursively creates directories in path"""
@@ -160,25 +193,51 @@ class AzureBlobFileSystem(AbstractFileSystem):
         return FSMap(root, self)
 
     def upload(self, path, value):
-        """Uploads value to the given path"""
+        """Uploads value to the given path, in parallel blocks if it is large"""
         split_path = path.split("/")
         container_name = split_path[0]
         sub_path = "/".join(split_path[1:])
         blob_client = self.service_client.get_blob_client(container_name, sub_path)
-        blob_client.upload_blob(value, overwrite=True)
+        blob_client.upload_blob(
+            value, overwrite=True, max_concurrency=config.AZURE_MAX_CONCURRENCY
+        )
 
-    def download(self, path):
-        """Downloads the value from the given path"""
-        if not self.exists(path):
-            raise KeyError()
+    def download(self, path, start=None, end=None):
+        """Downloads the value from the given path, or its bytes start to end
+        Large values are read in parallel ranges
+        """
         split_path = path.split("/")
         container_name = split_path[0]
         sub_path = "/".join(split_path[1:])
         blob_client = self.service_client.get_blob_client(container_name, sub_path)
-        return blob_client.download_blob().readall()
+        try:
+            if (start is not None and start < 0) or (end is not None and end < 0):
+                size = blob_client.get_blob_properties().size
+                start, end, _ = slice(start, end).indices(size)
+            options = dict(max_concurrency=config.AZURE_MAX_CONCURRENCY)
+            if start is not None or end is not None:
+                options["offset"] = start or 0
+                if end is not None:
+                    options["length"] = end - options["offset"]
+                    if options["length"] <= 0:
+                        return b""
+            return blob_client.download_blob(**options).readall()
+        except ResourceNotFoundError:
+            raise FileNotFoundError(path)
+
+    def version(self, path):
+        """Returns ETag of the blob at the given path"""
+        split_path = path.split("/")
+        container_name = split_path[0]
+        sub_path = "/".join(split_path[1:])
+        blob_client = self.service_client.get_blob_client(container_name, sub_path)
+        try:
+            return blob_client.get_blob_properties().etag
+        except ResourceNotFoundError:
+            raise FileNotFoundError(path)
 
-    def cat_file(self, path):
-        return self.download(path)
+    def cat_file(self, path, start=None, end=None):
+        return self.download(path, start, end)
 
     def pipe_file(self, path, value):
         return self.upload(path, value)
@@ -244,10 +303,42 @@ class FSMap(MutableMapping):
         """returns length of the structure"""
         return len(self.fs.find(self.root))
 
+    def getitems(self, keys, on_error="omit"):
+        """Retrieve multiple items using concurrent downloads"""
+        result = concurrent_getitems(
+            self.__getitem__, keys, defaults.DEFAULT_BATCH_WORKERS
+        )
+        check_missing(keys, result, on_error)
+        return result
+
+    def getversion(self, key):
+        """ETag of the key"""
+        try:
+            return self.fs.version(self._key_to_str(key))
+        except self.missing_exceptions:
+            raise KeyError(key)
+
+    def getversions(self, keys):
+        """Retrieve ETags of multiple keys using concurrent requests"""
+        return concurrent_getitems(
+            self.getversion, keys, defaults.DEFAULT_BATCH_WORKERS
+        )
+
+    def setitems(self, values):
+        """Store multiple items using concurrent uploads"""
+        concurrent_setitems(self.__setitem__, values, defaults.DEFAULT_BATCH_WORKERS)
+
     def __delitem__(self, key):
         """Remove key"""
         self.fs.rm(self._key_to_str(key))
 
+    def delitems(self, keys):
+        """Removes multiple keys with batch requests, missing ones are ignored"""
+        paths = [self._key_to_str(key).split("/", 1) for key in keys]
+        for container_name in {container for container, _ in paths}:
+            names = [name for container, name in paths if container == container_name]
+            self.fs.delete_blobs(container_name, names)
+
     def __contains__(self, key):
         """Does key exist in mapping?"""
         path = self._key_to_str(key)
@@ -0,0 +1,137 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterable, Optional
+
+from hub.store.io_executor import get_executor
+
+# Fields of fsspec info() which change whenever the object is rewritten, by preference
+VERSION_FIELDS = (
+    "ETag",
+    "etag",
+    "generation",
+    "md5Hash",
+    "LastModified",
+    "last_modified",
+    "mtime",
+    "created",
+)
+
+
+def getitems(storage: MutableMapping, keys: Iterable[str]) -> Dict[str, bytes]:
+    """Gets multiple keys from storage, in one batch if storage supports it
+    Missing keys are omitted from the result
+    """
+    if hasattr(storage, "getitems"):
+        return storage.getitems(list(keys), on_error="omit")
+    result = {}
+    for key in keys:
+        try:
+            result[key] = storage[key]
+        except KeyError:
+            pass
+    return result
+
+
+def getrange(storage: MutableMapping, key: str, start: int, stop: int = None) -> bytes:
+    """Gets value[start:stop] of the key, start can be negative to get the end
+    Only the range is read if storage supports it
+    """
+    if hasattr(storage, "getrange"):
+        return storage.getrange(key, start, stop)
+    return bytes(storage[key][start:stop])
+
+
+def setitems(storage: MutableMapping, values: Dict[str, bytes]) -> None:
+    """Sets multiple keys in storage, in one batch if storage supports it"""
+    if hasattr(storage, "setitems"):
+        storage.setitems(values)
+    else:
+        for key, value in values.items():
+            storage[key] = value
+
+
+def delitems(storage: MutableMapping, keys: Iterable[str]) -> None:
+    """Deletes multiple keys from storage, in one batch if storage supports it
+    Missing keys are ignored
+    """
+    if hasattr(storage, "delitems"):
+        storage.delitems(list(keys))
+        return
+    for key in keys:
+        try:
+            del storage[key]
+        except KeyError:
+            pass
+
+
+def getversions(
+    storage: MutableMapping, keys: Iterable[str]
+) -> Optional[Dict[str, str]]:
+    """Gets versions (ETag, generation or mtime) of multiple keys in one batch
+    Missing keys are omitted, returns None if storage does not tell versions
+    """
+    if not hasattr(storage, "getversions"):
+        return None
+    return storage.getversions(list(keys))
+
+
+def object_version(info: dict) -> str:
+    """Version of the object described by fsspec info(), changes when it is rewritten"""
+    for field in VERSION_FIELDS:
+        if info.get(field) is not None:
+            return f"{info.get('size')}:{info[field]}"
+    return str(info.get("size"))
+
+
+def check_missing(keys: Iterable[str], result: Dict[str, bytes], on_error: str):
+    """Raises KeyError for the first key not found, unless on_error is "omit" """
+    if on_error == "omit":
+        return
+    for key in keys:
+        if key not in result:
+            raise KeyError(key)
+
+
+def concurrent_getitems(
+    getitem: Callable, keys: Iterable[str], workers: int
+) -> Dict[str, bytes]:
+    """Calls getitem for all keys concurrently in the I/O executor of the process
+    If workers <= 1 they are called one by one in the calling thread
+    Keys for which getitem raises KeyError are omitted from the result
+    """
+    keys = list(dict.fromkeys(keys))
+
+    def get(key):
+        try:
+            return getitem(key)
+        except KeyError:
+            return None
+
+    if len(keys) <= 1 or workers <= 1:
+        values = map(get, keys)
+    else:
+        values = get_executor().map(get, keys)
+    return {key: value for key, value in zip(keys, values) if value is not None}
+
+
+def concurrent_setitems(setitem: Callable, values: Dict[str, bytes], workers: int):
+    """Calls setitem for all the items concurrently in the I/O executor of the process
+    If workers <= 1 they are called one by one in the calling thread
+    """
+    if len(values) <= 1 or workers <= 1:
+        for key, value in values.items():
+            setitem(key, value)
+        return
+    executor = get_executor()
+    futures = [
+        executor.submit(setitem, key, value, size=len(value))
+        for key, value in values.items()
+    ]
+    executor.wait(futures)
+    for future in futures:
+        future.result()
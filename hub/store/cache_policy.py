@@ -0,0 +1,300 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
+from itertools import chain
+from typing import Iterable, List, Tuple, Union
+
+
+class CachePolicy(MutableMapping):
+    """Maps cached keys to their sizes and decides which key is evicted first
+    Setting an existing key updates its size without counting it as an access
+    """
+
+    def access(self, key):
+        """Records a cache hit of the key"""
+        raise NotImplementedError()
+
+    def evict(self) -> Tuple[str, int]:
+        """Removes the key which should leave the cache first
+        Returns the key and its size
+        """
+        raise NotImplementedError()
+
+
+class LRUPolicy(CachePolicy):
+    """Evicts the least recently used key"""
+
+    def __init__(self, max_size=None):
+        self._items = OrderedDict()
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __setitem__(self, key, size):
+        self._items[key] = size
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def access(self, key):
+        self._items.move_to_end(key)
+
+    def evict(self):
+        return self._items.popitem(last=False)
+
+
+class TwoQPolicy(CachePolicy):
+    """2Q policy, resistant to scans over data larger than the cache
+    New keys enter a FIFO queue, which takes up to in_ratio of max_size.
+    As many keys as are cached are remembered after leaving it, and only those
+    requested again get into the main LRU queue, so a pass over a big tensor
+    does not evict the chunks which are read over and over.
+    """
+
+    def __init__(self, max_size, in_ratio=0.25):
+        self._max_in = max_size * in_ratio
+        self._in = OrderedDict()
+        self._in_size = 0
+        self._main = OrderedDict()
+        # keys recently evicted from the FIFO queue, only keys are kept
+        self._ghosts = OrderedDict()
+
+    def __getitem__(self, key):
+        if key in self._in:
+            return self._in[key]
+        return self._main[key]
+
+    def __setitem__(self, key, size):
+        if key in self._in:
+            self._in_size += size - self._in[key]
+            self._in[key] = size
+        elif key in self._main:
+            self._main[key] = size
+        elif key in self._ghosts:
+            del self._ghosts[key]
+            self._main[key] = size
+        else:
+            self._in[key] = size
+            self._in_size += size
+
+    def __delitem__(self, key):
+        if key in self._in:
+            self._in_size -= self._in.pop(key)
+        else:
+            del self._main[key]
+
+    def __iter__(self):
+        return chain(self._in, self._main)
+
+    def __len__(self):
+        return len(self._in) + len(self._main)
+
+    def access(self, key):
+        # Hits in the FIFO queue are usually the same chunk read a few times in a row
+        if key in self._main:
+            self._main.move_to_end(key)
+
+    def evict(self):
+        if self._in and (self._in_size > self._max_in or not self._main):
+            key, size = self._in.popitem(last=False)
+            self._in_size -= size
+            self._ghosts[key] = None
+            if len(self._ghosts) > len(self):
+                self._ghosts.popitem(last=False)
+            return key, size
+        return self._main.popitem(last=False)
+
+
+class LFUPolicy(CachePolicy):
+    """Evicts the least frequently used key, least recently used among equals
+    Access counts are halved every aging accesses, so keys which were hot
+    a long time ago do not stay in the cache forever.
+    """
+
+    def __init__(self, max_size=None, aging=1024):
+        self._aging = aging
+        self._sizes = dict()
+        # key -> (count, tick), heap entries not matching it are stale
+        self._counts = dict()
+        self._heap = []
+        self._tick = 0
+        self._accesses = 0
+
+    def __getitem__(self, key):
+        return self._sizes[key]
+
+    def __setitem__(self, key, size):
+        if key not in self._sizes:
+            self._push(key, 1)
+        self._sizes[key] = size
+
+    def __delitem__(self, key):
+        del self._sizes[key]
+        del self._counts[key]
+
+    def __iter__(self):
+        return iter(self._sizes)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def access(self, key):
+        self._push(key, self._counts[key][0] + 1)
+        self._accesses += 1
+        if self._accesses >= self._aging:
+            self._age()
+        elif len(self._heap) > 2 * len(self._counts) + 64:
+            self._rebuild()
+
+    def evict(self):
+        while True:
+            count, tick, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == (count, tick):
+                del self._counts[key]
+                return key, self._sizes.pop(key)
+
+    def _push(self, key, count):
+        self._tick += 1
+        self._counts[key] = (count, self._tick)
+        heapq.heappush(self._heap, (count, self._tick, key))
+
+    def _age(self):
+        self._accesses = 0
+        self._counts = {
+            key: (count // 2, tick) for key, (count, tick) in self._counts.items()
+        }
+        self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(count, tick, key) for key, (count, tick) in self._counts.items()]
+        heapq.heapify(self._heap)
+
+
+class BeladyPolicy(LRUPolicy):
+    """Belady's MIN policy, evicts the key whose next use is the farthest
+    The keys read at each step (e.g. sample of a shuffled epoch) are given
+    by schedule() and the reader tells the current step with advance().
+    Keys not scheduled anymore go first, least recently used among them,
+    so without a schedule it works as LRU.
+    """
+
+    def __init__(self, max_size=None):
+        super().__init__()
+        self._steps = []
+        # key -> sorted steps it is read at
+        self._uses = dict()
+        self._step = 0
+        # key -> (next use, tick of the last access), other heap entries are stale
+        self._next = dict()
+        self._heap = []
+        self._tick = 0
+
+    def __setitem__(self, key, size):
+        if key not in self._items:
+            self._touch(key)
+        super().__setitem__(key, size)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        del self._next[key]
+
+    def access(self, key):
+        super().access(key)
+        self._touch(key)
+
+    def schedule(self, steps: Iterable[Iterable[str]]):
+        """Sets the keys read at each step and restarts from the first step"""
+        self._steps = [list(keys) for keys in steps]
+        uses = defaultdict(list)
+        for step, keys in enumerate(self._steps):
+            for key in keys:
+                uses[key].append(step)
+        self._uses = dict(uses)
+        self._step = 0
+        self._rebuild()
+
+    def advance(self, step: int):
+        """Sets the step being read"""
+        if step < self._step:
+            self._step = step
+            self._rebuild()
+            return
+        # Only the keys read at the steps passed have another next use
+        passed = self._steps[self._step : step]
+        self._step = step
+        for key in dict.fromkeys(key for keys in passed for key in keys):
+            if key in self._next:
+                self._push(key, self._next[key][1])
+
+    def upcoming(self, lookahead: int) -> List[str]:
+        """Keys read in the next lookahead steps, current step included"""
+        keys = self._steps[self._step : self._step + lookahead]
+        return list(dict.fromkeys(key for step in keys for key in step))
+
+    def _next_use(self, key):
+        uses = self._uses.get(key)
+        if uses is None:
+            return math.inf
+        i = bisect_left(uses, self._step)
+        return uses[i] if i < len(uses) else math.inf
+
+    def evict(self):
+        while True:
+            next_use, tick, key = heapq.heappop(self._heap)
+            if self._next.get(key) == (-next_use, tick):
+                del self._next[key]
+                return key, self._items.pop(key)
+
+    def _touch(self, key):
+        self._tick += 1
+        self._push(key, self._tick)
+
+    def _push(self, key, tick):
+        # Farthest next use first, least recently used among equals
+        next_use = self._next_use(key)
+        self._next[key] = (next_use, tick)
+        heapq.heappush(self._heap, (-next_use, tick, key))
+        if len(self._heap) > 2 * len(self._next) + 64:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._next = {
+            key: (self._next_use(key), tick) for key, (_, tick) in self._next.items()
+        }
+        self._heap = [(-use, tick, key) for key, (use, tick) in self._next.items()]
+        heapq.heapify(self._heap)
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "2q": TwoQPolicy,
+    "lfu": LFUPolicy,
+    "belady": BeladyPolicy,
+}
+
+
+def create_policy(policy: Union[str, CachePolicy], max_size) -> CachePolicy:
+    """Creates cache policy by name, "lru", "2q", "lfu" or "belady"
+    CachePolicy instances are returned as is
+    """
+    if isinstance(policy, CachePolicy):
+        return policy
+    if policy not in POLICIES:
+        raise ValueError(
+            f"Unknown cache policy {policy}, should be one of {', '.join(POLICIES)}"
+        )
+    return POLICIES[policy](max_size)
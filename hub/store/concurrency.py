@@ -0,0 +1,200 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable
+
+import numpy as np
+import requests
+
+from hub import config
+from hub.store.io_executor import get_executor
+
+# Error codes and HTTP statuses backends answer with when requests should slow down
+THROTTLE_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequests",
+}
+THROTTLE_STATUSES = {429, 503}
+
+
+def is_throttled(err: Exception) -> bool:
+    """Tells if the request failed because the backend is overloaded"""
+    response = getattr(err, "response", None)
+    if isinstance(response, dict):
+        # botocore ClientError
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return code in THROTTLE_CODES or status in THROTTLE_STATUSES
+    # requests HTTPError holds the response
+    for obj in (err, response):
+        for attr in ("status_code", "status", "code"):
+            if getattr(obj, attr, None) in THROTTLE_STATUSES:
+                return True
+    return False
+
+
+class AIMDLimiter:
+    """Limits the requests in flight to a backend and tunes the limit
+    with additive increase, multiplicative decrease (AIMD).
+    The limit grows by one every limit requests which succeed, and is
+    multiplied by decrease when the backend throttles, or when the recent latency
+    gets latency_tolerance times above the long term one, at most once per round trip.
+    Latencies below latency_floor seconds are not compared, their changes are noise.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_floor: float = 0.005,
+        window: int = 1000,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.in_flight = 0
+        self.throttles = 0
+        self.hedges = 0
+        self._latencies = deque(maxlen=window)
+        # Exponential moving averages of the latency, recent and long term
+        self._recent = None
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._hedge_delay = None
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Waits until a request can be sent, returns the time it started at"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, throttled=False):
+        """Records the end of the request started at started"""
+        latency = time.monotonic() - started
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self._decrease()
+            else:
+                self._record(latency)
+            self._cond.notify_all()
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Calls fn once a request can be sent, recording its latency"""
+        started = self.acquire()
+        throttled = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception as err:
+            throttled = is_throttled(err)
+            raise
+        finally:
+            self.release(started, throttled)
+
+    def hedge_delay(self):
+        """config.HEDGE_QUANTILE of the recent latencies, None until there are enough"""
+        return self._hedge_delay
+
+    def _record(self, latency):
+        self._latencies.append(latency)
+        if self._recent is None:
+            self._recent = self._baseline = latency
+        self._recent += 0.1 * (latency - self._recent)
+        self._baseline += 0.01 * (latency - self._baseline)
+        baseline = max(self._baseline, self.latency_floor)
+        if self._recent > self.latency_tolerance * baseline:
+            self._decrease()
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        if len(self._latencies) >= 20 and len(self._latencies) % 10 == 0:
+            self._hedge_delay = float(
+                np.quantile(self._latencies, config.HEDGE_QUANTILE)
+            )
+
+    def _decrease(self):
+        now = time.monotonic()
+        # Requests sent in the same round trip see the same overload
+        if now - self._last_decrease < (self._recent or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+_limiters = dict()
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(backend: str) -> AIMDLimiter:
+    """Returns limiter of the requests to the backend (e.g. bucket url)"""
+    key = (os.getpid(), backend)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AIMDLimiter(
+                config.IO_INITIAL_CONCURRENCY, config.IO_WORKERS
+            )
+        return _limiters[key]
+
+
+def hedged(request: Callable, limiter: AIMDLimiter):
+    """Calls request(), if config.HEDGE_REQUESTS is set and it takes longer than
+    the hedge delay of the limiter, issues it once more and returns the first result
+    request should be idempotent, e.g. a GET
+    """
+    delay = limiter.hedge_delay()
+    if not config.HEDGE_REQUESTS or delay is None:
+        return request()
+    executor = get_executor()
+    futures = [executor.submit(request)]
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        with limiter._cond:
+            limiter.hedges += 1
+        futures.append(executor.submit(request))
+    while True:
+        done, pending = executor.wait(futures, return_when=FIRST_COMPLETED)
+        succeeded = [future for future in done if future.exception() is None]
+        if succeeded or not pending:
+            for future in pending:
+                future.cancel()
+            return (succeeded or list(done))[0].result()
+        futures = list(pending)
+
+
+def pooled_session(session: requests.Session = None, retries=0) -> requests.Session:
+    """Returns session (a new one if None) keeping up to config.IO_WORKERS
+    connections to each host, as many as the limiters may send requests at once
+    requests keeps 10, connections above are closed after every request
+    retries -> int or urllib3 Retry of the requests
+    """
+    session = session or requests.Session()
+    # Adapters of mutual TLS sessions hold the client certificate
+    if not getattr(session, "is_mtls", False):
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=config.IO_WORKERS,
+            pool_maxsize=config.IO_WORKERS,
+            max_retries=retries,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
@@ -0,0 +1,88 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import time
+from threading import Lock
+from typing import Callable, Hashable
+
+import numpy as np
+
+from hub.store.cache_policy import LRUPolicy
+
+
+class DecodedChunkCache:
+    """Size-bounded LRU cache of decoded chunks, shared by all the tensors of a dataset
+    A chunk read sample by sample is decompressed only once while it stays cached
+    max_age -> seconds after which a chunk is decoded again, if None chunks never expire
+    """
+
+    def __init__(self, max_size: int, max_age: float = None):
+        self._max_size = max_size
+        self._max_age = max_age
+        # key -> decoded chunk and time.monotonic() it was loaded at
+        self._items = dict()
+        self._policy = LRUPolicy()
+        self._total = 0
+        # Incremented on every invalidation, so chunks read before it are not cached
+        self._version = 0
+        self._lock = Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __getstate__(self):
+        return {"_max_size": self._max_size, "_max_age": self._max_age}
+
+    def __setstate__(self, state):
+        self.__init__(state["_max_size"], state["_max_age"])
+
+    def get_or_load(self, key: Hashable, load: Callable[[], np.ndarray]) -> np.ndarray:
+        """Returns cached chunk, or loads it with load() and caches it if it fits"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and not self._expired(item[1]):
+                self._policy.access(key)
+                return item[0]
+            version = self._version
+        array = load()
+        if array.nbytes > self._max_size:
+            return array
+        with self._lock:
+            if version != self._version:
+                return array
+            if key in self._items:
+                if not self._expired(self._items[key][1]):
+                    return array
+                del self._items[key]
+                self._total -= self._policy.pop(key)
+            while self._items and self._total + array.nbytes > self._max_size:
+                victim, size = self._policy.evict()
+                del self._items[victim]
+                self._total -= size
+            self._items[key] = (array, time.monotonic())
+            self._policy[key] = array.nbytes
+            self._total += array.nbytes
+        return array
+
+    def _expired(self, loaded):
+        return self._max_age is not None and time.monotonic() - loaded > self._max_age
+
+    def discard(self, keys):
+        """Removes the chunks from the cache, should be called after they change"""
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                if key in self._items:
+                    del self._items[key]
+                    self._total -= self._policy.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._items.clear()
+            self._policy = LRUPolicy()
+            self._total = 0
@@ -0,0 +1,215 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import stat
+import zlib
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from threading import Lock
+
+import zarr
+
+from hub.store.lru_cache import UNKNOWN_VERSION, DummyLock, LRUCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Versions of cached chunks are kept next to them, so other processes can check them
+VERSION_SUFFIX = ".version"
+
+
+class CacheDirectoryStore(zarr.DirectoryStore):
+    """DirectoryStore which tolerates files being removed by other processes sharing the cache folder"""
+
+    def __delitem__(self, key):
+        try:
+            super().__delitem__(key)
+        except (KeyError, FileNotFoundError):
+            pass
+
+    def keys(self):
+        for key in super().keys():
+            # Leftovers of writes interrupted before the atomic rename
+            if not key.endswith(".partial") and not key.endswith(VERSION_SUFFIX):
+                yield key
+
+
+class FileLocks:
+    """Striped locks shared by all the processes using the same lock folder (path)
+    Where fcntl is not available they guard only against threads of this process
+    """
+
+    def __init__(self, path: str, stripes=64):
+        self._path = path
+        self._stripes = stripes
+        self._create_locks()
+
+    def _create_locks(self):
+        self._thread_locks = [Lock() for _ in range(self._stripes)]
+        self._files = [None] * self._stripes
+
+    def __getstate__(self):
+        return {"_path": self._path, "_stripes": self._stripes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_locks()
+
+    def _stripe(self, key):
+        # hash() of str differs between processes
+        return zlib.crc32(key.encode("utf-8")) % self._stripes
+
+    def _acquire(self, stripe):
+        self._thread_locks[stripe].acquire()
+        if fcntl is None:
+            return
+        try:
+            if self._files[stripe] is None:
+                os.makedirs(self._path, exist_ok=True)
+                self._files[stripe] = open(os.path.join(self._path, str(stripe)), "ab")
+            fcntl.flock(self._files[stripe], fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_locks[stripe].release()
+            raise
+
+    def _release(self, stripe):
+        if fcntl is not None:
+            fcntl.flock(self._files[stripe], fcntl.LOCK_UN)
+        self._thread_locks[stripe].release()
+
+    @contextmanager
+    def lock(self, keys):
+        """Holds the locks of all the keys, always taken in the same order"""
+        stripes = sorted({self._stripe(key) for key in keys})
+        acquired = []
+        try:
+            for stripe in stripes:
+                self._acquire(stripe)
+                acquired.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                self._release(stripe)
+
+
+class DiskCache(LRUCache):
+    storage_class = CacheDirectoryStore
+
+    def __init__(
+        self,
+        path: str,
+        actual_storage: MutableMapping,
+        max_size,
+        lock=True,
+        write_behind=0,
+        max_dirty=None,
+        prefetch=0,
+        policy="lru",
+        coherence=None,
+    ):
+        """Creates size-bounded LRU cache of chunks stored in local directory (path)
+        Cached chunks survive across processes and runs, so reopening a remote dataset
+        reads the chunks from local disk instead of downloading them again.
+        Processes sharing the directory use the chunks cached by each other,
+        and with lock each chunk is downloaded by only one of them.
+        max_size -> maximum size in bytes the cache folder is allowed to take
+            each process accounts only for the chunks it has used
+        lock, write_behind, max_dirty, prefetch, policy, coherence -> as for LRUCache
+        """
+        super().__init__(
+            self.storage_class(path),
+            actual_storage,
+            max_size,
+            lock=lock,
+            write_behind=write_behind,
+            max_dirty=max_dirty,
+            prefetch=prefetch,
+            policy=policy,
+            coherence=coherence,
+        )
+        self._file_locks = FileLocks(path.rstrip("/") + ".locks") if lock else None
+        self._load_cached_items()
+
+    @property
+    def path(self):
+        return self._cache_storage.path
+
+    def _shared_lock(self, keys):
+        if self._file_locks is None:
+            return DummyLock()
+        return self._file_locks.lock(keys)
+
+    def _lookup(self, key):
+        result = super()._lookup(key)
+        if result is None and self._adopt(key):
+            # Checked as the chunks cached by this process
+            self._validate([key])
+            result = super()._lookup(key)
+        return result
+
+    def _adopt(self, key):
+        """Indexes the chunk if another process sharing the folder has cached it
+        Returns True if the chunk is cached
+        """
+        try:
+            st = os.stat(os.path.join(self.path, key))
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        size = st.st_size
+        evicted = []
+        with self._mutex:
+            if key not in self._cached_items:
+                evicted = self._free_memory(self._adopted_size(size))
+                self._cached_items[key] = size
+                self._total_cached += size
+        self._write_back(evicted)
+        return True
+
+    def _adopted_size(self, size):
+        """Bytes a chunk cached by another process adds to the size used"""
+        return size
+
+    def _record_version(self, key, version):
+        super()._record_version(key, version)
+        if version is None:
+            del self._cache_storage[key + VERSION_SUFFIX]
+        else:
+            self._cache_storage[key + VERSION_SUFFIX] = version.encode("utf-8")
+
+    def _forget_version(self, key):
+        super()._forget_version(key)
+        if self._coherence is not None:
+            del self._cache_storage[key + VERSION_SUFFIX]
+
+    def _cached_version(self, key):
+        version = super()._cached_version(key)
+        if version is not UNKNOWN_VERSION:
+            return version
+        try:
+            return bytes(self._cache_storage[key + VERSION_SUFFIX]).decode("utf-8")
+        except KeyError:
+            return UNKNOWN_VERSION
+
+    def _load_cached_items(self):
+        """Indexes chunks left by previous runs, least recently written first,
+        and evicts the oldest ones if they do not fit in max_size
+        """
+        items = []
+        for key in self._cache_storage.keys():
+            try:
+                stat = os.stat(os.path.join(self.path, key))
+            except FileNotFoundError:
+                continue
+            items.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(items):
+            self._cached_items[key] = size
+            self._total_cached += size
+        self._free_memory(0)
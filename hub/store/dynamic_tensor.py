@@ -5,16 +5,23 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 """
 
 import collections.abc as abc
+import itertools
 from shutil import Error
 from hub.schema.features import Shape
 import json
 import math
+import posixpath
+from typing import Iterable, List
 
 import numpy as np
 from numpy.lib.arraysetops import isin
 import zarr
 import numcodecs
+from zarr.indexing import BasicIndexer
 
+from hub.numcodecs import ShardCodec
+from hub.store.batched import getrange
+from hub.store.decoded_cache import DecodedChunkCache
 from hub.store.nested_store import NestedStore
 from hub.store.shape_detector import ShapeDetector
 from hub.defaults import DEFAULT_COMPRESSOR
@@ -26,6 +33,9 @@ from hub.exceptions import (
 )
 from hub.schema.sequence import Sequence
 
+# Distinguishes chunks of different tensors in a shared DecodedChunkCache
+_tensor_ids = itertools.count()
+
 
 class DynamicTensor:
     """Class for handling dynamic tensor
@@ -44,6 +54,9 @@ class DynamicTensor:
         dtype="float64",
         chunks=None,
         compressor=DEFAULT_COMPRESSOR,
+        chunk_cache: DecodedChunkCache = None,
+        zero_copy: bool = False,
+        shape_chunks: int = None,
     ):
         """Constructor
         Parameters
@@ -61,6 +74,14 @@ class DynamicTensor:
         chunks : Tuple[int] | True
             How to split the tensor into chunks (files) (default is True)
             If chunks=True then chunksize will automatically be detected
+        chunk_cache : DecodedChunkCache
+            Cache of decoded chunks, if None every read decodes the chunks it touches
+        zero_copy : bool
+            Reads within a chunk which is not compressed, or is in chunk_cache,
+            return read-only views of it instead of copies
+            Views of a memory mapped chunk keep its file descriptor open while held
+        shape_chunks : int
+            Samples per chunk of the dynamic shapes, if None it is guessed by zarr
 
         """
         if not (shape is None):
@@ -124,6 +145,7 @@ class DynamicTensor:
                     shape=(max_shape[0], len(self._dynamic_dims)),
                     mode=mode,
                     dtype=np.int32,
+                    chunks=(shape_chunks, None) if shape_chunks else True,
                     store=NestedStore(fs_map, "--dynamic--"),
                     synchronizer=synchronizer,
                     compressor=None,
@@ -138,6 +160,9 @@ class DynamicTensor:
         self.max_shape = self._storage_tensor.shape
         self.chunks = self._storage_tensor.chunks
         self.dtype = self._storage_tensor.dtype
+        self._chunk_cache = chunk_cache
+        self._zero_copy = zero_copy
+        self._id = next(_tensor_ids)
 
         if len(self.shape) != len(self.max_shape):
             raise DynamicTensorShapeException("length")
@@ -178,9 +203,9 @@ class DynamicTensor:
                 self._get_slice([start + i] + slice_[1:], real_shapes[i])
                 for i in range(len(real_shapes))
             ]
-            return [self._storage_tensor[cur_slice] for cur_slice in slice_list]
+            return [self._get_storage(cur_slice) for cur_slice in slice_list]
         slice_ = self._get_slice(slice_, real_shapes)
-        return self._storage_tensor[slice_]
+        return self._get_storage(slice_)
 
     def __setitem__(self, slice_, value):
         """Sets a slice or slices with a value"""
@@ -224,7 +249,194 @@ class DynamicTensor:
 
         slice_ = self._get_slice(slice_, real_shapes)
         value = self.check_value_shape(value, slice_)
-        self._storage_tensor[slice_] = value
+        if not self._is_empty(slice_):
+            self._storage_tensor[slice_] = value
+            first = slice_[0]
+            if isinstance(first, int):
+                first = slice(first, first + 1 if first != -1 else None)
+            start, stop, _ = first.indices(self._storage_tensor.shape[0])
+            self._discard_chunks(start, stop)
+
+    def _is_empty(self, slice_):
+        """Checks if slice selects no elements of storage tensor
+        zarr fails on empty selections when the store supports batched access
+        """
+        return 0 in BasicIndexer(tuple(slice_), self._storage_tensor).shape
+
+    def _get_storage(self, slice_):
+        """Gets a slice from storage tensor"""
+        shape = BasicIndexer(tuple(slice_), self._storage_tensor).shape
+        if 0 in shape:
+            return np.zeros(shape, dtype=self._storage_tensor.dtype)
+        if isinstance(slice_[0], int) and self._shard_codec() is not None:
+            sample = self._read_sample(slice_[0])
+            if sample is not None:
+                result = sample[tuple(slice_[1:])]
+                return result.copy() if isinstance(result, np.ndarray) else result
+        if self._zero_copy:
+            view = self._read_view(slice_)
+            if view is not None:
+                return view
+        chunk = self._cached_chunk_index(slice_[0])
+        if chunk is None:
+            return self._storage_tensor[slice_]
+        rows = self.chunks[0]
+        data = self._chunk_cache.get_or_load(
+            (self._id, chunk),
+            lambda: self._storage_tensor[chunk * rows : (chunk + 1) * rows],
+        )
+        result = data[self._chunk_selection(slice_, chunk)]
+        if not isinstance(result, np.ndarray):
+            return result
+        if self._zero_copy:
+            result = result.view()
+            result.flags.writeable = False
+            return result
+        # Cached chunk should not be changed through the returned array
+        return result.copy()
+
+    def _chunk_selection(self, slice_, chunk):
+        """Selection within the chunk along first dim of the selection in the tensor"""
+        first, rows = slice_[0], self.chunks[0]
+        size = self._storage_tensor.shape[0]
+        if isinstance(first, int):
+            first = (first + size if first < 0 else first) - chunk * rows
+        else:
+            start, stop, _ = first.indices(size)
+            first = slice(start - chunk * rows, stop - chunk * rows)
+        return (first,) + tuple(slice_[1:])
+
+    def _read_view(self, slice_):
+        """Read-only view of the selection in the stored chunk, None if the chunk
+        is compressed or the selection spans more chunks
+        Memory mapped chunks are then read without copying
+        """
+        tensor = self._storage_tensor
+        if tensor.compressor is not None or tensor.filters or tensor.dtype == object:
+            return None
+        if self.chunks[1:] != tensor.shape[1:]:
+            return None
+        chunk = self._chunk_index(slice_[0])
+        if chunk is None:
+            return None
+        key = tensor._chunk_key((chunk,) + (0,) * (len(self.chunks) - 1))
+        try:
+            value = tensor.store[key]
+        except KeyError:
+            return None
+        data = np.frombuffer(value, dtype=self.dtype).reshape(self.chunks)
+        result = data[self._chunk_selection(slice_, chunk)]
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+        return result
+
+    def _shard_codec(self):
+        """ShardCodec of the tensor, None if samples can't be read on their own"""
+        tensor = self._storage_tensor
+        if not isinstance(tensor.compressor, ShardCodec) or tensor.filters:
+            return None
+        if self.chunks[1:] != tensor.shape[1:]:
+            return None
+        return tensor.compressor
+
+    def _read_sample(self, index):
+        """Reads one sample of a sharded tensor, fetching only its block of the chunk
+        Returns None if the chunk is not a shard, so it should be read whole
+        """
+        codec, tensor = self._shard_codec(), self._storage_tensor
+        size, rows = tensor.shape[0], self.chunks[0]
+        chunk, row = divmod(index + size if index < 0 else index, rows)
+        key = tensor._chunk_key((chunk,) + (0,) * (len(self.chunks) - 1))
+        try:
+            offsets = self._shard_offsets(key, chunk)
+            if len(offsets) != codec.block_count(rows) + 1:
+                return None
+            block = row // codec.block_rows
+            data = getrange(
+                tensor.store, key, int(offsets[block]), int(offsets[block + 1])
+            )
+        except KeyError:
+            return np.full(self.chunks[1:], tensor.fill_value, dtype=self.dtype)
+        except ValueError:
+            return None
+        block_data = np.frombuffer(codec.decode_block(data), dtype=self.dtype)
+        return block_data.reshape((-1,) + self.chunks[1:])[row % codec.block_rows]
+
+    def _shard_offsets(self, key, chunk):
+        """Offsets of the blocks of the shard, kept in chunk_cache
+        so reading the next samples of the chunk does not fetch the footer again
+        """
+        codec, tensor = self._storage_tensor.compressor, self._storage_tensor
+
+        def load():
+            footer = getrange(tensor.store, key, -codec.footer_size(self.chunks[0]))
+            return codec.block_offsets(footer)
+
+        if self._chunk_cache is None:
+            return load()
+        return self._chunk_cache.get_or_load((self._id, chunk, "offsets"), load)
+
+    def _cached_chunk_index(self, first):
+        """Index of the chunk along first dim which contains the whole selection,
+        None if the selection should be read directly from storage tensor
+        """
+        if self._chunk_cache is None:
+            return None
+        rows = self.chunks[0]
+        # Chunks split along other dims would be decoded even if not selected
+        if self.chunks[1:] != self._storage_tensor.shape[1:]:
+            return None
+        chunk_bytes = rows * np.prod(self.chunks[1:]) * self.dtype.itemsize
+        if chunk_bytes > self._chunk_cache.max_size:
+            return None
+        return self._chunk_index(first)
+
+    def _chunk_index(self, first):
+        """Index of the chunk along first dim which contains the whole selection,
+        None if it spans more chunks
+        """
+        rows, size = self.chunks[0], self._storage_tensor.shape[0]
+        if isinstance(first, int):
+            return (first + size if first < 0 else first) // rows
+        start, stop, step = first.indices(size)
+        if step != 1 or start // rows != (stop - 1) // rows:
+            return None
+        return start // rows
+
+    def _discard_chunks(self, start, stop):
+        """Discards cached chunks of rows from start to stop after they are changed"""
+        if self._chunk_cache is not None and stop > start:
+            rows = self.chunks[0]
+            chunks = range(start // rows, (stop - 1) // rows + 1)
+            self._chunk_cache.discard(
+                [(self._id, i) for i in chunks]
+                + [(self._id, i, "offsets") for i in chunks]
+            )
+
+    def chunk_keys(self, samples: Iterable[int]) -> List[str]:
+        """Keys of the chunks holding the samples, chunks of dynamic shapes included"""
+        keys = []
+        for tensor, prefix in (
+            (self._storage_tensor, ""),
+            (self._dynamic_tensor, "--dynamic--"),
+        ):
+            if tensor is None:
+                continue
+            rows = sorted({i // tensor.chunks[0] for i in samples})
+            rest = list(itertools.product(*map(range, tensor.cdata_shape[1:])))
+            keys += [
+                posixpath.join(prefix, ".".join(map(str, (row,) + coords)))
+                for row in rows
+                for coords in rest
+            ]
+        return keys
+
+    def chunk_nbytes(self, key: str) -> int:
+        """Size of the chunk of key (one of chunk_keys()) decoded, most it takes stored"""
+        tensor = self._storage_tensor
+        if key.startswith("--dynamic--"):
+            tensor = self._dynamic_tensor
+        return int(np.prod(tensor.chunks)) * tensor.dtype.itemsize
 
     def check_value_shape(self, value, slice_):
         """Checks if value can be set to the slice"""
@@ -266,6 +478,8 @@ class DynamicTensor:
 
     def resize_shape(self, size: int) -> None:
         """append shape of storage and dynamic tensors"""
+        old_size = self._storage_tensor.shape[0]
+        self._discard_chunks(min(old_size, size), max(old_size, size))
         self.shape = (size,) + self.shape[1:]
         self.max_shape = (size,) + self.max_shape[1:]
         self._resize_shape(self._storage_tensor, size)
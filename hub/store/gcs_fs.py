@@ -0,0 +1,45 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import gcsfs
+from gcsfs.utils import HttpError
+
+from hub.store.concurrency import pooled_session
+
+
+class GCSFileSystem(gcsfs.GCSFileSystem):
+    """GCSFileSystem keeping connections for all the requests its limiter
+    lets in flight, so concurrent reads and writes reuse them
+    """
+
+    def connect(self, method=None):
+        super().connect(method)
+        if self.session is not None:
+            pooled_session(self.session)
+
+    def cat_file(self, path, start=None, end=None):
+        """Gets the file or bytes start to end of it, like python slices,
+        with one request instead of opening it
+        """
+        if start is None and end is None:
+            return self.cat(path)
+        if end is not None and (end < 0 or (start is not None and start < 0)):
+            start, end, _ = slice(start, end).indices(self.info(path)["size"])
+        if start is not None and start < 0:
+            byte_range = f"bytes={start}"
+        else:
+            start = start or 0
+            if end is not None and end <= start:
+                return b""
+            byte_range = f"bytes={start}-{'' if end is None else end - 1}"
+        try:
+            r = self._call("GET", self.url(path), headers={"Range": byte_range})
+        except HttpError as err:
+            # Range starting after the end of the file
+            if err.code == 416:
+                return b""
+            raise
+        return r.content
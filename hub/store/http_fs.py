@@ -0,0 +1,160 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+from collections.abc import MutableMapping
+
+from fsspec import AbstractFileSystem
+from urllib3.util.retry import Retry
+
+from hub import config
+from hub.store.concurrency import pooled_session
+
+# Statuses retried by the session, besides connection errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ReadOnlyError(PermissionError):
+    """Raised on writes to datasets served over HTTP"""
+
+    def __init__(self, path):
+        super().__init__(f"{path} is served over HTTP, which is read-only")
+
+
+class HTTPFileSystem(AbstractFileSystem):
+    """Read-only file system of the files served by an HTTP(S) server or CDN
+    Paths are urls. Files are read with GET requests, byte ranges of them with
+    Range requests, over keep-alive connections pooled for concurrent requests.
+    Servers ignoring Range are supported, the range is then cut from the file.
+    Folders can't be listed, datasets are read from their meta and version info.
+    """
+
+    protocol = ("http", "https")
+
+    def __init__(self, headers: dict = None):
+        """headers -> sent with every request, e.g. {"Authorization": ...}"""
+        super().__init__()
+        self.headers = headers or dict()
+        self.session = pooled_session(
+            retries=Retry(
+                total=config.HTTP_MAX_RETRIES,
+                backoff_factor=config.HTTP_RETRY_BASE_DELAY,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET", "HEAD"),
+                raise_on_status=False,
+            )
+        )
+        self.session.headers.update(self.headers)
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        return path.rstrip("/")
+
+    def _request(self, method, path, headers=None):
+        r = self.session.request(method, path, headers=headers)
+        if r.status_code == 404:
+            raise FileNotFoundError(path)
+        r.raise_for_status()
+        return r
+
+    def cat_file(self, path, start=None, end=None):
+        """Gets the file or bytes start to end of it, like python slices"""
+        if start is None and end is None:
+            return self._request("GET", path).content
+        if end is not None and (end < 0 or (start is not None and start < 0)):
+            start, end, _ = slice(start, end).indices(self.info(path)["size"])
+        if start is not None and start < 0:
+            byte_range = f"bytes={start}"
+        else:
+            start = start or 0
+            if end is not None and end <= start:
+                return b""
+            byte_range = f"bytes={start}-{'' if end is None else end - 1}"
+        r = self.session.get(path, headers={"Range": byte_range})
+        # Range starting after the end of the file
+        if r.status_code == 416:
+            return b""
+        if r.status_code == 404:
+            raise FileNotFoundError(path)
+        r.raise_for_status()
+        if r.status_code == 206:
+            return r.content
+        return r.content[slice(start, end)]
+
+    def info(self, path, **kwargs):
+        r = self._request("HEAD", path)
+        return {
+            "name": path,
+            "size": int(r.headers.get("Content-Length", 0)),
+            "type": "file",
+            "ETag": r.headers.get("ETag"),
+            "mtime": r.headers.get("Last-Modified"),
+        }
+
+    def exists(self, path, **kwargs):
+        try:
+            self.info(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def isfile(self, path):
+        return self.exists(path)
+
+    def ls(self, path, detail=True, **kwargs):
+        raise NotImplementedError(f"{path} is served over HTTP, which can't be listed")
+
+    def get_mapper(self, root, check=False, create=False):
+        """Create key-value interface for given root"""
+        return HTTPMap(root, self)
+
+    def pipe_file(self, path, value, **kwargs):
+        raise ReadOnlyError(path)
+
+    def rm(self, path, recursive=False, maxdepth=None):
+        raise ReadOnlyError(path)
+
+    def makedirs(self, path, exist_ok=False):
+        raise ReadOnlyError(path)
+
+    def mkdir(self, path, create_parents=True, **kwargs):
+        raise ReadOnlyError(path)
+
+    def _open(self, path, mode="rb", **kwargs):
+        if mode != "rb":
+            raise ReadOnlyError(path)
+        return super()._open(path, mode, **kwargs)
+
+
+class HTTPMap(MutableMapping):
+    """Read-only key-value interface to the files under the root url"""
+
+    def __init__(self, root, fs):
+        self.fs = fs
+        self.root = root.rstrip("/")
+
+    def _key_to_str(self, key):
+        return f"{self.root}/{key}"
+
+    def __getitem__(self, key):
+        try:
+            return self.fs.cat_file(self._key_to_str(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.fs.exists(self._key_to_str(key))
+
+    def __setitem__(self, key, value):
+        raise ReadOnlyError(self._key_to_str(key))
+
+    def __delitem__(self, key):
+        raise ReadOnlyError(self._key_to_str(key))
+
+    def __iter__(self):
+        return iter(self.fs.ls(self.root))
+
+    def __len__(self):
+        return len(self.fs.ls(self.root))
@@ -0,0 +1,197 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import heapq
+import os
+import threading
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, wait
+from itertools import count
+from typing import Callable, Iterable, List
+
+from hub import config
+
+# Priority classes of the requests, lower runs first
+READ = 0
+WRITE = 1
+PREFETCH = 2
+
+
+class _WorkItem:
+    def __init__(self, fn, args, priority, size):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.size = size
+        self.claimed = False
+        self.future = Future()
+
+
+class IOExecutor:
+    """Pool of threads running the storage requests of the whole process
+    Queued requests run by priority, so reads the user waits for go ahead of
+    write behind and prefetch. Requests of known size (writes) are started only
+    while the bytes in flight stay below max_bytes.
+    Threads waiting for the requests they submitted run the ones not started yet,
+    so requests submitting other requests can't exhaust the pool.
+    """
+
+    def __init__(self, workers: int, max_bytes: int = None):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self._lock = threading.Condition()
+        # heap of (priority, submission number, item)
+        self._queue = []
+        self._seq = count()
+        self._threads = []
+        self._idle = 0
+        self._bytes = 0
+        self._shutdown = False
+        self._local = threading.local()
+
+    def current_priority(self) -> int:
+        """Priority of the request run by the calling thread, READ outside requests"""
+        return getattr(self._local, "priority", READ)
+
+    def submit(self, fn: Callable, *args, priority: int = None, size=0) -> Future:
+        """Queues fn(*args), returns its Future
+        priority -> READ, WRITE or PREFETCH, defaults to the priority of the request
+            submitting it, so requests made by prefetching are prefetches as well
+        size -> bytes the request sends, 0 if not known
+        """
+        if priority is None:
+            priority = self.current_priority()
+        item = _WorkItem(fn, args, priority, size)
+        item.future._io_item = item
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit requests after shutdown")
+            heapq.heappush(self._queue, (priority, next(self._seq), item))
+            if self._idle == 0 and len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"hub-io-{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._lock.notify()
+        return item.future
+
+    def map(self, fn: Callable, items: Iterable, priority: int = None) -> List:
+        """Runs fn for all the items concurrently, returns the results in order"""
+        futures = [self.submit(fn, item, priority=priority) for item in items]
+        self.wait(futures)
+        return [future.result() for future in futures]
+
+    def wait(self, futures, return_when=ALL_COMPLETED):
+        """Same as concurrent.futures.wait, but runs the requests not started yet
+        in the calling thread instead of waiting for them
+        """
+        for future in reversed(list(futures)):
+            if return_when == FIRST_COMPLETED and any(f.done() for f in futures):
+                break
+            item = getattr(future, "_io_item", None)
+            if item is not None and self._claim(item):
+                self._run(item)
+        return wait(futures, return_when=return_when)
+
+    def shutdown(self, wait=True):
+        """Stops the threads once the queued requests are done"""
+        with self._lock:
+            self._shutdown = True
+            self._lock.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _claim(self, item):
+        with self._lock:
+            if item.claimed:
+                return False
+            item.claimed = True
+            self._bytes += item.size
+            return True
+
+    def _next(self):
+        """Claims next request to run, None if there is none or it does not fit
+        Called with the lock held
+        """
+        while self._queue:
+            item = self._queue[0][2]
+            if item.claimed:
+                heapq.heappop(self._queue)
+                continue
+            if (
+                self.max_bytes is not None
+                and self._bytes > 0
+                and self._bytes + item.size > self.max_bytes
+            ):
+                return None
+            heapq.heappop(self._queue)
+            item.claimed = True
+            self._bytes += item.size
+            return item
+        return None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                item = self._next()
+                while item is None:
+                    if self._shutdown and not self._queue:
+                        return
+                    self._idle += 1
+                    self._lock.wait()
+                    self._idle -= 1
+                    item = self._next()
+            self._run(item)
+
+    def _run(self, item):
+        if not item.future.set_running_or_notify_cancel():
+            self._release(item)
+            return
+        outer = self.current_priority()
+        self._local.priority = item.priority
+        try:
+            result = item.fn(*item.args)
+        except BaseException as err:
+            item.future.set_exception(err)
+        else:
+            item.future.set_result(result)
+        finally:
+            self._local.priority = outer
+            self._release(item)
+
+    def _release(self, item):
+        with self._lock:
+            self._bytes -= item.size
+            if item.size:
+                self._lock.notify_all()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> IOExecutor:
+    """Returns I/O executor of the process, sized by config.IO_WORKERS
+    and config.IO_MAX_IN_FLIGHT_BYTES, a new one after fork or config changes
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if (
+            _executor is None
+            or _executor_pid != os.getpid()
+            or _executor.workers != config.IO_WORKERS
+            or _executor.max_bytes != config.IO_MAX_IN_FLIGHT_BYTES
+        ):
+            if _executor is not None and _executor_pid == os.getpid():
+                _executor.shutdown(wait=False)
+            _executor = IOExecutor(config.IO_WORKERS, config.IO_MAX_IN_FLIGHT_BYTES)
+            _executor_pid = os.getpid()
+        return _executor
@@ -4,8 +4,23 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-from collections import OrderedDict
+import math
+import posixpath
+import time
+from collections import Counter, defaultdict
 from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from threading import Lock
+
+from hub.store.batched import check_missing, getitems, getrange, getversions
+from hub.store.cache_policy import create_policy
+from hub.store.io_executor import PREFETCH, WRITE, get_executor
+
+# Events counted by the cache, each with its count and bytes (event + "_bytes")
+STATS_EVENTS = ("hit", "miss", "write", "eviction", "write_back", "invalidation")
+
+# Version of cached items which were not fetched by the cache
+UNKNOWN_VERSION = object()
 
 
 class DummyLock:
@@ -18,8 +33,11 @@ class DummyLock:
     def __exit__(self, *args):
         pass
 
+    def acquire(self):
+        return True
 
-Lock = DummyLock
+    def release(self):
+        pass
 
 
 class LRUCache(MutableMapping):
@@ -28,17 +46,75 @@ class LRUCache(MutableMapping):
         cache_storage: MutableMapping,
         actual_storage: MutableMapping,
         max_size,
+        lock=True,
+        stripes=64,
+        write_behind=0,
+        max_dirty=None,
+        prefetch=0,
+        max_prefetched=None,
+        policy="lru",
+        coherence=None,
     ):
         """Creates LRU cache using cache_storage and actual_storage containers
         max_size -> maximum cache size that is allowed
+        lock -> if False, cache is not guarded against concurrent access
+        stripes -> number of locks the keys are spread over
+        write_behind -> if > 0, dirty items are written to actual storage in background
+            by the I/O executor of the process, else synchronously by the calling thread
+        max_dirty -> size of evicted dirty items waiting to be written, above which
+            writers are blocked until the background writes catch up
+            defaults to max_size
+        prefetch -> number of batches passed to prefetch() fetched at a time
+            by the I/O executor of the process, if 0 prefetch() does nothing
+        max_prefetched -> size of prefetched items not read yet, above which
+            prefetching is paused, defaults to half of max_size
+        policy -> eviction policy, "lru", "2q", "lfu" or CachePolicy instance
+        coherence -> seconds a cached item is trusted, after which its version
+            in actual storage is checked and the item is dropped if it has changed
+            if None, cached items are never checked, if 0 they are checked on every read
+            requires actual storage telling versions, see batched.getversions
         """
-        self._dirty = set()
-        self._mutex = Lock()
+        # key -> number of the write which made it dirty
+        self._dirty = dict()
+        # dirty items evicted from the cache, kept until written to actual storage
+        self._evicted = dict()
+        self._evicted_size = 0
+        self._writes = 0
+        # Background writes need the locks
+        self._write_behind = write_behind if lock else 0
+        self._max_dirty = max_size if max_dirty is None else max_dirty
+        # Prefetching runs in background, so it needs the locks too
+        self._prefetch = prefetch if lock else 0
+        self._max_prefetched = (
+            max_size // 2 if max_prefetched is None else max_prefetched
+        )
+        # prefetched key -> size, until it is read or evicted
+        self._prefetched = dict()
+        self._prefetched_size = 0
+        self._prefetching = set()
+        # key -> Future of its fetch from actual storage in progress
+        self._fetches = dict()
+        # futures of the batches being prefetched
+        self._prefetches = set()
+        self._coherence = coherence
+        # steps ahead of the current one prefetched by advance()
+        self._lookahead = 0
+        # key -> version of the cached item, None if it was written through the cache
+        self._versions = dict()
+        # key -> time.monotonic() of the last version check
+        self._checked = dict()
+        self._flusher = None
+        self._futures = set()
+        self._lock = lock
+        self._stripes = stripes
+        self._create_locks()
         self._max_size = max_size
         self._cache_storage = cache_storage
         self._actual_storage = actual_storage
         self._total_cached = 0
-        self._cached_items = OrderedDict()
+        self._cached_items = create_policy(policy, max_size)
+        # key directory -> counters of cache events and their bytes
+        self._stats = defaultdict(Counter)
         # assert len(self._cache_storage) == 0, "Initially cache storage should be empty"
 
     @property
@@ -61,10 +137,141 @@ class LRUCache(MutableMapping):
     def __exit__(self, *args):
         self.close()
 
+    def _create_locks(self):
+        lock_type = Lock if self._lock else DummyLock
+        # guards the bookkeeping, never held while accessing actual storage
+        self._mutex = lock_type()
+        # serialize writing the same key to actual storage
+        self._write_locks = [lock_type() for _ in range(self._stripes)]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_mutex", "_write_locks"):
+            del state[name]
+        state["_fetches"] = dict()
+        state["_flusher"] = None
+        state["_prefetching"] = set()
+        state["_prefetches"] = set()
+        state["_futures"] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_locks()
+
+    def _count(self, key, event, size):
+        """Counts event of the key, called with the mutex held"""
+        counter = self._stats[posixpath.dirname(key)]
+        counter[event] += 1
+        counter[f"{event}_bytes"] += size
+
+    def stats(self):
+        """Returns counters of hits, misses, writes, evictions and write backs
+        and their bytes, per directory of the keys
+        """
+        with self._mutex:
+            return {group: dict(counter) for group, counter in self._stats.items()}
+
+    def reset_stats(self):
+        with self._mutex:
+            self._stats.clear()
+
+    def _shared_lock(self, keys):
+        """Lock held while fetching keys from actual storage
+        Caches shared by several processes use it to fetch each key only once
+        """
+        return DummyLock()
+
+    def _write_lock(self, key):
+        return self._write_locks[hash(key) % len(self._write_locks)]
+
+    def _submit(self, fn, key, size):
+        future = get_executor().submit(fn, key, priority=WRITE, size=size)
+        with self._mutex:
+            self._futures.add(future)
+        future.add_done_callback(self._discard_future)
+        return future
+
+    def _discard_future(self, future):
+        with self._mutex:
+            self._futures.discard(future)
+
+    def _wait_writes(self):
+        """Waits for all the background writes, raises the first error"""
+        with self._mutex:
+            futures = list(self._futures)
+        get_executor().wait(futures)
+        for future in futures:
+            future.result()
+
     def _flush_dirty(self):
-        for item in self._dirty:
-            self._actual_storage[item] = self._cache_storage[item]
-        self._dirty.clear()
+        with self._mutex:
+            dirty = [(key, self._cached_items.get(key, 0)) for key in self._dirty]
+            evicted = [(key, len(value)) for key, value in self._evicted.items()]
+        if self._write_behind:
+            futures = [self._submit(self._write_dirty, *item) for item in dirty]
+            futures += [self._submit(self._write_evicted, *item) for item in evicted]
+            get_executor().wait(futures)
+            for future in futures:
+                future.result()
+            self._wait_writes()
+        else:
+            for key, _ in dirty:
+                self._write_dirty(key)
+            self._write_back([key for key, _ in evicted])
+
+    def _write_dirty(self, key):
+        with self._write_lock(key):
+            with self._mutex:
+                write = self._dirty.get(key)
+                if write is None:
+                    return
+                value = self._cache_storage[key]
+            self._actual_storage[key] = value
+            with self._mutex:
+                self._count(key, "write_back", len(value))
+                if self._dirty.get(key) == write:
+                    del self._dirty[key]
+
+    def _write_evicted(self, key):
+        with self._write_lock(key):
+            with self._mutex:
+                value = self._evicted.get(key)
+            if value is None:
+                return
+            self._actual_storage[key] = value
+            with self._mutex:
+                self._count(key, "write_back", len(value))
+                if self._evicted.get(key) is value:
+                    self._pop_evicted(key)
+
+    def _pop_evicted(self, key):
+        value = self._evicted.pop(key, None)
+        if value is not None:
+            self._evicted_size -= len(value)
+        return value
+
+    def _write_back(self, keys):
+        """Writes evicted dirty items to actual storage
+        In write behind mode the writes are done in background,
+        and the caller waits only while evicted dirty items exceed max_dirty
+        """
+        if not self._write_behind:
+            for key in keys:
+                self._write_evicted(key)
+            return
+        with self._mutex:
+            sizes = [len(self._evicted.get(key, b"")) for key in keys]
+        for key, size in zip(keys, sizes):
+            self._submit(self._write_evicted, key, size)
+        while True:
+            with self._mutex:
+                if self._evicted_size <= self._max_dirty or not self._futures:
+                    return
+                futures = list(self._futures)
+            done, _ = get_executor().wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
 
     def flush(self):
         self._flush_dirty()
@@ -73,46 +280,249 @@ class LRUCache(MutableMapping):
         if hasattr(self._actual_storage, "flush"):
             self._actual_storage.flush()
 
+    def flush_async(self) -> Future:
+        """Starts flushing in background
+        Returns Future which is done when all the dirty items are written
+        """
+        with self._mutex:
+            if self._flusher is None:
+                self._flusher = ThreadPoolExecutor(1, thread_name_prefix="hub-flush")
+            return self._flusher.submit(self.flush)
+
+    def prefetch(self, keys):
+        """Starts fetching the keys which are not cached yet in background
+        Does nothing while prefetched items not read yet exceed max_prefetched
+        Returns Future which is done when the keys are cached, None if none are fetched
+        """
+        if not self._prefetch:
+            return None
+        with self._mutex:
+            if (
+                self._prefetched_size >= self._max_prefetched
+                or len(self._prefetches) >= self._prefetch
+            ):
+                return None
+            keys = [
+                key
+                for key in dict.fromkeys(keys)
+                if key not in self._cached_items
+                and key not in self._evicted
+                and key not in self._prefetching
+            ]
+            if not keys:
+                return None
+            self._prefetching.update(keys)
+            future = get_executor().submit(self._fetch_ahead, keys, priority=PREFETCH)
+            self._prefetches.add(future)
+        future.add_done_callback(self._discard_prefetch)
+        return future
+
+    def _discard_prefetch(self, future):
+        with self._mutex:
+            self._prefetches.discard(future)
+
+    def schedule(self, steps, lookahead=0):
+        """Tells the eviction policy the keys read at each step, e.g. sample of an epoch
+        lookahead -> number of steps prefetched by advance(), requires prefetch
+        Raises ValueError if the policy does not use the schedule
+        """
+        if not hasattr(self._cached_items, "schedule"):
+            raise ValueError(
+                f"{type(self._cached_items).__name__} does not use the access schedule"
+            )
+        with self._mutex:
+            self._cached_items.schedule(steps)
+            self._lookahead = lookahead
+
+    def advance(self, step):
+        """Tells the eviction policy the step being read and prefetches the next steps
+        Returns Future of the prefetch, None if nothing is fetched
+        """
+        if not hasattr(self._cached_items, "advance"):
+            return None
+        with self._mutex:
+            self._cached_items.advance(step)
+            upcoming = self._cached_items.upcoming(self._lookahead)
+        return self.prefetch(upcoming) if upcoming else None
+
+    def _fetch_ahead(self, keys):
+        try:
+            items = self.getitems(keys)
+        except Exception:
+            # Prefetching is only a hint, the error shows up when the key is read
+            items = {}
+        finally:
+            with self._mutex:
+                self._prefetching.difference_update(keys)
+        with self._mutex:
+            for key in items:
+                size = self._cached_items.get(key)
+                if size is not None and key not in self._prefetched:
+                    self._prefetched[key] = size
+                    self._prefetched_size += size
+
+    def _pop_prefetched(self, key):
+        size = self._prefetched.pop(key, None)
+        if size is not None:
+            self._prefetched_size -= size
+
     def close(self):
         self._flush_dirty()
         if hasattr(self._cache_storage, "close"):
             self._cache_storage.close()
         if hasattr(self._actual_storage, "close"):
             self._actual_storage.close()
+        with self._mutex:
+            flusher, self._flusher = self._flusher, None
+            prefetches = list(self._prefetches)
+        if flusher is not None:
+            flusher.shutdown()
+        # Prefetches not started yet are dropped, the running ones are waited for
+        for future in prefetches:
+            future.cancel()
+        wait(prefetches)
+        with self._mutex:
+            self._prefetching.clear()
 
     def commit(self):
         self.close()
 
+    def _lookup(self, key):
+        """Returns cached value of the key, None if it is not cached"""
+        with self._mutex:
+            if key in self._evicted:
+                self._count(key, "hit", len(self._evicted[key]))
+                return self._evicted[key]
+            if key not in self._cached_items:
+                return None
+            self._cached_items.access(key)
+            self._pop_prefetched(key)
+            self._count(key, "hit", self._cached_items[key])
+        try:
+            return self._cache_storage[key]
+        except KeyError:
+            # Evicted after the check, or removed by another process sharing the storage
+            return None
+
     def __getitem__(self, key):
         """ Gets item and puts it in the cache if not there """
+        self._validate([key])
+        result = self._lookup(key)
+        if result is not None:
+            return result
+        return self._fetch([key], batch=False)[key]
+
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple items, fetching the ones not cached in one batch"""
+        self._validate(keys)
+        result = {}
+        missing = []
+        for key in keys:
+            value = self._lookup(key)
+            if value is None:
+                missing.append(key)
+            else:
+                result[key] = value
+        if missing:
+            result.update(self._fetch(missing))
+        check_missing(keys, result, on_error)
+        return result
+
+    def _fetch(self, keys, batch=True):
+        """Fetches the keys from actual storage and caches them
+        Concurrent misses on the same key wait for the first one to fetch it,
+        no lock is held by this process while fetching, so other keys are not delayed
+        batch -> fetches the keys in one batch, missing keys are omitted,
+            otherwise one by one, raising KeyError for a missing key
+        Returns key -> value
+        """
+        own, waiting = dict(), dict()
         with self._mutex:
-            if key in self._cached_items:
-                self._cached_items.move_to_end(key)
-                return self._cache_storage[key]
+            for key in keys:
+                future = self._fetches.get(key)
+                if future is None:
+                    own[key] = self._fetches[key] = Future()
+                else:
+                    waiting[key] = future
+        result, evicted = dict(), []
+        try:
+            if own:
+                with self._shared_lock(list(own)):
+                    fetch = []
+                    for key in own:
+                        # Cached after the first lookup, or by another process
+                        value = self._lookup(key)
+                        if value is None:
+                            fetch.append(key)
+                        else:
+                            result[key] = value
+                    versions = self._fetch_versions(fetch)
+                    if batch:
+                        fetched = getitems(self._actual_storage, fetch)
+                    else:
+                        fetched = {key: self._actual_storage[key] for key in fetch}
+                    for key, value in fetched.items():
+                        version = versions.get(key)
+                        evicted += self._insert(
+                            key, value, dirty=False, version=version, fetch=own[key]
+                        )
+                        result[key] = value
+        except BaseException as e:
+            self._settle(own, exception=e)
+            raise
+        self._settle(own, result)
+        self._write_back(evicted)
+        # Own keys are settled first, so threads waiting for each other can't deadlock
+        for key, future in waiting.items():
+            value = future.result()
+            if value is not None:
+                result[key] = value
+        return result
+
+    def _settle(self, fetches, result=None, exception=None):
+        """Ends the fetches, waking up the threads waiting for them"""
+        with self._mutex:
+            for key, future in fetches.items():
+                if self._fetches.get(key) is future:
+                    del self._fetches[key]
+        for key, future in fetches.items():
+            if exception is None:
+                future.set_result(result.get(key))
             else:
-                result = self._actual_storage[key]
-                self._free_memory(len(result))
-                self._append_cache(key, result)
-                return result
+                future.set_exception(exception)
+
+    def getrange(self, key, start, stop=None):
+        """Gets bytes start to stop of the item, from the cache if it is there,
+        otherwise only the range is read from the storage and it is not cached
+        """
+        self._validate([key])
+        result = self._lookup(key)
+        if result is not None:
+            return bytes(result[start:stop])
+        return getrange(self._actual_storage, key, start, stop)
+
+    def setitems(self, values):
+        """Sets multiple items, they are written on eviction or flush"""
+        for key, value in values.items():
+            self[key] = value
 
     def __setitem__(self, key, value):
         """ Sets item and puts it in the cache if not there"""
-        with self._mutex:
-            if key in self._cached_items:
-                self._total_cached -= self._cached_items.pop(key)
-            self._free_memory(len(value))
-            self._append_cache(key, value)
-            if key not in self._dirty:
-                self._dirty.add(key)
+        evicted = self._insert(key, value, dirty=True)
+        self._write_back(evicted)
 
     def __delitem__(self, key):
         deleted_from_cache = False
         with self._mutex:
+            # Value being fetched is older, it is not cached
+            self._fetches.pop(key, None)
             if key in self._cached_items:
-                self._total_cached -= self._cached_items.pop(key)
-                del self._cache_storage[key]
-                self._dirty.discard(key)
+                self._drop(key)
+                deleted_from_cache = True
+            self._dirty.pop(key, None)
+            if self._pop_evicted(key) is not None:
                 deleted_from_cache = True
+        with self._write_lock(key):
             try:
                 del self._actual_storage[key]
             except KeyError:
@@ -125,24 +535,161 @@ class LRUCache(MutableMapping):
         )  # TODO: In future might need to fix this to return proper len
 
     def __iter__(self):
-        cached_keys = set(self._dirty)
+        with self._mutex:
+            cached_keys = set(self._dirty) | set(self._evicted)
         for i in self.actual_storage:
             cached_keys.discard(i)
             yield i
         yield from sorted(cached_keys)
 
+    def _insert(self, key, value, dirty, version=None, fetch=None):
+        """Puts item in the cache, returns dirty items evicted to free memory for it
+        version -> version of the item fetched from actual storage
+        fetch -> Future of the fetch of the item, which is not cached
+            if the key was written or deleted while fetching it
+        """
+        with self._mutex:
+            if fetch is not None and self._fetches.get(key) is not fetch:
+                return []
+            if dirty:
+                self._fetches.pop(key, None)
+            cached = key in self._cached_items
+            if cached:
+                # Its space is freed as any other, but the policy keeps its history
+                self._total_cached -= self._cached_items[key]
+                self._cached_items[key] = 0
+                self._pop_prefetched(key)
+            evicted = self._free_memory(len(value))
+            if cached and key in self._cached_items:
+                self._cached_items.access(key)
+            self._append_cache(key, value)
+            self._count(key, "write" if dirty else "miss", len(value))
+            if self._coherence is not None:
+                self._record_version(key, version)
+            if dirty:
+                # Value evicted before is older, no need to write it anymore
+                self._pop_evicted(key)
+                self._writes += 1
+                self._dirty[key] = self._writes
+            else:
+                self._dirty.pop(key, None)
+        return evicted
+
+    def _used_size(self):
+        """Bytes counted against max_size, called with the mutex held"""
+        return self._total_cached
+
     def _free_memory(self, extra_size):
+        evicted = []
         while (
-            self._total_cached > 0 and extra_size + self._total_cached > self._max_size
+            self._total_cached > 0 and extra_size + self._used_size() > self._max_size
         ):
-            item, itemsize = self._cached_items.popitem(last=False)
-            if item in self._dirty:
-                self._actual_storage[item] = self._cache_storage[item]
-                self._dirty.discard(item)
+            item, itemsize = self._cached_items.evict()
+            self._pop_prefetched(item)
+            self._count(item, "eviction", itemsize)
+            self._forget_version(item)
+            if self._dirty.pop(item, None) is not None:
+                self._evicted[item] = self._cache_storage[item]
+                self._evicted_size += itemsize
+                evicted.append(item)
             del self._cache_storage[item]
             self._total_cached -= itemsize
+        return evicted
 
     def _append_cache(self, key, value):
         self._total_cached += len(value)
         self._cached_items[key] = len(value)
         self._cache_storage[key] = value
+
+    def _fetch_versions(self, keys):
+        """Versions of the keys in actual storage, fetched before their values
+        so a value changed in between is only checked again, never trusted
+        """
+        if self._coherence is None or not keys:
+            return {}
+        return getversions(self._actual_storage, keys) or {}
+
+    def _record_version(self, key, version):
+        """Remembers version of the cached key, called with the mutex held"""
+        self._versions[key] = version
+        self._checked[key] = time.monotonic()
+
+    def _forget_version(self, key):
+        """Called with the mutex held when the key leaves the cache"""
+        self._versions.pop(key, None)
+        self._checked.pop(key, None)
+
+    def _cached_version(self, key):
+        """Version the cached key was fetched at, called with the mutex held"""
+        return self._versions.get(key, UNKNOWN_VERSION)
+
+    def _validate(self, keys):
+        """Drops cached items which have changed in actual storage
+        Versions of the items not checked for coherence seconds are fetched in one batch
+        """
+        if self._coherence is None:
+            return
+        now = time.monotonic()
+        with self._mutex:
+            stale = [
+                key
+                for key in dict.fromkeys(keys)
+                if key in self._cached_items
+                and key not in self._dirty
+                and now - self._checked.get(key, -math.inf) >= self._coherence
+            ]
+        if not stale:
+            return
+        current = getversions(self._actual_storage, stale)
+        if current is None:
+            return
+        changed = []
+        with self._mutex:
+            for key in stale:
+                if key not in self._cached_items or key in self._dirty:
+                    continue
+                cached, version = self._cached_version(key), current.get(key)
+                if cached is None or cached == version:
+                    # Items written through the cache take the version of the write
+                    self._record_version(key, version if cached is None else cached)
+                else:
+                    changed.append(key)
+                    self._count(key, "invalidation", self._drop(key))
+        if changed and hasattr(self._actual_storage, "invalidate"):
+            self._actual_storage.invalidate(changed)
+
+    def _drop(self, key):
+        """Removes item from the cache, called with the mutex held
+        Returns its size
+        """
+        size = self._cached_items.pop(key)
+        self._total_cached -= size
+        del self._cache_storage[key]
+        self._pop_prefetched(key)
+        self._forget_version(key)
+        return size
+
+    def invalidate(self, keys):
+        """Drops the keys from this cache and the caches below it, unless they are dirty
+        Next reads fetch them from actual storage again
+        """
+        with self._mutex:
+            for key in keys:
+                if key in self._cached_items and key not in self._dirty:
+                    self._count(key, "invalidation", self._drop(key))
+        if hasattr(self._actual_storage, "invalidate"):
+            self._actual_storage.invalidate(keys)
+
+    def getversions(self, keys):
+        """Versions of the keys in actual storage, dirty keys are omitted
+        as their version changes when they are written back
+        """
+        versions = getversions(self._actual_storage, keys)
+        if versions is None:
+            return None
+        with self._mutex:
+            return {
+                key: version
+                for key, version in versions.items()
+                if key not in self._dirty and key not in self._evicted
+            }
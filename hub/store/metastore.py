@@ -7,6 +7,7 @@ import json
 from collections.abc import MutableMapping
 import posixpath
 from hub import defaults
+from hub.store.batched import check_missing, getitems, getrange, setitems
 
 
 # TODO: Better version control for PB scale data
@@ -25,6 +26,8 @@ class MetaStorage(MutableMapping):
         self._meta = meta_map
         self._path = path
         self._ds = ds
+        # chunk directory -> coordinates of the last chunk read from it
+        self._last_chunks = {}
 
     def find_chunk(self, k: str) -> str:
         ls = self._ds._chunk_commit_map[self._path][k]
@@ -35,6 +38,51 @@ class MetaStorage(MutableMapping):
             cur_node = cur_node.parent
         return None
 
+    def _read_key(self, k: str, check=True) -> str:
+        """Key of the chunk version visible from the current commit"""
+        if check and self._ds._commit_id:
+            k = self.find_chunk(k) or f"{k}:{self._ds._commit_id}"
+        return k
+
+    def _write_key(self, k: str, check=True) -> str:
+        """Key of the chunk version to be written in the current commit"""
+        chunk_key = k.split(":")[0]
+        if check and self._ds._commit_id:
+            old_filename = self.find_chunk(k)
+            k = f"{k}:{self._ds._commit_id}"
+            if old_filename and k != old_filename:
+                self.copy_chunk(old_filename, k)
+        commit_id = k.split(":")[-1]
+        self._ds._chunk_commit_map[self._path][chunk_key].add(commit_id)
+        return k
+
+    def _read_ahead(self, k: str):
+        """Prefetches the next chunks when chunks are read in order along first dim"""
+        window = self._ds._read_ahead
+        if not window or not hasattr(self._fs_map, "prefetch"):
+            return
+        dirname, filename = posixpath.split(k)
+        try:
+            coords = [int(c) for c in filename.split(".")]
+        except ValueError:
+            return
+        last = self._last_chunks.get(dirname)
+        if last == coords:
+            return
+        self._last_chunks[dirname] = coords
+        if last is None or coords[0] != last[0] + 1 or coords[1:] != last[1:]:
+            return
+        self._fs_map.prefetch(
+            [
+                self._read_key(
+                    posixpath.join(
+                        dirname, ".".join(map(str, [coords[0] + i] + coords[1:]))
+                    )
+                )
+                for i in range(1, window + 1)
+            ]
+        )
+
     def __getitem__(self, k: str, check=True) -> bytes:
         filename = posixpath.split(k)[1]
         if filename.startswith("."):
@@ -47,9 +95,8 @@ class MetaStorage(MutableMapping):
                 "utf-8",
             )
         if check:
-            if self._ds._commit_id:
-                k = self.find_chunk(k) or f"{k}:{self._ds._commit_id}"
-        return self._fs_map[k]
+            self._read_ahead(k)
+        return self._fs_map[self._read_key(k, check)]
 
     def get(self, k: str, check=True) -> bytes:
         filename = posixpath.split(k)[1]
@@ -65,9 +112,8 @@ class MetaStorage(MutableMapping):
             return bytes(json.dumps(item), "utf-8") if item else None
         else:
             if check:
-                if self._ds._commit_id:
-                    k = self.find_chunk(k) or f"{k}:{self._ds._commit_id}"
-            return self._fs_map.get(k)
+                self._read_ahead(k)
+            return self._fs_map.get(self._read_key(k, check))
 
     def __setitem__(self, k: str, v: bytes, check=True):
         filename = posixpath.split(k)[1]
@@ -77,15 +123,48 @@ class MetaStorage(MutableMapping):
             meta[k][self._path] = json.loads(self.to_str(v))
             self._meta[defaults.META_FILE] = bytes(json.dumps(meta), "utf-8")
         else:
-            chunk_key = k.split(":")[0]
-            if check and self._ds._commit_id:
-                old_filename = self.find_chunk(k)
-                k = f"{k}:{self._ds._commit_id}"
-                if old_filename and k != old_filename:
-                    self.copy_chunk(old_filename, k)
-            commit_id = k.split(":")[-1]
-            self._ds._chunk_commit_map[self._path][chunk_key].add(commit_id)
-            self._fs_map[k] = v
+            self._fs_map[self._write_key(k, check)] = v
+
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple chunks from the underlying storage in one batch"""
+        result = {}
+        chunk_keys = {}
+        for k in keys:
+            if posixpath.split(k)[1].startswith("."):
+                item = self.get(k)
+                if item is not None:
+                    result[k] = item
+            else:
+                self._read_ahead(k)
+                chunk_keys[self._read_key(k)] = k
+        for key, value in getitems(self._fs_map, chunk_keys).items():
+            result[chunk_keys[key]] = value
+        check_missing(keys, result, on_error)
+        return result
+
+    def getrange(self, k: str, start: int, stop: int = None) -> bytes:
+        """Gets bytes start to stop of the chunk, reading only them if possible"""
+        return getrange(self._fs_map, self._read_key(k), start, stop)
+
+    def storage_keys(self, keys):
+        """Keys in the underlying storage of the chunks visible from the current commit"""
+        return [self._fs_map.storage_key(self._read_key(k)) for k in keys]
+
+    def load(self, keys) -> int:
+        """Fetches the chunks into the caches of the underlying storage in one batch
+        Returns number of the chunks found
+        """
+        return len(getitems(self._fs_map, [self._read_key(k) for k in keys]))
+
+    def setitems(self, values):
+        """Sets multiple chunks in the underlying storage in one batch"""
+        chunks = {}
+        for k, v in values.items():
+            if posixpath.split(k)[1].startswith("."):
+                self[k] = v
+            else:
+                chunks[self._write_key(k)] = v
+        setitems(self._fs_map, chunks)
 
     def copy_all_chunks(self, from_commit_id: str, to_commit_id: str):
         ls = {
@@ -103,12 +182,26 @@ class MetaStorage(MutableMapping):
         data = self.__getitem__(from_chunk, False)
         self.__setitem__(to_chunk, data, False)
 
+    def chunk_keys(self):
+        """Keys of the chunks visible from the current commit
+        Taken from the chunk commit map saved with the version info, so storage
+        is not listed. None for datasets without version info
+        """
+        if self._ds._chunk_commit_map is None:
+            return None
+        chunks = self._ds._chunk_commit_map[self._path]
+        return [k for k in list(chunks) if self.find_chunk(k)]
+
     def __len__(self):
-        return len(self._fs_map) + 1
+        chunk_keys = self.chunk_keys()
+        if chunk_keys is None:
+            return len(self._fs_map) + 1
+        return len(chunk_keys) + 1
 
     def __iter__(self):
         yield ".zarray"
-        yield from self._fs_map
+        chunk_keys = self.chunk_keys()
+        yield from self._fs_map if chunk_keys is None else chunk_keys
 
     def __delitem__(self, k: str):
         filename = posixpath.split(k)[1]
@@ -0,0 +1,64 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import mmap
+import os
+import uuid
+
+from fsspec.mapping import FSMap
+
+from hub import config
+from hub.store.batched import check_missing
+
+
+class MMapFSMap(FSMap):
+    """FSMap of a local folder returning read-only memory maps of the files
+    Reads share the page cache instead of copying the files into new bytes.
+    Files are replaced atomically on write, so maps held by readers
+    keep seeing the complete old version.
+    Each map holds a file descriptor until it is released, so files smaller
+    than config.MMAP_MIN_SIZE are read into bytes instead.
+    """
+
+    def __getitem__(self, key, default=None):
+        path = self._key_to_str(key)
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    return b""
+                if size < config.MMAP_MIN_SIZE:
+                    return f.read()
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            if default is not None:
+                return default
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        path = self._key_to_str(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{uuid.uuid4().hex}.partial"
+        try:
+            with open(partial, "wb") as f:
+                f.write(memoryview(value).cast("B"))
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    def getitems(self, keys, on_error="raise"):
+        result = {}
+        for key in keys:
+            try:
+                result[key] = self[key]
+            except KeyError:
+                pass
+        check_missing(keys, result, on_error)
+        return result
+
+    def getrange(self, key, start, stop=None):
+        return bytes(self[key][start:stop])
@@ -8,6 +8,8 @@ from collections.abc import MutableMapping
 
 import posixpath
 
+from hub.store.batched import check_missing, getitems, getrange, setitems
+
 
 class NestedStore(MutableMapping):
     def __init__(self, storage: MutableMapping, root: str):
@@ -20,6 +22,33 @@ class NestedStore(MutableMapping):
     def __setitem__(self, k, v):
         self._storage[posixpath.join(self._root, k)] = v
 
+    def getitems(self, keys, on_error="omit"):
+        result = getitems(self._storage, [posixpath.join(self._root, k) for k in keys])
+        prefix = self._root + "/"
+        result = {k[len(prefix) :]: v for k, v in result.items()}
+        check_missing(keys, result, on_error)
+        return result
+
+    def getrange(self, k, start, stop=None):
+        return getrange(self._storage, posixpath.join(self._root, k), start, stop)
+
+    def setitems(self, values):
+        setitems(
+            self._storage,
+            {posixpath.join(self._root, k): v for k, v in values.items()},
+        )
+
+    def storage_key(self, k):
+        """Key of k in the underlying storage"""
+        k = posixpath.join(self._root, k)
+        if hasattr(self._storage, "storage_key"):
+            return self._storage.storage_key(k)
+        return k
+
+    def prefetch(self, keys):
+        if hasattr(self._storage, "prefetch"):
+            self._storage.prefetch([posixpath.join(self._root, k) for k in keys])
+
     def __delitem__(self, k):
         del self._storage[posixpath.join(self._root, k)]
 
@@ -0,0 +1,397 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import struct
+import uuid
+import zlib
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from threading import RLock
+
+from hub import config, defaults
+from hub.store.batched import check_missing
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+PACK_MAGIC = b"HPK1"
+INDEX_MAGIC = b"HPI1"
+# magic, generation of the data file, new one on every compaction
+PACK_HEADER = struct.Struct("<4s8s")
+# crc32 of key and value, key length, value length
+RECORD_HEADER = struct.Struct("<IIQ")
+# magic, generation of the data file, bytes of it indexed, number of keys
+INDEX_HEADER = struct.Struct("<4s8sQQ")
+# offset of the value, its length, key length
+INDEX_ENTRY = struct.Struct("<QQI")
+# value length of the records deleting keys
+TOMBSTONE = 2 ** 64 - 1
+# Values closer than this in the data file are read in one request
+READ_GAP = 2 ** 16
+
+
+class PackedStore(MutableMapping):
+    """Store keeping all the values in one append-only data file, and their
+    offsets in an index file, so a dataset is a few files instead of one per chunk
+    Writes append records to the data file, the index is saved on flush.
+    Records appended after the last flush, by this or other processes, are
+    replayed from the data file, a torn record at its end is dropped.
+    Once overwritten and deleted values take more than config.PACKED_COMPACT_RATIO
+    of the data file, flush rewrites it with the live values only.
+    Appends of different processes are serialized by a lock of the data file.
+    """
+
+    def __init__(self, root: str, create: bool = False):
+        self.root = root
+        self.data_path = os.path.join(root, defaults.PACK_FILE)
+        self.index_path = os.path.join(root, defaults.PACK_INDEX_FILE)
+        self._lock = RLock()
+        self._depth = 0
+        # data file -> number of reads in progress
+        self._readers = dict()
+        # data files replaced or closed while read, closed by the last read
+        self._retired = set()
+        self._closed = False
+        if create and not os.path.exists(self.data_path):
+            os.makedirs(root, exist_ok=True)
+            self._create(self.data_path)
+        self._open()
+        with self._locked():
+            pass
+
+    @staticmethod
+    def exists(root: str) -> bool:
+        """Tells if the folder holds a packed store"""
+        return os.path.exists(os.path.join(root, defaults.PACK_FILE))
+
+    def __getstate__(self):
+        return {"root": self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"])
+
+    def _create(self, path):
+        with open(path, "wb") as f:
+            f.write(PACK_HEADER.pack(PACK_MAGIC, os.urandom(8)))
+
+    def _open(self):
+        try:
+            self._file = open(self.data_path, "r+b")
+            self._writable = True
+        except PermissionError:
+            self._file = open(self.data_path, "rb")
+            self._writable = False
+        self._fd = self._file.fileno()
+        self._inode = os.fstat(self._fd).st_ino
+        magic, self._generation = PACK_HEADER.unpack(os.pread(self._fd, 12, 0))
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{self.data_path} is not a packed store")
+        # key -> (offset of the value, its length)
+        self._index = dict()
+        self._dead = 0
+        self._dirty = False
+        # end of the records replayed, None until the index is loaded
+        self._end = None
+
+    def _replaced(self):
+        try:
+            return os.stat(self.data_path).st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+    def _changed(self):
+        """Tells if other processes wrote to the data file since it was replayed"""
+        return os.fstat(self._fd).st_size != self._end or self._replaced()
+
+    @contextmanager
+    def _locked(self):
+        """Holds lock of the data file, with records of other processes replayed"""
+        with self._lock:
+            if self._depth:
+                yield
+                return
+            while fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                if not self._replaced():
+                    break
+                # Compacted by another process
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                self._retire(self._file)
+                self._open()
+            self._depth += 1
+            try:
+                if self._end is None:
+                    self._end = self._load_index()
+                self._scan()
+                yield
+            finally:
+                self._depth -= 1
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _load_index(self) -> int:
+        """Loads the index saved by the last flush, returns bytes of data it covers"""
+        try:
+            with open(self.index_path, "rb") as f:
+                buf = f.read()
+        except FileNotFoundError:
+            return PACK_HEADER.size
+        magic, generation, end, count = INDEX_HEADER.unpack_from(buf)
+        # Index of the data file before a compaction, all the records are replayed
+        if magic != INDEX_MAGIC or generation != self._generation:
+            return PACK_HEADER.size
+        pos = INDEX_HEADER.size
+        live = 0
+        for _ in range(count):
+            offset, length, key_length = INDEX_ENTRY.unpack_from(buf, pos)
+            pos += INDEX_ENTRY.size
+            key = buf[pos : pos + key_length].decode("utf-8")
+            pos += key_length
+            self._index[key] = (offset, length)
+            live += RECORD_HEADER.size + key_length + length
+        self._dead = end - PACK_HEADER.size - live
+        return end
+
+    def _scan(self):
+        """Replays the records appended after the ones already in the index"""
+        size = os.fstat(self._fd).st_size
+        pos = self._end
+        while pos + RECORD_HEADER.size <= size:
+            crc, key_length, length = RECORD_HEADER.unpack(
+                os.pread(self._fd, RECORD_HEADER.size, pos)
+            )
+            body = key_length + (0 if length == TOMBSTONE else length)
+            if pos + RECORD_HEADER.size + body > size:
+                break
+            buf = os.pread(self._fd, body, pos + RECORD_HEADER.size)
+            if zlib.crc32(buf) != crc:
+                break
+            self._apply(buf[:key_length].decode("utf-8"), pos, key_length, length)
+            pos += RECORD_HEADER.size + body
+        if pos < size and self._writable:
+            # Torn record of a write interrupted by a crash
+            os.ftruncate(self._fd, pos)
+        self._end = pos
+
+    def _apply(self, key, pos, key_length, length):
+        """Updates the index with the record of the key at pos"""
+        if key in self._index:
+            _, old = self._index.pop(key)
+            self._dead += RECORD_HEADER.size + key_length + old
+        if length == TOMBSTONE:
+            self._dead += RECORD_HEADER.size + key_length
+        else:
+            self._index[key] = (pos + RECORD_HEADER.size + key_length, length)
+        self._dirty = True
+
+    def _record(self, key: bytes, value=None) -> bytes:
+        if value is None:
+            return RECORD_HEADER.pack(zlib.crc32(key), len(key), TOMBSTONE) + key
+        crc = zlib.crc32(value, zlib.crc32(key))
+        return b"".join((RECORD_HEADER.pack(crc, len(key), len(value)), key, value))
+
+    def _append(self, items):
+        """Appends records of items, (key, value or None to delete it), in one write"""
+        records = []
+        for key, value in items:
+            if value is not None:
+                value = memoryview(value).cast("B")
+            records.append((key.encode("utf-8"), value))
+        buf = b"".join(self._record(key, value) for key, value in records)
+        with self._locked():
+            os.pwrite(self._fd, buf, self._end)
+            for key, value in records:
+                size = 0 if value is None else len(value)
+                length = TOMBSTONE if value is None else size
+                self._apply(key.decode("utf-8"), self._end, len(key), length)
+                self._end += RECORD_HEADER.size + len(key) + size
+
+    def _acquire(self, keys):
+        """Index entries of the keys found, and the data file they point to
+        The file is kept open until _release(), even if a compaction replaces it
+        """
+        with self._lock:
+            if any(key not in self._index for key in keys) and self._changed():
+                with self._locked():
+                    pass
+            entries = {key: self._index[key] for key in keys if key in self._index}
+            file = self._file
+            self._readers[file] = self._readers.get(file, 0) + 1
+        return file, entries
+
+    def _release(self, file):
+        with self._lock:
+            self._readers[file] -= 1
+            if self._readers[file] == 0:
+                del self._readers[file]
+                if file in self._retired:
+                    self._retired.remove(file)
+                    file.close()
+
+    def _retire(self, file):
+        """Closes the data file, once the reads in progress are done"""
+        if file in self._readers:
+            self._retired.add(file)
+        else:
+            file.close()
+
+    def _lookup(self, key):
+        with self._lock:
+            if key not in self._index and self._changed():
+                with self._locked():
+                    pass
+            if key not in self._index:
+                raise KeyError(key)
+            return self._index[key]
+
+    def __getitem__(self, key):
+        return self.getrange(key, 0)
+
+    def getrange(self, key, start, stop=None):
+        """Gets bytes start to stop of the value, reading only them"""
+        file, entries = self._acquire([key])
+        try:
+            if key not in entries:
+                raise KeyError(key)
+            offset, length = entries[key]
+            start, stop, _ = slice(start, stop).indices(length)
+            return os.pread(file.fileno(), max(stop - start, 0), offset + start)
+        finally:
+            self._release(file)
+
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple values, the ones close in the data file with one read"""
+        file, entries = self._acquire(set(keys))
+        try:
+            found = sorted((entry, key) for key, entry in entries.items())
+            result = {}
+            i = 0
+            while i < len(found):
+                start, end = found[i][0][0], sum(found[i][0])
+                j = i + 1
+                while j < len(found) and found[j][0][0] - end <= READ_GAP:
+                    end = max(end, sum(found[j][0]))
+                    j += 1
+                buf = os.pread(file.fileno(), end - start, start)
+                for (offset, length), key in found[i:j]:
+                    result[key] = buf[offset - start : offset - start + length]
+                i = j
+        finally:
+            self._release(file)
+        check_missing(keys, result, on_error)
+        return result
+
+    def __setitem__(self, key, value):
+        self._append([(key, value)])
+
+    def setitems(self, values):
+        """Sets multiple values with one write"""
+        if values:
+            self._append(values.items())
+
+    def __delitem__(self, key):
+        with self._locked():
+            if key not in self._index:
+                raise KeyError(key)
+            self._append([(key, None)])
+
+    def __contains__(self, key):
+        try:
+            self._lookup(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        with self._locked():
+            keys = list(self._index)
+        yield from keys
+
+    def __len__(self):
+        with self._locked():
+            return len(self._index)
+
+    def _save_index(self):
+        entries = []
+        for key, (offset, length) in self._index.items():
+            key = key.encode("utf-8")
+            entries.append(INDEX_ENTRY.pack(offset, length, len(key)))
+            entries.append(key)
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, self._generation, self._end, len(self._index)
+        )
+        partial = f"{self.index_path}.{uuid.uuid4().hex}.partial"
+        with open(partial, "wb") as f:
+            f.write(header + b"".join(entries))
+        os.replace(partial, self.index_path)
+        self._dirty = False
+
+    def compact(self):
+        """Rewrites the data file with the live values only"""
+        with self._locked():
+            self._compact()
+
+    def _compact(self):
+        partial = f"{self.data_path}.{uuid.uuid4().hex}.partial"
+        self._create(partial)
+        try:
+            with open(partial, "r+b") as f:
+                _, generation = PACK_HEADER.unpack(f.read(PACK_HEADER.size))
+                index, pos = dict(), PACK_HEADER.size
+                for key, (offset, length) in sorted(
+                    self._index.items(), key=lambda item: item[1][0]
+                ):
+                    record = self._record(
+                        key.encode("utf-8"), os.pread(self._fd, length, offset)
+                    )
+                    os.pwrite(f.fileno(), record, pos)
+                    pos += len(record)
+                    index[key] = (pos - length, length)
+                os.fsync(f.fileno())
+            os.replace(partial, self.data_path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        # Lock of the old data file is held until the new one is written
+        old = self._file
+        self._open()
+        self._index, self._end = index, pos
+        self._save_index()
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            fcntl.flock(old.fileno(), fcntl.LOCK_UN)
+        self._retire(old)
+
+    def flush(self):
+        """Saves the index, compacting the data file first if it has too much garbage"""
+        if self._closed or not self._writable:
+            return
+        with self._locked():
+            size = self._end - PACK_HEADER.size
+            if self._dead > config.PACKED_COMPACT_RATIO * size:
+                self._compact()
+            elif self._dirty:
+                os.fsync(self._fd)
+                self._save_index()
+
+    def commit(self):
+        """ Deprecated alias to flush()"""
+        self.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._retire(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
@@ -5,18 +5,98 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 """
 
 from collections.abc import MutableMapping
+import os
 import posixpath
+import random
+import threading
 
 import boto3
 import botocore
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 from s3fs import S3FileSystem
 
+from hub import config
 from hub.exceptions import S3Exception
+from hub.store.batched import check_missing, concurrent_getitems, concurrent_setitems
+from hub.store.concurrency import AIMDLimiter, get_limiter, hedged
+from hub.store.io_executor import get_executor
 from hub.log import logger
 from hub.client.hub_control import HubControlClient
 import time
 
+# Error codes of throttled requests and transient server errors, which are retried
+RETRY_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequests",
+    "RequestTimeout",
+    "RequestTimeTooSkewed",
+    "InternalError",
+    "ServiceUnavailable",
+    "500",
+    "502",
+    "503",
+    "504",
+}
+# Most keys delete_objects accepts in one request
+DELETE_BATCH_SIZE = 1000
+
+# (process, backend) -> (settings the client was created with, client)
+_clients = dict()
+_clients_lock = threading.Lock()
+
+
+def get_client(backend: str, parallel: int, **kwargs):
+    """Returns boto3 S3 client of the backend (e.g. bucket url) created with kwargs
+    Clients are thread safe, so storages of the backend share one connection pool
+    of parallel connections. Retries are left to retry()
+    Client created with other kwargs, e.g. credentials before a refresh, is replaced,
+    so its connections are released
+    """
+    key = (os.getpid(), backend)
+    settings = (parallel, tuple(sorted(kwargs.items())))
+    with _clients_lock:
+        cached = _clients.get(key)
+        if cached is None or cached[0] != settings:
+            client_config = botocore.config.Config(
+                max_pool_connections=parallel,
+                retries={"max_attempts": 0},
+            )
+            client = boto3.client("s3", config=client_config, **kwargs)
+            _clients[key] = cached = (settings, client)
+        return cached[1]
+
+
+def is_retryable(err: Exception) -> bool:
+    """Tells if the request failed because of throttling or a transient error"""
+    if isinstance(err, ClientError):
+        error = err.response.get("Error", {})
+        status = err.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return error.get("Code") in RETRY_CODES or status in (429, 500, 502, 503, 504)
+    return isinstance(err, BotoCoreError)
+
+
+def retry(request, limiter: AIMDLimiter = None, **kwargs):
+    """Calls request(**kwargs), retrying throttled and failed requests
+    with exponential backoff and full jitter, up to config.S3_MAX_RETRIES times
+    limiter -> limits the requests in flight and learns from their latency
+    """
+    attempt = 0
+    while True:
+        try:
+            if limiter is None:
+                return request(**kwargs)
+            return limiter.run(request, **kwargs)
+        except (ClientError, BotoCoreError) as err:
+            if attempt >= config.S3_MAX_RETRIES or not is_retryable(err):
+                raise
+            delay = config.S3_RETRY_BASE_DELAY * 2 ** attempt
+            delay = min(config.S3_RETRY_MAX_DELAY, delay)
+            time.sleep(random.uniform(0, delay))
+            attempt += 1
+
 
 class S3Storage(MutableMapping):
     def __init__(
@@ -27,7 +107,7 @@ class S3Storage(MutableMapping):
         aws_access_key_id=None,
         aws_secret_access_key=None,
         aws_session_token=None,
-        parallel=25,
+        parallel=None,
         endpoint_url=None,
         aws_region=None,
         expiration=None,
@@ -36,7 +116,8 @@ class S3Storage(MutableMapping):
         self.root = {}
         self.url = url
         self.public = public
-        self.parallel = parallel
+        # Requests run in the I/O executor, so the connection pool matches its size
+        self.parallel = parallel or config.IO_WORKERS
         self.aws_region = aws_region
         self.endpoint_url = endpoint_url
         self.expiration = expiration
@@ -47,51 +128,37 @@ class S3Storage(MutableMapping):
             self.bucket = url.split("/")[4]
             self.path = "/".join(url.split("/")[5:])
         self.bucketpath = posixpath.join(self.bucket, self.path)
+        self._backend = f"s3:{endpoint_url or ''}/{self.bucket}"
         self.protocol = "object"
 
-        self.client_config = botocore.config.Config(
-            max_pool_connections=parallel,
-        )
-
-        self.client = boto3.client(
-            "s3",
+        self.client = get_client(
+            self._backend,
+            self.parallel,
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
-            config=self.client_config,
             endpoint_url=self.endpoint_url,
             region_name=self.aws_region,
         )
 
-        self.resource = boto3.resource(
-            "s3",
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            config=self.client_config,
-            endpoint_url=self.endpoint_url,
-            region_name=self.aws_region,
-        )
+    @property
+    def limiter(self) -> AIMDLimiter:
+        """Limiter of the requests to the bucket, shared by its storages"""
+        return get_limiter(self._backend)
+
+    def _retry(self, request, **kwargs):
+        return retry(request, limiter=self.limiter, **kwargs)
 
     def check_update_creds(self):
         if self.expiration and float(self.expiration) < time.time():
             details = HubControlClient().get_credentials()
             self.expiration = details["expiration"]
-            self.client = boto3.client(
-                "s3",
-                aws_access_key_id=details["access_key"],
-                aws_secret_access_key=details["secret_key"],
-                aws_session_token=details["session_token"],
-                config=self.client_config,
-                endpoint_url=self.endpoint_url,
-                region_name=self.aws_region,
-            )
-            self.resource = boto3.resource(
-                "s3",
+            self.client = get_client(
+                self._backend,
+                self.parallel,
                 aws_access_key_id=details["access_key"],
                 aws_secret_access_key=details["secret_key"],
                 aws_session_token=details["session_token"],
-                config=self.client_config,
                 endpoint_url=self.endpoint_url,
                 region_name=self.aws_region,
             )
@@ -100,31 +167,157 @@ class S3Storage(MutableMapping):
         self.check_update_creds()
         try:
             path = posixpath.join(self.path, path)
-            content = bytearray(memoryview(content))
+            content = memoryview(content).cast("B")
+            if len(content) > config.S3_MULTIPART_THRESHOLD:
+                self._put_multipart(path, content)
+                return
             attrs = {
                 "Bucket": self.bucket,
-                "Body": content,
+                "Body": bytearray(content),
                 "Key": path,
                 "ContentType": ("application/octet-stream"),
             }
 
-            self.client.put_object(**attrs)
+            self._retry(self.client.put_object, **attrs)
         except Exception as err:
             logger.error(err)
             raise S3Exception(err)
 
+    def _put_multipart(self, path, content):
+        """Uploads parts of config.S3_PART_SIZE concurrently"""
+        upload_id = self._retry(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=path,
+            ContentType="application/octet-stream",
+        )["UploadId"]
+
+        def upload_part(part):
+            number, start = part
+            body = bytes(content[start : start + config.S3_PART_SIZE])
+            resp = self._retry(
+                self.client.upload_part,
+                Bucket=self.bucket,
+                Key=path,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=body,
+            )
+            return {"ETag": resp["ETag"], "PartNumber": number}
+
+        starts = range(0, len(content), config.S3_PART_SIZE)
+        try:
+            parts = get_executor().map(upload_part, enumerate(starts, 1))
+            self._retry(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=path,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            try:
+                self.client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=path, UploadId=upload_id
+                )
+            except Exception as err:
+                logger.warning(f"Could not abort upload of {path}: {err}")
+            raise
+
     def __getitem__(self, path):
         self.check_update_creds()
         try:
             path = posixpath.join(self.path, path)
+            return self._get(path)
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "NoSuchKey":
+                raise KeyError(err)
+            else:
+                raise
+        except Exception as err:
+            logger.error(err)
+            raise S3Exception(err)
+
+    def getrange(self, path, start, stop=None):
+        """Gets bytes start to stop of the object with one ranged request"""
+        self.check_update_creds()
+        if start < 0 and stop is None:
+            byte_range = f"bytes={start}"
+        elif start >= 0 and (stop is None or stop >= 0):
+            if stop is not None and stop <= start:
+                return b""
+            byte_range = f"bytes={start}-{'' if stop is None else stop - 1}"
+        else:
+            return bytes(self[path][start:stop])
+        try:
+            return self._get_range(posixpath.join(self.path, path), byte_range)[0]
+        except ClientError as err:
+            code = err.response["Error"]["Code"]
+            if code == "NoSuchKey":
+                raise KeyError(err)
+            elif code == "InvalidRange":
+                return b""
+            else:
+                raise
+        except Exception as err:
+            logger.error(err)
+            raise S3Exception(err)
+
+    def _get_range(self, path, byte_range):
+        """Reads byte_range of the object, returns the bytes and the object size"""
+
+        def get():
             resp = self.client.get_object(
+                Bucket=self.bucket, Key=path, Range=byte_range
+            )
+            return resp["Body"].read(), resp.get("ContentRange")
+
+        # Body is read inside the retried request, as the connection may drop midway
+        data, content_range = hedged(lambda: self._retry(get), self.limiter)
+        size = int(content_range.split("/")[-1]) if content_range else len(data)
+        return data, size
+
+    def _get(self, path):
+        """Reads the object, the parts of large ones concurrently"""
+        part_size = config.S3_PART_SIZE
+        try:
+            first, size = self._get_range(path, f"bytes=0-{part_size - 1}")
+        except ClientError as err:
+            # Empty objects have no byte range
+            if err.response["Error"]["Code"] != "InvalidRange":
+                raise
+            resp = self._retry(self.client.get_object, Bucket=self.bucket, Key=path)
+            return resp["Body"].read()
+        if size <= len(first):
+            return first
+        buffer = bytearray(size)
+        buffer[: len(first)] = first
+
+        def get_part(start):
+            stop = min(start + part_size, size)
+            buffer[start:stop] = self._get_range(path, f"bytes={start}-{stop - 1}")[0]
+
+        get_executor().map(get_part, range(len(first), size, part_size))
+        return buffer
+
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple objects using up to parallel concurrent requests"""
+        result = concurrent_getitems(self.__getitem__, keys, self.parallel)
+        check_missing(keys, result, on_error)
+        return result
+
+    def getversion(self, path):
+        """Returns ETag of the object"""
+        self.check_update_creds()
+        try:
+            resp = self._retry(
+                self.client.head_object,
                 Bucket=self.bucket,
-                Key=path,
+                Key=posixpath.join(self.path, path),
             )
-            x = resp["Body"].read()
-            return x
+            return resp["ETag"]
         except ClientError as err:
-            if err.response["Error"]["Code"] == "NoSuchKey":
+            if err.response["Error"]["Code"] in ("NoSuchKey", "404"):
                 raise KeyError(err)
             else:
                 raise
@@ -132,14 +325,72 @@ class S3Storage(MutableMapping):
             logger.error(err)
             raise S3Exception(err)
 
+    def getversions(self, keys):
+        """Gets ETags of multiple objects using up to parallel concurrent requests"""
+        return concurrent_getitems(self.getversion, keys, self.parallel)
+
+    def setitems(self, values):
+        """Puts multiple objects using up to parallel concurrent requests"""
+        concurrent_setitems(self.__setitem__, values, self.parallel)
+
+    def delitems(self, keys):
+        """Deletes multiple objects, up to DELETE_BATCH_SIZE in one request
+        Keys which do not exist are ignored
+        """
+        self.check_update_creds()
+        self._delete([posixpath.join(self.path, key) for key in keys])
+
+    def _delete(self, paths):
+        batches = [
+            paths[i : i + DELETE_BATCH_SIZE]
+            for i in range(0, len(paths), DELETE_BATCH_SIZE)
+        ]
+        try:
+            if len(batches) > 1:
+                get_executor().map(self._delete_objects, batches)
+            elif batches:
+                self._delete_objects(batches[0])
+        except Exception as err:
+            logger.error(err)
+            raise S3Exception(err)
+
+    def _delete_objects(self, paths):
+        resp = self._retry(
+            self.client.delete_objects,
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": path} for path in paths], "Quiet": True},
+        )
+        errors = resp.get("Errors")
+        if errors:
+            raise S3Exception(
+                f"Could not delete {len(errors)} objects, {errors[0].get('Key')}: "
+                f"{errors[0].get('Message')}"
+            )
+
+    def _list(self, prefix):
+        """Lists keys of the objects under the prefix"""
+        paginator = self.client.get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(item["Key"] for item in page.get("Contents", []))
+        return keys
+
     def __delitem__(self, path):
+        """Deletes the object, or all the objects under path if it is a folder"""
         self.check_update_creds()
         try:
-            path = posixpath.join(self.bucketpath, path)
-            self.s3fs.rm(path, recursive=True)
+            path = posixpath.join(self.path, path)
+            paths = [
+                key
+                for key in self._retry(self._list, prefix=path)
+                if key == path or key.startswith(path + "/")
+            ]
         except Exception as err:
             logger.error(err)
             raise S3Exception(err)
+        if not paths:
+            raise KeyError(path)
+        self._delete(paths)
 
     def __len__(self):
         self.check_update_creds()
@@ -0,0 +1,234 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import atexit
+import mmap
+import os
+import shutil
+import struct
+import uuid
+import weakref
+from contextlib import contextmanager
+from threading import RLock
+
+from hub.store.disk_cache import CacheDirectoryStore, DiskCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SIZE = struct.Struct("<q")
+
+
+def _file_size(path):
+    try:
+        return os.stat(path).st_size
+    except (FileNotFoundError, NotADirectoryError):
+        return 0
+
+
+def _folder_size(path):
+    return sum(
+        _file_size(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SizeCounter:
+    """Bytes taken by a cache folder, in a file shared by the processes using it
+    Where fcntl is not available it is shared only by the threads of this process
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._create_lock()
+
+    def _create_lock(self):
+        self._lock = RLock()
+        self._fd = None
+
+    def __getstate__(self):
+        return {"_path": self._path}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_lock()
+
+    @contextmanager
+    def locked(self):
+        """Holds the lock of the counter, which also guards the users of the folder"""
+        with self._lock:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def add(self, delta: int) -> int:
+        """Adds delta bytes, returns the new size"""
+        with self.locked():
+            buf = os.pread(self._fd, SIZE.size, 0)
+            size = SIZE.unpack(buf)[0] if len(buf) == SIZE.size else 0
+            size = max(size + delta, 0)
+            if delta:
+                os.pwrite(self._fd, SIZE.pack(size), 0)
+            return size
+
+    def set(self, size: int):
+        with self.locked():
+            os.pwrite(self._fd, SIZE.pack(size), 0)
+
+    def value(self) -> int:
+        return self.add(0)
+
+
+class SharedDirectoryStore(CacheDirectoryStore):
+    """CacheDirectoryStore returning read-only memory maps of the files
+    In a memory backed folder all the processes read the same pages without copying
+    Bytes of the files are counted in size, shared by all the processes
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        super().__init__(path, *args, **kwargs)
+        self.size = SizeCounter(self.path.rstrip("/") + ".size")
+
+    def __getitem__(self, key):
+        filepath = os.path.join(self.path, key)
+        try:
+            with open(filepath, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        filepath = os.path.join(self.path, key)
+        old = _file_size(filepath)
+        super().__setitem__(key, value)
+        self.size.add(_file_size(filepath) - old)
+
+    def __delitem__(self, key):
+        filepath = os.path.join(self.path, key)
+        size = _file_size(filepath)
+        try:
+            zarr_delitem = super(CacheDirectoryStore, self).__delitem__
+            zarr_delitem(key)
+        except (KeyError, FileNotFoundError):
+            # Removed by another process, which counted it
+            return
+        self.size.add(-size)
+
+
+# Caches of this process, released at exit
+_caches = weakref.WeakValueDictionary()
+
+
+@atexit.register
+def _release_caches():
+    for cache in list(_caches.values()):
+        cache.release()
+
+
+class SharedMemoryCache(DiskCache):
+    """Chunk cache shared by the processes reading a dataset, e.g. DataLoader workers
+    Should be placed in a memory backed folder such as /dev/shm,
+    each chunk is downloaded once and kept in memory once for all the processes
+    max_size bounds the folder, the chunks cached by all the processes together.
+    Each process evicts only the chunks it has cached, so one whose chunks are
+    all evicted goes over max_size by the chunk it is caching.
+    The folder is removed when the last process using it closes the cache or exits,
+    users which died without doing so are skipped.
+    """
+
+    storage_class = SharedDirectoryStore
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_user"] = None
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._register()
+
+    @property
+    def _users_path(self):
+        return self.path.rstrip("/") + ".users"
+
+    def _live_users(self):
+        """Users of the folder whose process is alive, others are dropped"""
+        try:
+            names = os.listdir(self._users_path)
+        except FileNotFoundError:
+            return []
+        users = []
+        for name in names:
+            if _alive(int(name.split(".")[0])):
+                users.append(name)
+            else:
+                os.remove(os.path.join(self._users_path, name))
+        return users
+
+    def _register(self):
+        size = self._cache_storage.size
+        with size.locked():
+            # Counter may be stale after crashes, the first user counts the files
+            if not self._live_users():
+                size.set(_folder_size(self.path))
+            os.makedirs(self._users_path, exist_ok=True)
+            self._user = f"{os.getpid()}.{uuid.uuid4().hex}"
+            open(os.path.join(self._users_path, self._user), "wb").close()
+        _caches[id(self)] = self
+
+    def _load_cached_items(self):
+        self._register()
+        super()._load_cached_items()
+
+    def _used_size(self):
+        return self._cache_storage.size.value()
+
+    def _adopted_size(self, size):
+        # Already counted by the process which cached it
+        return 0
+
+    def release(self):
+        """Stops using the folder, the last process using it removes it"""
+        if self._user is None or not self._user.startswith(f"{os.getpid()}."):
+            # Already released, or inherited by a forked process
+            return
+        size = self._cache_storage.size
+        with size.locked():
+            try:
+                os.remove(os.path.join(self._users_path, self._user))
+            except FileNotFoundError:
+                pass
+            self._user = None
+            if not self._live_users():
+                shutil.rmtree(self.path, ignore_errors=True)
+                size.set(0)
+        _caches.pop(id(self), None)
+
+    def close(self):
+        super().close()
+        self.release()
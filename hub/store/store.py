@@ -9,16 +9,31 @@ import posixpath
 import shutil
 import configparser
 import os
+import tempfile
 from time import sleep
 
 import re
 import fsspec
-import gcsfs
 import zarr
 
+from hub import defaults
 from hub.store.lru_cache import LRUCache
+from hub.store.disk_cache import DiskCache
+from hub.store.mmap_store import MMapFSMap
+from hub.store.packed_store import PackedStore
+from hub.store.shared_cache import SharedMemoryCache
+from hub.store.batched import (
+    check_missing,
+    concurrent_getitems,
+    concurrent_setitems,
+    getitems,
+    object_version,
+)
+from hub.store.concurrency import get_limiter, hedged
 from hub.client.hub_control import HubControlClient
 from hub.store.azure_fs import AzureBlobFileSystem
+from hub.store.gcs_fs import GCSFileSystem
+from hub.store.http_fs import HTTPFileSystem
 from hub.store.s3_file_system_replacement import S3FileSystemReplacement
 
 
@@ -65,7 +80,7 @@ def get_fs_and_path(
             url[5:],
         )
     elif url.startswith("gcs://"):
-        return gcsfs.GCSFileSystem(token=token), url[6:]
+        return GCSFileSystem(token=token), url[6:]
     elif url.find("blob.core.windows.net/") != -1:
         account_name = url.split(".")[0]
         account_name = account_name[8:] if url.startswith("https://") else account_name
@@ -76,6 +91,9 @@ def get_fs_and_path(
             ),
             url[url.find("blob.core.windows.net/") + 22 :],
         )
+    elif url.startswith("http://") or url.startswith("https://"):
+        # token -> headers of the requests, if the server needs any
+        return HTTPFileSystem(headers=token), url
     elif (
         url.startswith("../")
         or url.startswith("./")
@@ -93,7 +111,7 @@ def get_fs_and_path(
         if url.split("/")[0] == "google":
             org_id, ds_name = url.split("/")
             token, url = HubControlClient().get_dataset_credentials(org_id, ds_name)
-            fs = gcsfs.GCSFileSystem(token=token)
+            fs = GCSFileSystem(token=token)
             url = url[6:]
         else:
             url, creds = _connect(url, public=public)
@@ -116,8 +134,26 @@ def read_aws_creds(filepath: str):
     return {section: dict(parser.items(section)) for section in parser.sections()}
 
 
-def _get_storage_map(fs, path):
-    return StorageMapWrapperWithCommit(fs.get_mapper(path, check=False, create=False))
+def _get_storage_map(fs, path, memory_map=False, packed=False):
+    """memory_map -> local files are read as memory maps, on posix systems
+    where files mapped by readers can be replaced
+    packed -> local items are kept in a PackedStore, created if missing
+    """
+    if _is_local_fs(fs):
+        if packed:
+            return StorageMapWrapperWithCommit(PackedStore(path, create=True))
+        if memory_map and os.name == "posix":
+            return StorageMapWrapperWithCommit(MMapFSMap(path, fs))
+        return StorageMapWrapperWithCommit(
+            fs.get_mapper(path, check=False, create=False)
+        )
+    fs_map = fs.get_mapper(path, check=False, create=False)
+    # S3Storage limits its requests itself
+    if hasattr(fs_map, "limiter"):
+        return StorageMapWrapperWithCommit(fs_map)
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+    backend = f"{protocol}://{path.split('://')[-1].split('/')[0]}"
+    return StorageMapWrapperWithCommit(fs_map, backend=backend)
 
 
 def get_cache_path(path, cache_folder="~/.activeloop/cache/"):
@@ -140,27 +176,152 @@ def get_cache_path(path, cache_folder="~/.activeloop/cache/"):
     return os.path.expanduser(posixpath.join(cache_folder, path))
 
 
-def get_storage_map(fs, path, memcache=2 ** 26, lock=True, storage_cache=2 ** 28):
-    store = _get_storage_map(fs, path)
+def get_shared_cache_path(path):
+    """Folder of the shared memory cache, in /dev/shm where it is available"""
+    if os.path.isdir("/dev/shm"):
+        return get_cache_path(path, "/dev/shm/activeloop/cache/")
+    folder = os.path.join(tempfile.gettempdir(), "activeloop/cache/")
+    return get_cache_path(path, folder)
+
+
+def remove_cache(path, cache_folder="~/.activeloop/cache/"):
+    """Removes chunks of the dataset at path from the local storage and shared caches"""
+    shutil.rmtree(get_cache_path(path, cache_folder), ignore_errors=True)
+    shutil.rmtree(get_shared_cache_path(path), ignore_errors=True)
+
+
+def _is_local_fs(fs):
+    protocols = (fs.protocol,) if isinstance(fs.protocol, str) else fs.protocol
+    return "file" in protocols
+
+
+def get_storage_map(
+    fs,
+    path,
+    memcache=2 ** 26,
+    lock=True,
+    storage_cache=2 ** 28,
+    write_behind=None,
+    prefetch=0,
+    cache_policy="lru",
+    shared_cache=0,
+    coherence=None,
+    memory_map=False,
+    packed=False,
+):
+    store = _get_storage_map(fs, path, memory_map, packed)
+    if write_behind is None:
+        # Writes to local disk are fast, background writers only add threads
+        local = _is_local_fs(fs)
+        write_behind = 0 if local else defaults.DEFAULT_WRITE_BEHIND_WORKERS
+    # Local datasets are already on disk, caching them there again gives nothing
+    if storage_cache and storage_cache > 0 and not _is_local_fs(fs):
+        store = DiskCache(
+            get_cache_path(path),
+            store,
+            storage_cache,
+            lock=lock,
+            write_behind=write_behind,
+            coherence=coherence,
+        )
+        # Memory cache writes only to local disk, uploads are done by the disk cache
+        write_behind = 0
+    if shared_cache and shared_cache > 0 and not _is_local_fs(fs):
+        # Replaces the memory cache, the processes reading the dataset share one copy
+        return SharedMemoryCache(
+            get_shared_cache_path(path),
+            store,
+            shared_cache,
+            lock=lock,
+            write_behind=write_behind,
+            prefetch=prefetch,
+            policy=cache_policy,
+            coherence=coherence,
+        )
     if memcache and memcache > 0:
-        store = LRUCache(zarr.MemoryStore(), store, memcache)
+        store = LRUCache(
+            zarr.MemoryStore(),
+            store,
+            memcache,
+            lock=lock,
+            write_behind=write_behind,
+            prefetch=prefetch,
+            policy=cache_policy,
+            coherence=coherence,
+        )
     return store
 
 
 class StorageMapWrapperWithCommit(MutableMapping):
-    def __init__(self, map):
+    def __init__(self, map, workers=defaults.DEFAULT_BATCH_WORKERS, backend=None):
+        """backend -> name of the remote backend (e.g. gcs://bucket), requests to it
+        are limited by its AIMDLimiter and reads are hedged if config.HEDGE_REQUESTS
+        """
         self._map = map
+        self._workers = workers
+        self._backend = backend
         self.root = self._map.root
 
+    def _request(self, fn, *args):
+        if self._backend is None:
+            return fn(*args)
+        return get_limiter(self._backend).run(fn, *args)
+
+    def _read(self, fn, *args):
+        if self._backend is None:
+            return fn(*args)
+        limiter = get_limiter(self._backend)
+        return hedged(lambda: limiter.run(fn, *args), limiter)
+
     def __getitem__(self, slice_):
-        return self._map[slice_]
+        return self._read(self._map.__getitem__, slice_)
 
     def __setitem__(self, slice_, value):
-        self._map[slice_] = value
+        self._request(self._map.__setitem__, slice_, value)
 
     def __delitem__(self, slice_):
         del self._map[slice_]
 
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple items, concurrently if the underlying storage supports it
+        Items of remote backends are requested one by one, as the limiter allows
+        """
+        if self._backend is None:
+            result = getitems(self._map, keys)
+        else:
+            result = concurrent_getitems(self.__getitem__, keys, self._workers)
+        check_missing(keys, result, on_error)
+        return result
+
+    def getrange(self, key, start, stop=None):
+        """Gets bytes start to stop of the item, reading only them from the file"""
+        if hasattr(self._map, "getrange"):
+            return self._map.getrange(key, start, stop)
+        path = self._map._key_to_str(key)
+        try:
+            return self._read(self._map.fs.cat_file, path, start, stop)
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def getversions(self, keys):
+        """Gets versions of multiple items, ETag, generation or mtime of the files"""
+        if hasattr(self._map, "getversions"):
+            return self._map.getversions(keys)
+        return concurrent_getitems(self._getversion, keys, self._workers)
+
+    def _getversion(self, key):
+        path = self._map._key_to_str(key)
+        # Listings cached by the filesystem would hide changes by other writers
+        self._map.fs.invalidate_cache(path)
+        try:
+            return object_version(self._request(self._map.fs.info, path))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def setitems(self, values):
+        """Sets multiple items using up to workers concurrent writes"""
+        concurrent_setitems(self.__setitem__, values, self._workers)
+
     def __len__(self):
         return len(self._map)
 
@@ -168,14 +329,16 @@ class StorageMapWrapperWithCommit(MutableMapping):
         yield from self._map
 
     def flush(self):
-        pass
+        if hasattr(self._map, "flush"):
+            self._map.flush()
 
     def commit(self):
         """ Deprecated alias to flush()"""
         self.flush()
 
     def close(self):
-        pass
+        if hasattr(self._map, "close"):
+            self._map.close()
 
     def __enter__(self):
         return self
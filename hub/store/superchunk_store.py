@@ -0,0 +1,270 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import posixpath
+import struct
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from threading import RLock
+
+from hub import config, defaults
+from hub.store.batched import check_missing, getitems, setitems
+
+SUPERCHUNK_MAGIC = b"HSC1"
+# magic, number of chunks
+SUPERCHUNK_HEADER = struct.Struct("<4sI")
+# offset of the chunk after the index, its length, key length
+SUPERCHUNK_ENTRY = struct.Struct("<QQI")
+# Indexes of the superchunks read last, so reading them again needs no decoding
+INDEXES_KEPT = 256
+
+
+def encode_superchunk(chunks: dict) -> bytes:
+    """Superchunk holding the chunks, key -> value"""
+    entries, values, offset = [], [], 0
+    for key, value in chunks.items():
+        key = key.encode("utf-8")
+        value = memoryview(value).cast("B")
+        entries.append(SUPERCHUNK_ENTRY.pack(offset, len(value), len(key)))
+        entries.append(key)
+        values.append(value)
+        offset += len(value)
+    header = SUPERCHUNK_HEADER.pack(SUPERCHUNK_MAGIC, len(chunks))
+    return b"".join([header] + entries + values)
+
+
+def decode_index(buf) -> dict:
+    """Index of the superchunk, key -> (offset of the chunk in buf, its length)"""
+    magic, count = SUPERCHUNK_HEADER.unpack_from(buf)
+    if magic != SUPERCHUNK_MAGIC:
+        raise ValueError("Not a superchunk")
+    pos = SUPERCHUNK_HEADER.size
+    entries = []
+    for _ in range(count):
+        offset, length, key_length = SUPERCHUNK_ENTRY.unpack_from(buf, pos)
+        pos += SUPERCHUNK_ENTRY.size
+        key = bytes(buf[pos : pos + key_length]).decode("utf-8")
+        entries.append((key, offset, length))
+        pos += key_length
+    return {key: (pos + offset, length) for key, offset, length in entries}
+
+
+class SuperchunkStore(MutableMapping):
+    """Store putting the chunks of small tensors for the same samples in one object
+    Chunks of the folders passed to register() go to the superchunk of their first
+    sample, which holds samples samples of all these folders with an index,
+    so reading a sample fetches one object for all of them.
+    Other keys are passed to storage as they are.
+    Superchunks written are kept until flush(), at most config.SUPERCHUNK_MAX_PENDING.
+    They are rewritten as a whole, so the same samples should be written by one process.
+    """
+
+    def __init__(self, storage: MutableMapping, samples: int):
+        self._storage = storage
+        self._samples = samples
+        # chunk folder -> samples per chunk
+        self._folders = dict()
+        # superchunk key -> its chunks, written and not flushed yet
+        self._pending = OrderedDict()
+        # superchunk key -> (value read, its index)
+        self._indexes = OrderedDict()
+        self._lock = RLock()
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_pending"] = OrderedDict(
+                (key, dict(chunks)) for key, chunks in self._pending.items()
+            )
+        del state["_lock"]
+        state["_indexes"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = RLock()
+
+    def register(self, folder: str, samples: int):
+        """Puts the chunks of folder, samples samples each, in superchunks"""
+        self._folders[posixpath.normpath(folder)] = samples
+
+    def _superchunk(self, key: str) -> str:
+        """Key of the superchunk of the chunk in storage, None if it is not in one"""
+        folder, name = posixpath.split(key)
+        samples = self._folders.get(folder)
+        if samples is None:
+            return None
+        try:
+            # Chunk coordinates, with the commit id after ":"
+            first = int(name.split(":")[0].split(".")[0])
+        except ValueError:
+            return None
+        group = first * samples // self._samples
+        return posixpath.join(defaults.SUPERCHUNK_DIR, str(group))
+
+    def _index(self, superchunk: str, buf) -> dict:
+        cached = self._indexes.get(superchunk)
+        if cached is not None and cached[0] is buf:
+            self._indexes.move_to_end(superchunk)
+            return cached[1]
+        index = decode_index(buf)
+        self._indexes[superchunk] = (buf, index)
+        if len(self._indexes) > INDEXES_KEPT:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _chunks(self, superchunk: str) -> dict:
+        """Chunks of the superchunk, to be changed and written on flush"""
+        chunks = self._pending.get(superchunk)
+        if chunks is not None:
+            self._pending.move_to_end(superchunk)
+            return chunks
+        try:
+            buf = self._storage[superchunk]
+        except KeyError:
+            chunks = dict()
+        else:
+            index = self._index(superchunk, buf)
+            chunks = {k: buf[o : o + n] for k, (o, n) in index.items()}
+        self._pending[superchunk] = chunks
+        while len(self._pending) > config.SUPERCHUNK_MAX_PENDING:
+            self._write(*self._pending.popitem(last=False))
+        return chunks
+
+    def _write(self, superchunk: str, chunks: dict):
+        self._indexes.pop(superchunk, None)
+        if chunks:
+            self._storage[superchunk] = encode_superchunk(chunks)
+            return
+        try:
+            del self._storage[superchunk]
+        except KeyError:
+            pass
+
+    def _extract(self, superchunk: str, buf, key: str):
+        offset, length = self._index(superchunk, buf)[key]
+        return buf[offset : offset + length]
+
+    def __getitem__(self, key):
+        superchunk = self._superchunk(key)
+        if superchunk is None:
+            return self._storage[key]
+        with self._lock:
+            chunks = self._pending.get(superchunk)
+            if chunks is not None:
+                return chunks[key]
+        buf = self._storage[superchunk]
+        with self._lock:
+            return self._extract(superchunk, buf, key)
+
+    def getitems(self, keys, on_error="omit"):
+        """Gets multiple chunks, fetching each superchunk once"""
+        result, superchunks, others = dict(), dict(), []
+        with self._lock:
+            for key in keys:
+                superchunk = self._superchunk(key)
+                if superchunk is None:
+                    others.append(key)
+                elif superchunk in self._pending:
+                    if key in self._pending[superchunk]:
+                        result[key] = self._pending[superchunk][key]
+                else:
+                    superchunks.setdefault(superchunk, []).append(key)
+        fetched = getitems(self._storage, others + list(superchunks))
+        with self._lock:
+            for superchunk, chunk_keys in superchunks.items():
+                if superchunk not in fetched:
+                    continue
+                index = self._index(superchunk, fetched[superchunk])
+                for key in chunk_keys:
+                    if key in index:
+                        offset, length = index[key]
+                        result[key] = fetched[superchunk][offset : offset + length]
+        for key in others:
+            if key in fetched:
+                result[key] = fetched[key]
+        check_missing(keys, result, on_error)
+        return result
+
+    def getrange(self, key, start, stop=None):
+        return bytes(self[key][start:stop])
+
+    def __setitem__(self, key, value):
+        superchunk = self._superchunk(key)
+        if superchunk is None:
+            self._storage[key] = value
+            return
+        with self._lock:
+            self._chunks(superchunk)[key] = value
+
+    def setitems(self, values):
+        """Sets multiple chunks, each superchunk is changed once"""
+        others = dict()
+        with self._lock:
+            for key, value in values.items():
+                superchunk = self._superchunk(key)
+                if superchunk is None:
+                    others[key] = value
+                else:
+                    self._chunks(superchunk)[key] = value
+        setitems(self._storage, others)
+
+    def __delitem__(self, key):
+        superchunk = self._superchunk(key)
+        if superchunk is None:
+            del self._storage[key]
+            return
+        with self._lock:
+            del self._chunks(superchunk)[key]
+
+    def storage_key(self, key):
+        """Key of the object holding the chunk in storage"""
+        return self._superchunk(key) or key
+
+    def prefetch(self, keys):
+        if hasattr(self._storage, "prefetch"):
+            keys = [self.storage_key(key) for key in keys]
+            self._storage.prefetch(list(dict.fromkeys(keys)))
+
+    def __iter__(self):
+        with self._lock:
+            pending = {key for chunks in self._pending.values() for key in chunks}
+            superchunks = set(self._pending)
+        yield from pending
+        prefix = defaults.SUPERCHUNK_DIR + "/"
+        for key in list(self._storage):
+            if not key.startswith(prefix):
+                yield key
+            elif key not in superchunks:
+                for chunk in decode_index(self._storage[key]):
+                    yield chunk
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def flush_pending(self):
+        """Writes the superchunks changed to storage, without flushing it"""
+        with self._lock:
+            while self._pending:
+                self._write(*self._pending.popitem(last=False))
+
+    def flush(self):
+        self.flush_pending()
+        self._storage.flush()
+
+    def commit(self):
+        """Deprecated alias to flush()"""
+        self.flush()
+
+    def close(self):
+        self.flush_pending()
+        self._storage.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
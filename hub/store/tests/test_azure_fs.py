@@ -0,0 +1,137 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import threading
+from types import SimpleNamespace
+
+from azure.core.exceptions import ResourceNotFoundError
+import pytest
+
+from hub import config
+from hub.store.azure_fs import AzureBlobFileSystem
+
+
+class MemoryBlobServiceClient:
+    """Stand-in for azure BlobServiceClient keeping blobs in memory"""
+
+    def __init__(self):
+        self.blobs = dict()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name, **kwargs):
+        with self._lock:
+            self.calls.append((name, kwargs))
+
+    def get_container_client(self, container):
+        return MemoryContainerClient(self, container)
+
+    def get_blob_client(self, container, name):
+        return MemoryBlobClient(self, container, name)
+
+
+class MemoryContainerClient:
+    def __init__(self, service, container):
+        self.service = service
+        self.container = container
+
+    def list_blobs(self, name_starts_with="", results_per_page=None):
+        self.service._call("list_blobs", results_per_page=results_per_page)
+        return [
+            {"name": name}
+            for container, name in sorted(self.service.blobs)
+            if container == self.container and name.startswith(name_starts_with)
+        ]
+
+    def delete_blobs(self, *names, raise_on_any_failure=True):
+        self.service._call("delete_blobs", count=len(names))
+        for name in names:
+            self.service.blobs.pop((self.container, name), None)
+
+
+class MemoryBlobClient:
+    def __init__(self, service, container, name):
+        self.service = service
+        self.key = (container, name)
+
+    def _blob(self):
+        if self.key not in self.service.blobs:
+            raise ResourceNotFoundError("The specified blob does not exist")
+        return self.service.blobs[self.key]
+
+    def upload_blob(self, value, overwrite=False, max_concurrency=1):
+        self.service._call("upload_blob", max_concurrency=max_concurrency)
+        self.service.blobs[self.key] = bytes(value)
+
+    def download_blob(self, offset=None, length=None, max_concurrency=1):
+        self.service._call(
+            "download_blob",
+            offset=offset,
+            length=length,
+            max_concurrency=max_concurrency,
+        )
+        blob = self._blob()
+        start = offset or 0
+        stop = None if length is None else start + length
+        return SimpleNamespace(readall=lambda: blob[start:stop])
+
+    def get_blob_properties(self):
+        self.service._call("get_blob_properties")
+        blob = self._blob()
+        return SimpleNamespace(size=len(blob), etag=str(hash(blob)))
+
+
+def create_fs():
+    fs = AzureBlobFileSystem("account", account_key="a2V5")
+    fs.service_client = MemoryBlobServiceClient()
+    return fs
+
+
+def test_azure_fs_connect():
+    client = AzureBlobFileSystem("account", account_key="a2V5").service_client
+    assert client._config.max_single_put_size == config.AZURE_SINGLE_PUT_SIZE
+    assert client._config.max_block_size == config.AZURE_BLOCK_SIZE
+    session = client._pipeline._transport.session
+    assert session.get_adapter("https://account")._pool_maxsize == config.IO_WORKERS
+
+
+def test_azure_fs_map():
+    fs = create_fs()
+    client = fs.service_client
+    fs_map = fs.get_mapper("container/dataset")
+    fs_map["a/0.0"] = b"hello world"
+    fs_map.setitems({f"b/{i}": str(i).encode() for i in range(300)})
+    assert client.calls[0] == (
+        "upload_blob",
+        {"max_concurrency": config.AZURE_MAX_CONCURRENCY},
+    )
+    client.calls.clear()
+    assert fs_map["a/0.0"] == b"hello world"
+    with pytest.raises(KeyError):
+        fs_map["a/1.0"]
+    # Reads don't list the container
+    assert [name for name, _ in client.calls] == ["download_blob"] * 2
+    assert fs_map.getitems(["b/1", "b/2", "c/0"]) == {"b/1": b"1", "b/2": b"2"}
+    assert fs.cat_file("container/dataset/a/0.0", 6) == b"world"
+    assert fs.cat_file("container/dataset/a/0.0", 0, 5) == b"hello"
+    assert fs.cat_file("container/dataset/a/0.0", -5) == b"world"
+    assert fs.cat_file("container/dataset/a/0.0", 2, 2) == b""
+    with pytest.raises(FileNotFoundError):
+        fs.cat_file("container/dataset/a/1.0", 0, 5)
+    client.calls.clear()
+    fs_map.delitems([f"b/{i}" for i in range(300)] + ["c/0"])
+    assert [call["count"] for name, call in client.calls] == [256, 45]
+    assert len(fs_map) == 1
+    client.calls.clear()
+    fs.rm("container/dataset")
+    assert [name for name, _ in client.calls] == ["list_blobs", "delete_blobs"]
+    assert len(fs_map) == 0
+    assert not fs.exists("container/dataset")
+
+
+if __name__ == "__main__":
+    test_azure_fs_connect()
+    test_azure_fs_map()
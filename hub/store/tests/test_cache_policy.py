@@ -0,0 +1,120 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import random
+
+import zarr
+
+from hub.store.cache_policy import (
+    BeladyPolicy,
+    LFUPolicy,
+    LRUPolicy,
+    TwoQPolicy,
+    create_policy,
+)
+from hub.store.lru_cache import LRUCache
+from hub.store.tests.test_lru_cache import SlowStore
+
+
+def scan_with_hot_key(policy):
+    """Passes twice over data 4 times the cache size,
+    reading small hot key a few times in a row every 12 items
+    Returns number of times the hot key was fetched from actual storage
+    """
+    actual = SlowStore()
+    actual["labels"] = bytes(10)
+    for i in range(40):
+        actual[f"image/{i}"] = bytes(100)
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000, policy=policy)
+    fetched = 0
+    for _ in range(2):
+        for i in range(40):
+            cache[f"image/{i}"]
+            if i % 12 == 0:
+                gets = actual.gets
+                for _ in range(3):
+                    cache["labels"]
+                fetched += actual.gets - gets
+    cache.close()
+    return fetched
+
+
+def test_cache_policy_scan():
+    assert scan_with_hot_key("lru") == 7
+    assert scan_with_hot_key("2q") == 2
+    assert scan_with_hot_key("lfu") == 1
+
+
+def shuffled_epochs(policy):
+    """Reads data 2 times the cache size in two shuffled epochs
+    Returns number of items fetched from actual storage
+    """
+    actual = SlowStore()
+    for i in range(20):
+        actual[str(i)] = bytes(100)
+    rng = random.Random(0)
+    order = [str(i) for _ in range(2) for i in rng.sample(range(20), 20)]
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000, policy=policy)
+    if policy == "belady":
+        cache.schedule([[key] for key in order])
+    for step, key in enumerate(order):
+        cache.advance(step)
+        cache[key]
+    cache.close()
+    return actual.gets
+
+
+def test_cache_policy_belady():
+    # Second epoch hits only what the first one left cached
+    assert shuffled_epochs("lru") > shuffled_epochs("belady") == 30
+
+
+def test_belady_policy_advance():
+    policy = BeladyPolicy()
+    policy.schedule([["a"], ["b"], ["c"], ["a"], ["b"], ["a"]])
+    for step, key in enumerate("abc"):
+        policy.advance(step)
+        policy[key] = 10
+    policy["d"] = 10
+    # Next uses change only for the keys of the steps passed
+    policy.advance(4)
+    assert [policy.evict()[0] for _ in range(2)] == ["c", "d"]
+    policy.advance(0)
+    assert policy.evict()[0] == "b"
+    assert list(policy) == ["a"]
+
+
+def test_create_policy():
+    assert isinstance(create_policy("lru", 100), LRUPolicy)
+    assert isinstance(create_policy("2q", 100), TwoQPolicy)
+    policy = LFUPolicy()
+    assert create_policy(policy, 100) is policy
+    try:
+        create_policy("fifo", 100)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_policies_updates():
+    for name in ("lru", "2q", "lfu", "belady"):
+        policy = create_policy(name, 30)
+        policy["a"] = 10
+        policy["b"] = 10
+        policy["a"] = 20
+        assert policy["a"] == 20 and len(policy) == 2
+        del policy["b"]
+        assert list(policy) == ["a"]
+        assert policy.evict() == ("a", 20)
+        assert len(policy) == 0
+
+
+if __name__ == "__main__":
+    test_cache_policy_scan()
+    test_cache_policy_belady()
+    test_belady_policy_advance()
+    test_create_policy()
+    test_policies_updates()
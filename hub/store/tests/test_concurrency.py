@@ -0,0 +1,97 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import threading
+import time
+
+import pytest
+
+from hub import config
+from hub.store.concurrency import AIMDLimiter, hedged, is_throttled
+
+
+class ThrottleError(Exception):
+    status_code = 503
+
+
+def throttle():
+    raise ThrottleError()
+
+
+def test_is_throttled():
+    assert is_throttled(ThrottleError())
+    assert not is_throttled(KeyError("key"))
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(4, 8)
+    for _ in range(40):
+        limiter.run(lambda: None)
+    assert limiter.limit == 8
+    with pytest.raises(ThrottleError):
+        limiter.run(throttle)
+    assert limiter.limit == 4
+    assert limiter.throttles == 1
+    # Slower responses are taken as congestion too
+    limiter = AIMDLimiter(8, 8, latency_floor=0)
+    for _ in range(20):
+        limiter.run(time.sleep, 0.001)
+    for _ in range(5):
+        limiter.run(time.sleep, 0.05)
+    assert limiter.limit < 8
+
+
+def test_aimd_limiter_in_flight():
+    limiter = AIMDLimiter(2, 2)
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def request():
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+    threads = [threading.Thread(target=limiter.run, args=(request,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert in_flight[1] == 2
+
+
+def test_hedged():
+    limiter = AIMDLimiter(4, 8)
+    calls = []
+
+    def request():
+        # The first request stalls, as the slowest ones of a real backend do
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(2)
+        return len(calls)
+
+    for _ in range(20):
+        limiter.run(time.sleep, 0.001)
+    hedge = config.HEDGE_REQUESTS
+    config.HEDGE_REQUESTS = True
+    try:
+        start = time.monotonic()
+        assert hedged(lambda: limiter.run(request), limiter) == 2
+        assert time.monotonic() - start < 1
+        assert limiter.hedges == 1
+    finally:
+        config.HEDGE_REQUESTS = hedge
+    assert hedged(request, limiter) == 3
+
+
+if __name__ == "__main__":
+    test_is_throttled()
+    test_aimd_limiter()
+    test_aimd_limiter_in_flight()
+    test_hedged()
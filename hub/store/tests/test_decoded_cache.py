@@ -0,0 +1,78 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import pickle
+
+import numpy as np
+
+from hub.store.decoded_cache import DecodedChunkCache
+
+
+def test_decoded_cache():
+    cache = DecodedChunkCache(250)
+    loads = []
+
+    def load(key):
+        def _load():
+            loads.append(key)
+            return np.zeros(100, dtype="uint8")
+
+        return _load
+
+    cache.get_or_load("a", load("a"))
+    cache.get_or_load("b", load("b"))
+    cache.get_or_load("a", load("a"))
+    cache.get_or_load("c", load("c"))
+    assert loads == ["a", "b", "c"]
+    assert sorted(cache._items) == ["a", "c"]
+    cache.discard(["a"])
+    cache.get_or_load("a", load("a"))
+    assert loads == ["a", "b", "c", "a"]
+
+    # Chunks larger than the cache are not cached
+    cache.get_or_load("big", lambda: np.zeros(300, dtype="uint8"))
+    assert "big" not in cache._items
+    cache.clear()
+    assert cache._total == 0
+
+
+def test_decoded_cache_invalidated_while_loading():
+    cache = DecodedChunkCache(250)
+
+    def load():
+        # Chunk changes while its old version is being decoded
+        cache.discard(["a"])
+        return np.zeros(100, dtype="uint8")
+
+    cache.get_or_load("a", load)
+    assert "a" not in cache._items
+
+
+def test_decoded_cache_max_age():
+    cache = DecodedChunkCache(250, max_age=0)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return np.zeros(100, dtype="uint8")
+
+    cache.get_or_load("a", load)
+    cache.get_or_load("a", load)
+    assert len(loads) == 2 and cache._total == 100
+
+
+def test_decoded_cache_pickle():
+    cache = DecodedChunkCache(250)
+    cache.get_or_load("a", lambda: np.zeros(100, dtype="uint8"))
+    cache = pickle.loads(pickle.dumps(cache))
+    assert cache.max_size == 250 and not cache._items
+
+
+if __name__ == "__main__":
+    test_decoded_cache()
+    test_decoded_cache_invalidated_while_loading()
+    test_decoded_cache_max_age()
+    test_decoded_cache_pickle()
@@ -0,0 +1,87 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import shutil
+
+import fsspec
+import zarr
+
+from hub.store.disk_cache import DiskCache
+from hub.store.lru_cache import LRUCache
+from hub.store.store import get_storage_map
+from hub.store.tests.test_lru_cache import VersionedStore
+
+
+def test_disk_cache():
+    path = "./data/test/test_disk_cache"
+    shutil.rmtree(path, ignore_errors=True)
+    data = bytes("Hello World", "utf-8")
+    actual = zarr.MemoryStore()
+    cache = DiskCache(path, actual, 30)
+    cache["Aello"] = data
+    cache["Beta"] = data
+    cache["Gamma"] = data
+    assert list(sorted(cache.cache_storage)) == ["Beta", "Gamma"]
+    assert list(sorted(actual)) == ["Aello"]
+    cache.flush()
+    assert list(sorted(actual)) == ["Aello", "Beta", "Gamma"]
+
+    # A new process finds the chunks cached by the previous one
+    del actual["Gamma"]
+    cache = DiskCache(path, actual, 30)
+    assert cache._total_cached == 2 * len(data)
+    assert cache["Gamma"] == data
+
+    # Cache folder is trimmed to the new max_size
+    cache = DiskCache(path, actual, 15)
+    assert len(list(cache.cache_storage)) == 1
+
+
+def test_disk_cache_evicted_by_other_process():
+    path = "./data/test/test_disk_cache_evicted"
+    shutil.rmtree(path, ignore_errors=True)
+    data = bytes("Hello World", "utf-8")
+    actual = zarr.MemoryStore()
+    actual["Aello"] = data
+    cache = DiskCache(path, actual, 30)
+    other = DiskCache(path, actual, 30)
+    assert cache["Aello"] == data
+    del other.cache_storage["Aello"]
+    assert cache["Aello"] == data
+
+
+def test_disk_cache_coherence():
+    path = "./data/test/test_disk_cache_coherence"
+    shutil.rmtree(path, ignore_errors=True)
+    actual = VersionedStore()
+    actual["Aello"] = b"old"
+    cache = DiskCache(path, actual, 30, coherence=0)
+    assert cache["Aello"] == b"old"
+    # Version is kept next to the chunk, for the processes sharing the folder
+    other = DiskCache(path, actual, 30, coherence=0)
+    assert list(other.cache_storage.keys()) == ["Aello"]
+    assert other["Aello"] == b"old"
+    actual["Aello"] = b"new"
+    assert other["Aello"] == b"new"
+    assert cache["Aello"] == b"new"
+    assert other.stats()[""]["invalidation"] == 1
+
+
+def test_storage_map_tiers():
+    local = get_storage_map(fsspec.filesystem("file"), "./data/test/tiers")
+    assert isinstance(local, LRUCache)
+    assert not isinstance(local.actual_storage, DiskCache)
+    assert local._write_behind == 0
+    remote = get_storage_map(fsspec.filesystem("memory"), "test/tiers")
+    assert isinstance(remote.actual_storage, DiskCache)
+    assert remote.actual_storage._write_behind > 0
+
+
+if __name__ == "__main__":
+    test_disk_cache()
+    test_disk_cache_evicted_by_other_process()
+    test_disk_cache_coherence()
+    test_storage_map_tiers()
@@ -7,10 +7,13 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 from hub.exceptions import DynamicTensorShapeException
 import posixpath
 
+import numcodecs
 import numpy as np
 import fsspec
 from zarr.creation import create
 
+from hub.numcodecs import ShardCodec
+from hub.store.decoded_cache import DecodedChunkCache
 from hub.store.dynamic_tensor import DynamicTensor
 from hub.store.store import StorageMapWrapperWithCommit
 
@@ -129,7 +132,100 @@ def test_dynamic_tensor_4():
     assert (t[0, 6:8] == np.ones((2, 20, 10), dtype="int32")).all()
 
 
+def test_dynamic_tensor_chunk_cache():
+    cache = DecodedChunkCache(2 ** 20)
+    t = DynamicTensor(
+        create_store("./data/test/test_dynamic_tensor_chunk_cache"),
+        mode="w",
+        shape=(10, None),
+        max_shape=(10, 10),
+        dtype="int32",
+        chunks=5,
+        chunk_cache=cache,
+    )
+    for i in range(10):
+        t[i] = np.full((i,), i)
+    for i in range(10):
+        assert t[i].tolist() == [i] * i
+    assert sorted(cache._items) == [(t._id, 0), (t._id, 1)]
+    t[3] = np.full((3,), 7)
+    assert (t._id, 0) not in cache._items
+    assert t[3].tolist() == [7, 7, 7]
+    # Reads return copies, not views of the cached chunk
+    t[4][:] = 0
+    assert t[4].tolist() == [4] * 4
+    assert [item.tolist() for item in t[2:4]] == [[2, 2], [7, 7, 7]]
+
+
+class RangeCountingStore(StorageMapWrapperWithCommit):
+    def __init__(self, map):
+        super().__init__(map)
+        self.read_bytes = 0
+        self.ranges = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.read_bytes += len(value)
+        return value
+
+    def getrange(self, key, start, stop=None):
+        value = super().getrange(key, start, stop)
+        self.read_bytes += len(value)
+        self.ranges += 1
+        return value
+
+
+def test_dynamic_tensor_shard():
+    store = create_store("./data/test/test_dynamic_tensor_shard")
+    t = DynamicTensor(
+        RangeCountingStore(store._map),
+        mode="w",
+        shape=(20, 100),
+        max_shape=(20, 100),
+        dtype="int64",
+        chunks=10,
+        compressor=ShardCodec(numcodecs.Zstd()),
+    )
+    data = np.random.randint(0, 1000, (20, 100))
+    t[0:20] = data
+    t.fs_map.read_bytes = 0
+    assert t[13].tolist() == data[13].tolist()
+    assert t[-1, 5:10].tolist() == data[-1, 5:10].tolist()
+    # Only two samples and the footers are read, not the whole chunks
+    assert t.fs_map.read_bytes < data[:2].nbytes + 256
+    assert t[2:15].tolist() == data[2:15].tolist()
+    t[3] = np.zeros(100)
+    assert t[3].tolist() == [0] * 100
+
+
+def test_dynamic_tensor_shard_footer_cache():
+    store = create_store("./data/test/test_dynamic_tensor_shard_footer_cache")
+    t = DynamicTensor(
+        RangeCountingStore(store._map),
+        mode="w",
+        shape=(20, 100),
+        max_shape=(20, 100),
+        dtype="int64",
+        chunks=10,
+        compressor=ShardCodec(numcodecs.Zstd(), block_rows=1),
+        chunk_cache=DecodedChunkCache(2 ** 10),
+    )
+    data = np.random.randint(0, 1000, (20, 100))
+    t[0:20] = data
+    t.fs_map.ranges = 0
+    for i in range(10):
+        assert t[i].tolist() == data[i].tolist()
+    # Footer is fetched once for the chunk, then one block per sample
+    assert t.fs_map.ranges == 11
+    t[3] = np.zeros(100)
+    assert t[3].tolist() == [0] * 100
+    assert t[4].tolist() == data[4].tolist()
+
+
 if __name__ == "__main__":
     test_read_and_append_modes()
     # test_chunk_iterator()
     # test_dynamic_tensor_shapes()
+    test_dynamic_tensor_chunk_cache()
+    test_dynamic_tensor_shard()
+    test_dynamic_tensor_shard_footer_cache()
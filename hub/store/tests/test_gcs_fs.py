@@ -0,0 +1,37 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+from types import SimpleNamespace
+
+from gcsfs.utils import HttpError
+
+from hub import config
+from hub.store.gcs_fs import GCSFileSystem
+
+
+def test_gcs_fs_cat_file():
+    fs = GCSFileSystem(token="anon")
+    assert fs.session.get_adapter("https://storage")._pool_maxsize == config.IO_WORKERS
+    ranges = []
+
+    def call(method, path, headers=None):
+        ranges.append(headers["Range"])
+        if headers["Range"] == "bytes=100-":
+            raise HttpError({"code": 416, "message": "range not satisfiable"})
+        return SimpleNamespace(content=b"data")
+
+    fs._call = call
+    fs.info = lambda path: {"size": 10}
+    assert fs.cat_file("bucket/dataset/a/0.0", 2, 6) == b"data"
+    assert fs.cat_file("bucket/dataset/a/0.0", -4) == b"data"
+    assert fs.cat_file("bucket/dataset/a/0.0", 2, -4) == b"data"
+    assert fs.cat_file("bucket/dataset/a/0.0", 100) == b""
+    assert fs.cat_file("bucket/dataset/a/0.0", 4, 4) == b""
+    assert ranges == ["bytes=2-5", "bytes=-4", "bytes=2-5", "bytes=100-"]
+
+
+if __name__ == "__main__":
+    test_gcs_fs_cat_file()
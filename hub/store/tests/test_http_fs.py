@@ -0,0 +1,139 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import functools
+import http.server
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from hub import Dataset
+from hub.schema import Tensor
+from hub.store.batched import getitems
+from hub.store.http_fs import HTTPFileSystem, ReadOnlyError
+from hub.store.store import _get_storage_map
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves files with keep-alive connections and single Range requests
+    Range is ignored if the server has ranges set to False
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        self.server.requests.append((self.command, self.client_address))
+
+    def send_head(self):
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        path = self.translate_path(self.path)
+        if not match or not self.server.ranges or not os.path.isfile(path):
+            return super().send_head()
+        with open(path, "rb") as f:
+            data = f.read()
+        start, end = match.groups()
+        if not start:
+            start, end = max(len(data) - int(end), 0), len(data) - 1
+        start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+        if start >= len(data):
+            self.send_error(416)
+            return None
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start : end + 1])
+        return None
+
+
+@contextmanager
+def serve(directory, ranges=True):
+    """Serves the directory at a local url while in the context"""
+    handler = functools.partial(RangeRequestHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.ranges = ranges
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def create_files(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(path, "a"))
+    for i in range(20):
+        with open(os.path.join(path, "a", str(i)), "wb") as f:
+            f.write(b"hello world %d" % i)
+
+
+def test_http_fs():
+    path = "./data/test/http_fs"
+    create_files(path)
+    fs = HTTPFileSystem()
+    for ranges in (True, False):
+        with serve(path, ranges) as (server, url):
+            assert fs.cat_file(f"{url}/a/1") == b"hello world 1"
+            assert fs.cat_file(f"{url}/a/1", 6, 11) == b"world"
+            assert fs.cat_file(f"{url}/a/1", -7) == b"world 1"
+            assert fs.cat_file(f"{url}/a/1", 6, -2) == b"world"
+            assert fs.cat_file(f"{url}/a/1", 100) == b""
+            assert fs.info(f"{url}/a/12")["size"] == 14
+            assert fs.exists(f"{url}/a/1")
+            assert not fs.exists(f"{url}/a/100")
+            with pytest.raises(FileNotFoundError):
+                fs.cat_file(f"{url}/a/100")
+            with pytest.raises(ReadOnlyError):
+                fs.pipe(f"{url}/a/100", b"value")
+
+
+def test_http_fs_map():
+    path = "./data/test/http_fs_map"
+    create_files(path)
+    with serve(path) as (server, url):
+        fs_map = _get_storage_map(HTTPFileSystem(), f"{url}/a")
+        keys = [str(i) for i in range(20)] + ["missing"]
+        values = getitems(fs_map, keys)
+        assert values == {str(i): b"hello world %d" % i for i in range(20)}
+        assert fs_map.getrange("3", -7) == b"world 3"
+        with pytest.raises(KeyError):
+            fs_map.getrange("missing", 0, 5)
+        with pytest.raises(ReadOnlyError):
+            fs_map["4"] = b"value"
+        # Connections are kept alive and reused
+        connections = {address for _, address in server.requests}
+        assert len(connections) < len(server.requests) / 2
+
+
+def test_dataset_http():
+    schema = {
+        "first": Tensor((10,), "int32", chunks=2),
+        "second": Tensor((None,), "int32", max_shape=(5,)),
+    }
+    ds = Dataset("./data/test/http/dataset", shape=(20,), schema=schema, mode="w")
+    for i in range(20):
+        ds["first", i] = np.full((10,), i)
+        ds["second", i] = np.full((i % 5,), i)
+    ds.flush()
+    with serve("./data/test/http") as (server, url):
+        ds = Dataset(f"{url}/dataset", storage_cache=0)
+        assert ds._mode == "r"
+        assert ds["first", 3:9].compute()[:, 0].tolist() == [3, 4, 5, 6, 7, 8]
+        assert ds["second", 8].compute().tolist() == [8] * 3
+
+
+if __name__ == "__main__":
+    test_http_fs()
+    test_http_fs_map()
+    test_dataset_http()
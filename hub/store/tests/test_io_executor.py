@@ -0,0 +1,90 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import threading
+
+from hub import config
+from hub.store.io_executor import PREFETCH, READ, WRITE, IOExecutor, get_executor
+
+
+def test_io_executor_priority():
+    executor = IOExecutor(1)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    executor.submit(block)
+    started.wait()
+    futures = [
+        executor.submit(order.append, "prefetch", priority=PREFETCH),
+        executor.submit(order.append, "write", priority=WRITE),
+        executor.submit(order.append, "read", priority=READ),
+    ]
+    release.set()
+    for future in futures:
+        future.result()
+    assert order == ["read", "write", "prefetch"]
+    executor.shutdown()
+
+
+def test_io_executor_nested():
+    # Requests waiting for the requests they submit run them if no thread is free
+    executor = IOExecutor(1)
+
+    def outer(i):
+        return sum(executor.map(lambda j: i * j, range(4)))
+
+    assert executor.map(outer, range(3)) == [0, 6, 12]
+    # Nested requests inherit the priority of the request submitting them
+    priorities = executor.map(
+        lambda _: executor.map(lambda _: executor.current_priority(), range(2)),
+        range(2),
+        priority=PREFETCH,
+    )
+    assert priorities == [[PREFETCH, PREFETCH]] * 2
+    executor.shutdown()
+
+
+def test_io_executor_max_bytes():
+    executor = IOExecutor(4, max_bytes=100)
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def write(size):
+        with lock:
+            in_flight[0] += size
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        threading.Event().wait(0.01)
+        with lock:
+            in_flight[0] -= size
+
+    futures = [executor.submit(write, 60, size=60) for _ in range(4)]
+    for future in futures:
+        future.result()
+    assert in_flight[1] == 60
+    executor.shutdown()
+
+
+def test_get_executor():
+    executor = get_executor()
+    assert get_executor() is executor
+    workers = config.IO_WORKERS
+    config.IO_WORKERS = workers + 1
+    try:
+        assert get_executor().workers == workers + 1
+    finally:
+        config.IO_WORKERS = workers
+
+
+if __name__ == "__main__":
+    test_io_executor_priority()
+    test_io_executor_nested()
+    test_io_executor_max_bytes()
+    test_get_executor()
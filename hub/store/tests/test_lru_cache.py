@@ -4,11 +4,46 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from hub.store.lru_cache import LRUCache
 
 import zarr
 
 
+class SlowStore(zarr.MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+        self.batches = 0
+        self.puts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._counter_lock = threading.Lock()
+
+    def __getitem__(self, key):
+        self.gets += 1
+        time.sleep(0.01)
+        return super().__getitem__(key)
+
+    def getitems(self, keys, on_error="omit"):
+        self.batches += 1
+        time.sleep(0.01)
+        return {k: zarr.MemoryStore.__getitem__(self, k) for k in keys if k in self}
+
+    def __setitem__(self, key, value):
+        with self._counter_lock:
+            self.puts += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        super().__setitem__(key, value)
+        with self._counter_lock:
+            self.in_flight -= 1
+
+
 def test_lru_cache():
     data = bytes("Hello World", "utf-8")
     cache = LRUCache(zarr.MemoryStore(), zarr.MemoryStore(), 30)
@@ -43,5 +78,189 @@ def test_lru_cache():
     cache.commit()
 
 
+def test_lru_cache_single_flight():
+    actual = SlowStore()
+    actual["chunk"] = bytes(100)
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000)
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda _: cache["chunk"], range(64)))
+    assert all(result == bytes(100) for result in results)
+    assert actual.gets == 1
+
+
+class BlockingStore(zarr.MemoryStore):
+    """Store whose batches with the key "slow" wait for release to be set"""
+
+    def __init__(self):
+        super().__init__()
+        self.fetched = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def getitems(self, keys, on_error="omit"):
+        self.fetched += keys
+        if "slow" in keys:
+            self.started.set()
+            self.release.wait(10)
+        return {k: zarr.MemoryStore.__getitem__(self, k) for k in keys if k in self}
+
+
+def test_lru_cache_getitems_single_flight():
+    actual = BlockingStore()
+    actual["slow"], actual["fast"], actual["written"] = b"slow", b"fast", b"old"
+    # One key stripe, so every key would share the lock of the slow one
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000, stripes=1)
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(cache.getitems, ["slow", "written"])
+        actual.started.wait(10)
+        second = pool.submit(cache.getitems, ["slow"])
+        # Other keys are fetched while the slow one is
+        assert cache.getitems(["fast"]) == {"fast": b"fast"}
+        # Written while fetching, the older value fetched is not cached
+        cache["written"] = b"new"
+        actual.release.set()
+        assert first.result() == {"slow": b"slow", "written": b"old"}
+        assert second.result() == {"slow": b"slow"}
+    assert sorted(actual.fetched) == ["fast", "slow", "written"]
+    assert cache["written"] == b"new"
+
+
+def test_lru_cache_concurrent():
+    actual = SlowStore()
+    cache = LRUCache(zarr.MemoryStore(), actual, 250)
+
+    def work(i):
+        key = str(i % 10)
+        cache[key] = bytes([i % 10]) * 50
+        assert cache[key] == bytes([i % 10]) * 50
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(work, range(200)))
+    assert cache._total_cached == sum(cache._cached_items.values())
+    assert cache._total_cached <= 250
+    cache.flush()
+    assert not cache._dirty and not cache._evicted
+    for i in range(10):
+        assert actual[str(i)] == bytes([i]) * 50
+
+
+def test_lru_cache_write_behind():
+    actual = SlowStore()
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000, write_behind=8, max_dirty=300)
+    for i in range(50):
+        cache[str(i)] = bytes(100)
+        assert cache._evicted_size <= 300
+    cache.flush()
+    assert not cache._dirty and not cache._evicted
+    assert sorted(actual) == sorted(str(i) for i in range(50))
+    assert actual.max_in_flight > 1
+
+    for i in range(50, 60):
+        cache[str(i)] = bytes(100)
+    future = cache.flush_async()
+    future.result()
+    assert len(actual) == 60
+    cache.close()
+
+
+def test_lru_cache_getitems():
+    actual = SlowStore()
+    for i in range(10):
+        actual[str(i)] = bytes([i]) * 10
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000)
+    assert cache["0"] == bytes(10)
+    items = cache.getitems([str(i) for i in range(12)])
+    assert sorted(items) == sorted(str(i) for i in range(10))
+    assert actual.batches == 1 and actual.gets == 1
+    assert items == cache.getitems([str(i) for i in range(10)])
+    assert actual.batches == 1
+    try:
+        cache.getitems(["10"], on_error="raise")
+        assert False
+    except KeyError:
+        pass
+
+
+def test_lru_cache_prefetch():
+    actual = SlowStore()
+    for i in range(10):
+        actual[str(i)] = bytes(100)
+    cache = LRUCache(zarr.MemoryStore(), actual, 1000, prefetch=2, max_prefetched=300)
+    cache.prefetch(["0", "1", "2"]).result()
+    assert actual.batches == 1 and cache._prefetched_size == 300
+    # Paused until some of the prefetched items are read
+    assert cache.prefetch(["3"]) is None
+    assert cache["0"] == bytes(100)
+    assert cache.prefetch(["2", "3", "4"]).result() is None
+    assert actual.gets == 0
+    assert sorted(cache.cache_storage) == ["0", "1", "2", "3", "4"]
+    cache.close()
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(zarr.MemoryStore(), zarr.MemoryStore(), 30)
+    cache["a/0"] = bytes(10)
+    cache["a/1"] = bytes(10)
+    cache["b/0"] = bytes(20)
+    assert cache["b/0"] == bytes(20)
+    assert cache["a/0"] == bytes(10)
+    stats = cache.stats()
+    assert stats["a"]["write"] == 2 and stats["a"]["eviction"] == 2
+    assert stats["a"]["write_back"] == 2 and stats["a"]["write_back_bytes"] == 20
+    assert stats["a"]["miss"] == 1 and stats["a"]["miss_bytes"] == 10
+    assert stats["b"]["hit"] == 1 and stats["b"]["hit_bytes"] == 20
+    cache.reset_stats()
+    assert cache.stats() == {}
+
+
+class VersionedStore(zarr.MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.versions = {}
+        self.checks = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.versions[key] = str(int(self.versions.get(key, "0")) + 1)
+
+    def getversions(self, keys):
+        self.checks += 1
+        return {key: self.versions[key] for key in keys if key in self.versions}
+
+
+def test_lru_cache_coherence():
+    actual = VersionedStore()
+    actual["a"] = b"old"
+    actual["b"] = b"old"
+    cache = LRUCache(zarr.MemoryStore(), actual, 100, coherence=0)
+    assert cache.getitems(["a", "b"]) == {"a": b"old", "b": b"old"}
+    # Changed by another writer
+    actual["a"] = b"new"
+    assert cache.getitems(["a", "b"]) == {"a": b"new", "b": b"old"}
+    assert cache.stats()[""]["invalidation"] == 1
+    # Items written through the cache are not dropped after they are written back
+    cache["b"] = b"mine"
+    cache.flush()
+    assert cache["b"] == b"mine"
+    assert cache["b"] == b"mine"
+    assert cache.stats()[""]["invalidation"] == 1
+
+    # Checked only after the staleness bound
+    cache = LRUCache(zarr.MemoryStore(), actual, 100, coherence=60)
+    assert cache["a"] == b"new"
+    checks = actual.checks
+    actual["a"] = b"newer"
+    assert cache["a"] == b"new"
+    assert actual.checks == checks
+
+
 if __name__ == "__main__":
     test_lru_cache()
+    test_lru_cache_single_flight()
+    test_lru_cache_getitems_single_flight()
+    test_lru_cache_concurrent()
+    test_lru_cache_write_behind()
+    test_lru_cache_getitems()
+    test_lru_cache_prefetch()
+    test_lru_cache_stats()
+    test_lru_cache_coherence()
@@ -0,0 +1,52 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import mmap
+import shutil
+
+import fsspec
+import pytest
+
+from hub import config
+from hub.store.mmap_store import MMapFSMap
+
+
+def test_mmap_fs_map(monkeypatch):
+    monkeypatch.setattr(config, "MMAP_MIN_SIZE", 4)
+    path = "./data/test/mmap_fs_map"
+    shutil.rmtree(path, ignore_errors=True)
+    store = MMapFSMap(path, fsspec.filesystem("file"))
+    store["tensor/0.0"] = b"first"
+    store["tensor/1.0"] = b""
+    value = store["tensor/0.0"]
+    assert isinstance(value, mmap.mmap)
+    # Files are replaced, maps held by readers keep the old version
+    store["tensor/0.0"] = b"second"
+    assert value[:] == b"first"
+    assert store["tensor/0.0"][:] == b"second"
+    assert store["tensor/1.0"] == b""
+    assert store.getrange("tensor/0.0", 1, 3) == b"ec"
+    assert set(store.getitems(["tensor/0.0", "tensor/2.0"], on_error="omit")) == {
+        "tensor/0.0"
+    }
+    with pytest.raises(KeyError):
+        store["tensor/2.0"]
+    assert sorted(store) == ["tensor/0.0", "tensor/1.0"]
+
+
+def test_mmap_fs_map_small_files():
+    path = "./data/test/mmap_fs_map_small_files"
+    shutil.rmtree(path, ignore_errors=True)
+    store = MMapFSMap(path, fsspec.filesystem("file"))
+    store["small"] = b"abc"
+    store["large"] = bytes(config.MMAP_MIN_SIZE)
+    # Small files are read without holding a file descriptor
+    assert store["small"] == b"abc"
+    assert isinstance(store["large"], mmap.mmap)
+
+
+if __name__ == "__main__":
+    test_mmap_fs_map_small_files()
@@ -0,0 +1,142 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import threading
+
+import pytest
+
+from hub import config
+from hub.store.packed_store import PackedStore
+
+
+def packed_store(name):
+    path = f"./data/test/{name}"
+    shutil.rmtree(path, ignore_errors=True)
+    return PackedStore(path, create=True)
+
+
+def test_packed_store():
+    store = packed_store("packed_store")
+    store["a/0.0"] = b"first"
+    store.setitems({"a/1.0": b"second", "b/0": b"", "c/0": b"third"})
+    assert store["a/0.0"] == b"first"
+    assert store["b/0"] == b""
+    assert store.getrange("c/0", 1, 3) == b"hi"
+    assert store.getrange("c/0", -2) == b"rd"
+    assert store.getitems(["a/1.0", "c/0", "d/0"]) == {
+        "a/1.0": b"second",
+        "c/0": b"third",
+    }
+    del store["c/0"]
+    with pytest.raises(KeyError):
+        store["c/0"]
+    with pytest.raises(KeyError):
+        del store["c/0"]
+    assert sorted(store) == ["a/0.0", "a/1.0", "b/0"]
+    store.flush()
+    assert sorted(os.listdir(store.root)) == ["chunks.index", "chunks.pack"]
+    store = pickle.loads(pickle.dumps(store))
+    assert store["a/1.0"] == b"second"
+    assert len(store) == 3
+
+
+def test_packed_store_recovery():
+    store = packed_store("packed_store_recovery")
+    store["a"] = b"indexed"
+    store.flush()
+    store["b"] = b"replayed"
+    other = PackedStore(store.root)
+    assert other["b"] == b"replayed"
+    # Writes of other stores of the folder are seen
+    store["c"] = b"written later"
+    assert other["c"] == b"written later"
+    # Torn record at the end of the data file is dropped
+    with open(store.data_path, "ab") as f:
+        f.write(b"\x01\x02\x03" * 10)
+    store = PackedStore(store.root)
+    assert sorted(store) == ["a", "b", "c"]
+    store["d"] = b"after the torn record"
+    assert PackedStore(store.root)["d"] == b"after the torn record"
+
+
+def test_packed_store_compact():
+    store = packed_store("packed_store_compact")
+    for i in range(10):
+        store[str(i)] = bytes(100)
+    store.flush()
+    size = os.path.getsize(store.data_path)
+    other = PackedStore(store.root)
+    for i in range(10):
+        store[str(i)] = bytes([i]) * 100
+    store["0"] = bytes(100)
+    # Overwritten values take more than half of the data file
+    store.flush()
+    assert os.path.getsize(store.data_path) == size
+    assert store["3"] == bytes([3]) * 100
+    # Stores of the folder opened before the compaction switch to the new file
+    other["10"] = b"new"
+    assert other["7"] == bytes([7]) * 100
+    assert store["10"] == b"new"
+    ratio = config.PACKED_COMPACT_RATIO
+    config.PACKED_COMPACT_RATIO = 1
+    try:
+        del store["10"]
+        store.flush()
+        assert os.path.getsize(store.data_path) > size
+    finally:
+        config.PACKED_COMPACT_RATIO = ratio
+    store.compact()
+    assert os.path.getsize(store.data_path) == size
+    assert sorted(PackedStore(store.root), key=int) == [str(i) for i in range(10)]
+
+
+def test_packed_store_read_while_compacting():
+    store = packed_store("packed_store_read_while_compacting")
+    for i in range(10):
+        store[str(i)] = bytes([i]) * 1000
+    store.flush()
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                for i in range(10):
+                    assert store[str(i)] == bytes([i]) * 1000
+                    assert store.getrange(str(i), 10, 20) == bytes([i]) * 10
+                values = store.getitems([str(i) for i in range(10)])
+                assert values == {str(i): bytes([i]) * 1000 for i in range(10)}
+        except Exception as e:
+            errors.append(e)
+
+    # Threads switch often, so reads overlap the compactions
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        # Every flush compacts, as the values are overwritten twice
+        for _ in range(100):
+            for i in range(20):
+                store[str(i % 10)] = bytes([i % 10]) * 1000
+            store.flush()
+    finally:
+        done.set()
+        reader.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert os.path.getsize(store.data_path) < 20000
+
+
+if __name__ == "__main__":
+    test_packed_store()
+    test_packed_store_recovery()
+    test_packed_store_compact()
+    test_packed_store_read_while_compacting()
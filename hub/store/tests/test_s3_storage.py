@@ -5,14 +5,20 @@ If a copy of the MPL was not distributed with this file, You can obtain one at h
 """
 
 from concurrent.futures.thread import ThreadPoolExecutor
+import io
+import threading
+import time
 
 import boto3
+from botocore.exceptions import ClientError
 import pytest
 from s3fs import S3FileSystem
 import cloudpickle
 import numpy as np
 
-from hub.store.s3_storage import S3Storage
+from hub import config
+from hub.store import s3_storage
+from hub.store.s3_storage import S3Storage, get_client
 from hub.utils import s3_creds_exist
 
 
@@ -47,5 +53,240 @@ def test_s3_storage_pickability():
     cloudpickle.dumps(storage)
 
 
+class MemoryS3Client:
+    """Stand-in for boto3 S3 client keeping objects in memory
+    The next throttle requests are answered with SlowDown
+    and the next stall requests take stall_time seconds
+    """
+
+    def __init__(self, throttle=0, stall=0, stall_time=2):
+        self.objects = dict()
+        self.uploads = dict()
+        self.throttle = throttle
+        self.stall = stall
+        self.stall_time = stall_time
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls.append(name)
+            stall = self.stall > 0
+            self.stall -= stall
+        if stall:
+            time.sleep(self.stall_time)
+        with self._lock:
+            if self.throttle > 0:
+                self.throttle -= 1
+                raise ClientError(
+                    {
+                        "Error": {"Code": "SlowDown", "Message": "Reduce rate"},
+                        "ResponseMetadata": {"HTTPStatusCode": 503},
+                    },
+                    name,
+                )
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self._call("put_object")
+        self.objects[Key] = bytes(Body)
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._call("get_object")
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "get_object")
+        data = self.objects[Key]
+        if Range is None:
+            return {"Body": io.BytesIO(data)}
+        start, stop = Range[len("bytes=") :].split("-")
+        if not start:
+            start, stop = max(len(data) - int(stop), 0), None
+        start = int(start)
+        if start >= len(data):
+            raise ClientError({"Error": {"Code": "InvalidRange"}}, "get_object")
+        stop = min(int(stop) + 1, len(data)) if stop else len(data)
+        return {
+            "Body": io.BytesIO(data[start:stop]),
+            "ContentRange": f"bytes {start}-{stop - 1}/{len(data)}",
+        }
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        self._call("create_multipart_upload")
+        self.uploads[Key] = dict()
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._call("upload_part")
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._call("complete_multipart_upload")
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        self.objects[Key] = b"".join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+    def delete_objects(self, Bucket, Delete):
+        self._call("delete_objects")
+        assert len(Delete["Objects"]) <= 1000
+        for item in Delete["Objects"]:
+            self.objects.pop(item["Key"], None)
+        return {}
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                client._call(name)
+                keys = sorted(key for key in client.objects if key.startswith(Prefix))
+                yield {"Contents": [{"Key": key} for key in keys]}
+
+        return Paginator()
+
+
+def create_storage(client, url="s3://bucket/dataset"):
+    storage = S3Storage(
+        None,
+        url,
+        aws_access_key_id="key",
+        aws_secret_access_key="secret",
+        aws_region="us-east-1",
+    )
+    storage.client = client
+    return storage
+
+
+def test_s3_storage_stand_in():
+    client = MemoryS3Client()
+    storage = create_storage(client)
+    storage["a/0"] = BYTE_DATA
+    storage["a/1"] = NUMPY_ARR
+    storage["b"] = b""
+    assert storage["a/0"] == BYTE_DATA
+    assert storage["b"] == b""
+    assert storage.getitems(["a/0", "c"]) == {"a/0": BYTE_DATA}
+    with pytest.raises(KeyError):
+        storage["c"]
+    del storage["a"]
+    assert list(client.objects) == ["dataset/b"]
+    with pytest.raises(KeyError):
+        del storage["a"]
+
+
+def test_s3_storage_retries():
+    delay = config.S3_RETRY_BASE_DELAY
+    config.S3_RETRY_BASE_DELAY = 0.001
+    try:
+        client = MemoryS3Client(throttle=3)
+        storage = create_storage(client)
+        storage["hello"] = BYTE_DATA
+        assert client.calls.count("put_object") == 4
+        client.throttle = config.S3_MAX_RETRIES + 1
+        with pytest.raises(ClientError):
+            storage["hello"]
+        client.throttle = 0
+        assert storage["hello"] == BYTE_DATA
+    finally:
+        config.S3_RETRY_BASE_DELAY = delay
+
+
+def test_s3_storage_adaptive():
+    delay = config.S3_RETRY_BASE_DELAY
+    config.S3_RETRY_BASE_DELAY = 0.001
+    client = MemoryS3Client()
+    storage = create_storage(client, "s3://adaptive-bucket/dataset")
+    try:
+        storage["hello"] = BYTE_DATA
+        limit = storage.limiter.limit
+        client.throttle = 2
+        assert storage["hello"] == BYTE_DATA
+        assert storage.limiter.throttles == 2
+        assert storage.limiter.limit < limit
+    finally:
+        config.S3_RETRY_BASE_DELAY = delay
+    for _ in range(30):
+        storage["hello"]
+    hedge = config.HEDGE_REQUESTS
+    config.HEDGE_REQUESTS = True
+    try:
+        client.stall = 1
+        start = time.monotonic()
+        assert storage["hello"] == BYTE_DATA
+        assert time.monotonic() - start < 1
+        assert storage.limiter.hedges == 1
+    finally:
+        config.HEDGE_REQUESTS = hedge
+
+
+def test_s3_storage_multipart():
+    threshold, part_size = config.S3_MULTIPART_THRESHOLD, config.S3_PART_SIZE
+    config.S3_MULTIPART_THRESHOLD, config.S3_PART_SIZE = 10, 4
+    try:
+        client = MemoryS3Client()
+        storage = create_storage(client)
+        data = bytes(range(25))
+        storage["big"] = data
+        assert client.calls.count("upload_part") == 7
+        assert "put_object" not in client.calls
+        assert bytes(storage["big"]) == data
+        assert client.calls.count("get_object") == 7
+    finally:
+        config.S3_MULTIPART_THRESHOLD, config.S3_PART_SIZE = threshold, part_size
+
+
+def test_s3_storage_getrange():
+    client = MemoryS3Client()
+    storage = create_storage(client)
+    storage["hello"] = b"hello world"
+    assert storage.getrange("hello", 6) == b"world"
+    assert storage.getrange("hello", 0, 5) == b"hello"
+    assert storage.getrange("hello", -5) == b"world"
+    assert storage.getrange("hello", 20) == b""
+    with pytest.raises(KeyError):
+        storage.getrange("missing", 0, 5)
+
+
+def test_s3_storage_delitems():
+    client = MemoryS3Client()
+    storage = create_storage(client)
+    for i in range(2500):
+        client.objects[f"dataset/{i}"] = BYTE_DATA
+    storage.delitems([str(i) for i in range(2500)] + ["missing"])
+    assert client.objects == {}
+    assert client.calls.count("delete_objects") == 3
+
+
+def test_s3_client_refresh():
+    def client(key):
+        return get_client(
+            "s3:/test_s3_client_refresh",
+            4,
+            aws_access_key_id=key,
+            aws_secret_access_key="secret",
+            region_name="us-east-1",
+        )
+
+    first = client("first")
+    assert client("first") is first
+    # Client of the expired credentials is dropped
+    second = client("second")
+    assert second is not first
+    assert client("second") is second
+    clients = [
+        key for key in s3_storage._clients if key[1] == "s3:/test_s3_client_refresh"
+    ]
+    assert len(clients) == 1
+
+
 if __name__ == "__main__":
     test_s3_storage()
+    test_s3_storage_stand_in()
+    test_s3_storage_retries()
+    test_s3_storage_adaptive()
+    test_s3_storage_multipart()
+    test_s3_storage_getrange()
+    test_s3_storage_delitems()
+    test_s3_client_refresh()
@@ -0,0 +1,88 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+
+from hub.store.disk_cache import DiskCache
+from hub.store.shared_cache import SharedMemoryCache
+from hub.store.store import get_storage_map
+from hub.store.tests.test_lru_cache import SlowStore
+
+
+def test_shared_cache():
+    path = "./data/test/test_shared_cache"
+    shutil.rmtree(path, ignore_errors=True)
+    data = bytes("Hello World", "utf-8")
+    actual = SlowStore()
+    actual["Aello"] = data
+    actual["Beta"] = b""
+    first = SharedMemoryCache(path, actual, 100)
+    second = SharedMemoryCache(path, actual, 100)
+    assert bytes(first["Aello"]) == data
+    # Chunk cached by the other process is used without fetching it again
+    assert bytes(second["Aello"]) == data
+    assert actual.gets == 1
+    assert second._total_cached == len(data)
+    assert second.stats()[""]["hit"] == 1
+    assert second["Beta"] == b""
+
+
+def test_shared_cache_size():
+    path = "./data/test/test_shared_cache_size"
+    shutil.rmtree(path, ignore_errors=True)
+    actual = SlowStore()
+    for i in range(4):
+        actual[f"chunk{i}"] = bytes(100)
+    first = SharedMemoryCache(path, actual, 250)
+    second = SharedMemoryCache(path, actual, 250)
+    first["chunk0"], first["chunk1"]
+    # Chunks cached by the other process count against max_size
+    second["chunk2"], second["chunk3"]
+    assert list(second._cached_items) == ["chunk3"]
+    assert first._cache_storage.size.value() == 300
+    assert sorted(os.listdir(path)) == ["chunk0", "chunk1", "chunk3"]
+    first.close()
+    assert os.path.isdir(path)
+    # Last process using the folder removes it
+    second.close()
+    assert not os.path.exists(path)
+
+
+def test_shared_cache_fetches_once():
+    path = "./data/test/test_shared_cache_once"
+    shutil.rmtree(path, ignore_errors=True)
+    actual = SlowStore()
+    for i in range(8):
+        actual[f"chunk{i}"] = bytes(100)
+    caches = [DiskCache(path, actual, 10000) for _ in range(4)]
+    keys = [f"chunk{i}" for i in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda cache: [cache[key] for key in keys], caches))
+        list(pool.map(lambda cache: cache.getitems(keys), caches))
+    assert actual.gets == len(keys)
+
+
+def test_storage_map_shared_tier():
+    store = get_storage_map(
+        fsspec.filesystem("memory"), "test/shared_tier", shared_cache=2 ** 20
+    )
+    assert isinstance(store, SharedMemoryCache)
+    assert isinstance(store.actual_storage, DiskCache)
+    local = get_storage_map(
+        fsspec.filesystem("file"), "./data/test/shared_tier", shared_cache=2 ** 20
+    )
+    assert not isinstance(local, SharedMemoryCache)
+
+
+if __name__ == "__main__":
+    test_shared_cache()
+    test_shared_cache_size()
+    test_shared_cache_fetches_once()
+    test_storage_map_shared_tier()
@@ -4,7 +4,16 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-from hub.store.store import get_cache_path
+import shutil
+
+import fsspec
+
+from hub.store.concurrency import get_limiter
+from hub.store.store import (
+    StorageMapWrapperWithCommit,
+    _get_storage_map,
+    get_cache_path,
+)
 
 
 def test_get_cache_path():
@@ -18,5 +27,32 @@ def test_get_cache_path():
     assert "./cache/test\\testdb" == get_cache_path("C:\\test\\testdb", cache_folder)
 
 
+def test_storage_map_getitems():
+    path = "./data/test/storage_map_getitems"
+    shutil.rmtree(path, ignore_errors=True)
+    fs = fsspec.filesystem("file")
+    store = StorageMapWrapperWithCommit(fs.get_mapper(path, create=True))
+    values = {f"tensor/{i}.0": bytes([i]) * 10 for i in range(20)}
+    store.setitems(values)
+    assert store.getitems(list(values) + ["tensor/20.0"]) == values
+
+
+def test_storage_map_limiter():
+    fs = fsspec.filesystem("memory")
+    store = _get_storage_map(fs, "memory://limited/dataset")
+    limiter = get_limiter("memory://limited")
+    values = {f"tensor/{i}.0": bytes([i]) * 10 for i in range(20)}
+    store.setitems(values)
+    assert store.getitems(list(values) + ["tensor/20.0"]) == values
+    assert store.getrange("tensor/3.0", 2, 4) == bytes([3]) * 2
+    assert limiter.in_flight == 0
+    assert limiter.limit > limiter.minimum
+    assert len(limiter._latencies) == 42
+    local = _get_storage_map(fsspec.filesystem("file"), "./data/test/local_map")
+    assert local._backend is None
+
+
 if __name__ == "__main__":
     test_get_cache_path()
+    test_storage_map_getitems()
+    test_storage_map_limiter()
@@ -0,0 +1,93 @@
+"""
+License:
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import pickle
+
+import pytest
+
+from hub import config
+from hub.store.superchunk_store import SuperchunkStore
+
+
+class MemoryStore(dict):
+    """Dict counting the keys fetched, as a backend counts requests"""
+
+    def __init__(self):
+        super().__init__()
+        self.fetched = 0
+
+    def getitems(self, keys, on_error="omit"):
+        self.fetched += len(keys)
+        return {key: self[key] for key in keys if key in self}
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def superchunk_store():
+    store = SuperchunkStore(MemoryStore(), 8)
+    store.register("label", 4)
+    store.register("image/--dynamic--", 8)
+    return store
+
+
+def test_superchunk_store():
+    store = superchunk_store()
+    storage = store._storage
+    store["label/0:c"] = b"labels 0-3"
+    store.setitems({"label/1:c": b"labels 4-7", "image/--dynamic--/0.0:c": b"shapes"})
+    store["label/2:c"] = b"labels 8-11"
+    store["image/0.0.0:c"] = b"image"
+    # Superchunks are written on flush, other keys right away
+    assert list(storage) == ["image/0.0.0:c"]
+    assert store["label/1:c"] == b"labels 4-7"
+    store.flush()
+    assert sorted(storage) == [
+        "--superchunks--/0",
+        "--superchunks--/1",
+        "image/0.0.0:c",
+    ]
+    keys = ["label/0:c", "label/1:c", "image/--dynamic--/0.0:c", "image/0.0.0:c"]
+    assert store.getitems(keys + ["label/0:d"]) == {
+        "label/0:c": b"labels 0-3",
+        "label/1:c": b"labels 4-7",
+        "image/--dynamic--/0.0:c": b"shapes",
+        "image/0.0.0:c": b"image",
+    }
+    # One fetch for the superchunk of the first 8 samples, one for the image
+    assert storage.fetched == 2
+    assert store.storage_key("label/1:c") == "--superchunks--/0"
+    assert store.storage_key("image/0.0.0:c") == "image/0.0.0:c"
+    del store["label/0:c"]
+    with pytest.raises(KeyError):
+        store["label/0:c"]
+    assert sorted(store) == sorted(keys[1:] + ["label/2:c"])
+    del store["label/2:c"]
+    store.flush()
+    assert "--superchunks--/1" not in storage
+    store = pickle.loads(pickle.dumps(store))
+    assert store["image/--dynamic--/0.0:c"] == b"shapes"
+
+
+def test_superchunk_store_pending(monkeypatch):
+    monkeypatch.setattr(config, "SUPERCHUNK_MAX_PENDING", 2)
+    store = superchunk_store()
+    for i in range(6):
+        store[f"label/{2 * i}:c"] = str(i).encode()
+    # Superchunks written the longest ago are written first
+    assert sorted(store._storage) == [f"--superchunks--/{i}" for i in range(4)]
+    store["label/1:c"] = b"second"
+    store.flush()
+    assert len(store._storage) == 6
+    assert store["label/0:c"] == b"0"
+    assert store["label/1:c"] == b"second"
+
+
+if __name__ == "__main__":
+    test_superchunk_store()
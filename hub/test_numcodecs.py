@@ -4,10 +4,11 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import numcodecs
 import numpy as np
 import pytest
 
-from .numcodecs import PngCodec
+from .numcodecs import PngCodec, ShardCodec
 
 
 @pytest.mark.parametrize("from_config", [False, True])
@@ -40,3 +41,18 @@ def test_png_codec_solo_channel(solo_channel: bool) -> None:
     bytes_ = codec.encode(arr)
     arr_ = codec.decode(bytes_)
     assert (arr == arr_).all()
+
+
+@pytest.mark.parametrize("compressor", [None, numcodecs.LZ4(), PngCodec()])
+def test_shard_codec(compressor) -> None:
+    codec = ShardCodec(compressor, block_rows=3)
+    codec = numcodecs.get_codec(codec.get_config())
+    arr = np.arange(10 * 8 * 8 * 3, dtype="uint8").reshape((10, 8, 8, 3))
+    bytes_ = codec.encode(arr)
+    assert codec.decode(bytes_) == arr.tobytes()
+    offsets = codec.block_offsets(bytes_[-codec.footer_size(len(arr)) :])
+    assert len(offsets) == codec.block_count(len(arr)) + 1 == 5
+    block = codec.decode_block(bytes_[offsets[1] : offsets[2]])
+    assert block == arr[3:6].tobytes()
+    with pytest.raises(ValueError):
+        codec.block_offsets(arr[:2].tobytes())